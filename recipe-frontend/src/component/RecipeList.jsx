@@ -13,8 +13,9 @@ const RecipeList = () => {
   const [featuredOnly, setFeaturedOnly] = useState(false);
 
   const [selectedCategory, setSelectedCategory] = useState("");
-  const [page, setPage] = useState(1);
-  const [totalPages, setTotalPages] = useState(1);
+  // null is the first page; after that we follow the API's next/previous links
+  const [pageUrl, setPageUrl] = useState(null);
+  const [links, setLinks] = useState({ next: null, previous: null });
   const [loading, setLoading] = useState(true);
 
   // Fetch categories once
@@ -36,26 +37,27 @@ const RecipeList = () => {
     const fetchRecipes = async () => {
       setLoading(true);
       try {
-        const response = await axios.get(`${API_BASE}/recipes/`, {
-          params: {
-            search: search || undefined,
-            categories__id: selectedCategory || undefined,
-            featured: featuredOnly || undefined, 
-            page: page,
-          },
-        });
+        const response = pageUrl
+          ? await axios.get(pageUrl)
+          : await axios.get(`${API_BASE}/recipes/`, {
+              params: {
+                search: search || undefined,
+                categories__id: selectedCategory || undefined,
+                featured: featuredOnly || undefined,
+              },
+            });
 
         const data = response.data;
 
         if (Array.isArray(data)) {
           setRecipes(data);
-          setTotalPages(1);
+          setLinks({ next: null, previous: null });
         } else if (Array.isArray(data.results)) {
           setRecipes(data.results);
-          setTotalPages(Math.ceil(data.count / 5) || 1);
+          setLinks({ next: data.next, previous: data.previous });
         } else {
           setRecipes([]);
-          setTotalPages(1);
+          setLinks({ next: null, previous: null });
         }
       } catch (error) {
         setError("Failed to fetch recipes: " + error.message);
@@ -65,7 +67,7 @@ const RecipeList = () => {
       }
     };
     fetchRecipes();
-  }, [search, selectedCategory, page, featuredOnly]);
+  }, [search, selectedCategory, pageUrl, featuredOnly]);
 
   if (loading) {
     return (
@@ -127,7 +129,7 @@ const RecipeList = () => {
               value={search}
               onChange={(e) => {
                 setSearch(e.target.value);
-                setPage(1);
+                setPageUrl(null);
               }}
               className="w-full pl-12 pr-4 py-4 bg-white/90 backdrop-blur-sm border border-gray-200 rounded-2xl shadow-lg focus:ring-2 focus:ring-[#FF6B35] focus:border-transparent transition-all duration-300 placeholder-gray-500"
             />
@@ -139,7 +141,7 @@ const RecipeList = () => {
           <button
             onClick={() => {
               setSelectedCategory("");
-              setPage(1);
+              setPageUrl(null);
             }}
             className={`px-6 py-3 rounded-2xl font-semibold transition-all duration-300 transform hover:scale-105 ${selectedCategory === ""
                 ? "bg-gradient-to-r from-[#FF6B35] to-[#E55A2B] text-white shadow-lg shadow-[#FF6B35]/25"
@@ -153,7 +155,7 @@ const RecipeList = () => {
               key={cat.id}
               onClick={() => {
                 setSelectedCategory(cat.id);
-                setPage(1);
+                setPageUrl(null);
               }}
               className={`px-6 py-3 rounded-2xl font-semibold transition-all duration-300 transform hover:scale-105 ${selectedCategory === cat.id
                   ? "bg-gradient-to-r from-[#FF6B35] to-[#E55A2B] text-white shadow-lg shadow-[#FF6B35]/25"
@@ -170,7 +172,7 @@ const RecipeList = () => {
           <button
   onClick={() => {
     setFeaturedOnly(!featuredOnly);
-    setPage(1);
+    setPageUrl(null);
   }}
   className={`px-6 py-3 rounded-2xl font-semibold transition-all duration-300 transform hover:scale-105 ${
     featuredOnly
@@ -234,10 +236,7 @@ const RecipeList = () => {
                             <path d="M9.049 2.927c.3-.921 1.603-.921 1.902 0l1.07 3.292a1 1 0 00.95.69h3.462c.969 0 1.371 1.24.588 1.81l-2.8 2.034a1 1 0 00-.364 1.118l1.07 3.292c.3.921-.755 1.688-1.54 1.118l-2.8-2.034a1 1 0 00-1.175 0l-2.8 2.034c-.784.57-1.838-.197-1.539-1.118l1.07-3.292a1 1 0 00-.364-1.118L2.98 8.72c-.783-.57-.38-1.81.588-1.81h3.461a1 1 0 00.951-.69l1.07-3.292z" />
                           </svg>
                           <span className="text-sm font-bold text-gray-700">
-                            {recipe.ratings?.length > 0
-                              ? (recipe.ratings.reduce((acc, curr) => acc + curr.stars, 0) / recipe.ratings.length).toFixed(1)
-                              : "0.0"
-                            }
+                            {(recipe.average_rating ?? 0).toFixed(1)}
                           </span>
                         </div>
                       </div>
@@ -285,12 +284,12 @@ const RecipeList = () => {
         )}
 
         {/* Pagination */}
-        {totalPages > 1 && page <= totalPages && (
+        {(links.previous || links.next) && (
           <div className="flex justify-center items-center gap-2">
             {/* Previous Button */}
             <button
-              onClick={() => setPage(Math.max(1, page - 1))}
-              disabled={page === 1}
+              onClick={() => setPageUrl(links.previous)}
+              disabled={!links.previous}
               className="px-4 py-2 bg-white/90 backdrop-blur-sm rounded-2xl shadow-lg border border-white/20 disabled:opacity-50 disabled:cursor-not-allowed hover:bg-gray-50 transition-all duration-300"
             >
               <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -298,25 +297,10 @@ const RecipeList = () => {
               </svg>
             </button>
 
-            {/* Page Numbers */}
-            {[...Array(totalPages)].map((_, i) => (
-              <button
-                key={i}
-                onClick={() => setPage(i + 1)}
-                disabled={i + 1 > totalPages} // prevent going past available pages
-                className={`px-4 py-2 rounded-2xl font-semibold transition-all duration-300 transform hover:scale-110 ${page === i + 1
-                    ? "bg-gradient-to-r from-[#FF6B35] to-[#E55A2B] text-white shadow-lg shadow-[#FF6B35]/25"
-                    : "bg-white/90 backdrop-blur-sm text-gray-700 shadow-lg border border-white/20 hover:border-[#FF6B35]/30"
-                  }`}
-              >
-                {i + 1}
-              </button>
-            ))}
-
             {/* Next Button */}
             <button
-              onClick={() => setPage(Math.min(totalPages, page + 1))}
-              disabled={page === totalPages}
+              onClick={() => setPageUrl(links.next)}
+              disabled={!links.next}
               className="px-4 py-2 bg-white/90 backdrop-blur-sm rounded-2xl shadow-lg border border-white/20 disabled:opacity-50 disabled:cursor-not-allowed hover:bg-gray-50 transition-all duration-300"
             >
               <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
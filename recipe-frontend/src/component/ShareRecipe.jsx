@@ -21,11 +21,16 @@ const ShareRecipe = ({ recipeId, recipeTitle, recipeImage, authorId }) => {
     
     setLoadingFollowers(true);
     try {
-      const response = await axios.get(
-        `${process.env.REACT_APP_API_URL}/api/auth/followers/`,
-        config
-      );
-      setFollowers(response.data);
+      // the list is paged (next page in the Link header); the dialog offers everyone
+      const everyone = [];
+      let url = `${process.env.REACT_APP_API_URL}/api/auth/followers/`;
+      while (url) {
+        const response = await axios.get(url, config);
+        everyone.push(...response.data);
+        const next = /<([^>]+)>;\s*rel="next"/.exec(response.headers.link || "");
+        url = next ? next[1] : null;
+      }
+      setFollowers(everyone);
     } catch (error) {
       console.error("Error fetching followers:", error);
       alert("Failed to load followers list");
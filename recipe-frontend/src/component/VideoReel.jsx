@@ -13,6 +13,8 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
   const [showShareModal, setShowShareModal] = useState(false);
   const [sharing, setSharing] = useState(false);
   const [commentText, setCommentText] = useState('');
+  const [comments, setComments] = useState(recipe.comments_preview || []);
+  const [commentsCount, setCommentsCount] = useState(recipe.comments_count || 0);
 
   const videoUrl = recipe.video?.startsWith('http') 
       ? recipe.video 
@@ -28,6 +30,14 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
     }
   }, [isActive, isPlaying]);
 
+  // the feed only carries a preview; the panel loads the newest threads when opened
+  useEffect(() => {
+    if (!showComments) return;
+    axiosInstance.get(`/recipes/${recipe.id}/comments/`)
+      .then(res => setComments(res.data.results))
+      .catch(err => console.error('Error loading comments', err));
+  }, [showComments, recipe.id]);
+
   const togglePlay = () => setIsPlaying(prev => !prev);
   
   const toggleMute = () => {
@@ -55,6 +65,7 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
     try {
       await axiosInstance.post(`/recipes/${recipe.id}/add_comment/`, { content: commentText });
       setCommentText('');
+      setCommentsCount(prev => prev + 1);
       onComment?.(commentText);
       setShowComments(false);
       setTimeout(() => setShowComments(true), 100);
@@ -208,7 +219,7 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
           <div className="group relative">
             <button onClick={() => setShowComments(!showComments)} className="flex flex-col items-center p-4 bg-black/40 backdrop-blur-md rounded-2xl hover:bg-black/60 transition-all duration-300 hover:scale-110 shadow-2xl border border-white/10 hover:border-white/20">
               <MessageCircle size={28} className="text-white group-hover:text-blue-400 transition-colors duration-300" />
-              <span className="text-white text-xs mt-2 font-medium drop-shadow-lg">{recipe.comments?.length || 0}</span>
+              <span className="text-white text-xs mt-2 font-medium drop-shadow-lg">{commentsCount}</span>
             </button>
             <div className="absolute -top-2 -right-2 bg-blue-500 text-white text-xs px-2 py-1 rounded-full opacity-0 group-hover:opacity-100 transition-opacity duration-300">Comment</div>
           </div>
@@ -241,7 +252,7 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
           </div>
           
           <div className="h-3/4 overflow-y-auto mb-6 space-y-4 pr-2 custom-scrollbar">
-            {recipe.comments?.map(c => (
+            {comments.map(c => (
               <div key={c.id} className="p-4 bg-white/5 rounded-2xl hover:bg-white/10 transition-all duration-300 border border-white/5 hover:border-white/10">
                 <div className="flex justify-between items-start mb-2">
                   <span className="font-semibold text-white">{c.user}</span>
@@ -250,7 +261,7 @@ const VideoReel = ({ recipe, isActive, onLike, onComment, onShare }) => {
                 <p className="text-gray-200 leading-relaxed">{c.content}</p>
               </div>
             ))}
-            {!recipe.comments?.length && (
+            {!comments.length && (
               <div className="text-center py-8 text-gray-400">
                 <div className="w-16 h-16 bg-white/5 rounded-full flex items-center justify-center mx-auto mb-3">
                   <MessageCircle size={24} className="text-gray-400" />
@@ -9,27 +9,29 @@ const VideoReelsFeed = () => {
   const [currentIndex, setCurrentIndex] = useState(0);
   const [loading, setLoading] = useState(true);
   const [hasMore, setHasMore] = useState(true);
-  const [page, setPage] = useState(1);
+  const [nextUrl, setNextUrl] = useState(null);
 
   const containerRef = useRef(null);
 
-  const fetchVideos = async (pageNum = 1) => {
+  // url is the previous page's `next` link; without one we start from the newest
+  const fetchVideos = async (url = null) => {
     try {
       setLoading(true);
-      const response = await axiosInstance.get(`/recipes/?ordering=-created_at&page=${pageNum}`);
+      // reels need the full document (video, description, counts), not the compact card
+      const response = await axiosInstance.get(url || '/recipes/?view=full&ordering=-created_at');
       const data = response.data;
 
       let videoRecipes = [];
       if (data.results) {
         videoRecipes = data.results.filter(r => r.video);
         setHasMore(!!data.next);
+        setNextUrl(data.next);
       } else if (Array.isArray(data)) {
         videoRecipes = data.filter(r => r.video);
         setHasMore(false);
       }
 
-      setVideos(prev => (pageNum === 1 ? videoRecipes : [...prev, ...videoRecipes]));
-      setPage(pageNum);
+      setVideos(prev => (url ? [...prev, ...videoRecipes] : videoRecipes));
     } catch (err) {
       console.error('Error fetching videos:', err);
     } finally {
@@ -44,7 +46,7 @@ const VideoReelsFeed = () => {
       window.location.href = '/login';
       return;
     }
-    fetchVideos(1);
+    fetchVideos();
   }, []);
 
   // Wheel scroll navigation with passive: false
@@ -66,9 +68,9 @@ const VideoReelsFeed = () => {
   // Load more videos if near the end
   useEffect(() => {
     if (currentIndex >= videos.length - 2 && hasMore && !loading) {
-      fetchVideos(page + 1);
+      fetchVideos(nextUrl);
     }
-  }, [currentIndex, videos.length, hasMore, loading, page]);
+  }, [currentIndex, videos.length, hasMore, loading, nextUrl]);
 
   // Keyboard navigation
   useEffect(() => {
@@ -94,7 +96,7 @@ const VideoReelsFeed = () => {
           <h2 className="text-2xl font-bold mb-4">No recipe videos yet</h2>
           <p className="text-gray-400">Be the first to upload a cooking video!</p>
           <button
-            onClick={() => fetchVideos(1)}
+            onClick={() => fetchVideos()}
             className="mt-4 bg-green-600 text-white px-4 py-2 rounded-lg hover:bg-green-700"
           >
             Try Again
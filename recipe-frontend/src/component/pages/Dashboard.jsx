@@ -482,7 +482,7 @@ const Dashboard = () => {
         categoriesRes,
       ] = await Promise.allSettled([
         axiosInstance.get('/recipes/'),
-        axiosInstance.get('/user-recipes/'),
+        axiosInstance.get('/user-recipes/?view=full'),  // MyRecipesView lists related recipes
         axiosInstance.get('/user-comments/'),
         axiosInstance.get('/user-favorites/'),
         axiosInstance.get('/user-ratings/'),
@@ -584,7 +584,7 @@ const Dashboard = () => {
           </div>
         );
       case 'my-recipes':
-        return <MyRecipesView recipes={userRecipes} onFetch={() => fetchData('/user-recipes/', setUserRecipes)} />;
+        return <MyRecipesView recipes={userRecipes} onFetch={() => fetchData('/user-recipes/?view=full', setUserRecipes)} />;
       case 'my-comments':
         return <MyCommentsView comments={comments} onFetch={() => fetchData('/user-comments/', setComments)} />;
       case 'my-favorites':
@@ -64,6 +64,8 @@ const API_BASE = process.env.REACT_APP_API_URL || "https://django-drf-ai-powered
 const RecipeDetail = () => {
   const { id } = useParams();
   const [recipe, setRecipe] = useState(null);
+  const [comments, setComments] = useState([]);
+  const [commentsNext, setCommentsNext] = useState(null);
   const [comment, setComment] = useState("");
   const [rating, setRating] = useState(0);
   const [userRating, setUserRating] = useState(0);
@@ -112,6 +114,17 @@ const RecipeDetail = () => {
     return { averageRating, totalRatings };
   };
 
+  // Comment threads come from their own paginated endpoint, newest first
+  const loadComments = async (url = null) => {
+    try {
+      const res = await axios.get(url || `${API_BASE}/recipes/${id}/comments/`, config);
+      setComments(prev => (url ? [...prev, ...res.data.results] : res.data.results));
+      setCommentsNext(res.data.next);
+    } catch (err) {
+      console.error("Failed to load comments:", err);
+    }
+  };
+
   // Fetch recipe
   useEffect(() => {
     const fetchRecipe = async () => {
@@ -119,6 +132,7 @@ const RecipeDetail = () => {
         const res = await axios.get(`${API_BASE}/recipes/${id}/`, config);
         const recipeData = res.data;
         setRecipe(recipeData);
+        loadComments();
         
         // Check if user has already rated this recipe
         if (recipeData.ratings && token) {
@@ -209,7 +223,8 @@ const RecipeDetail = () => {
         { content: comment },
         config
       );
-      setRecipe({ ...recipe, comments: [...recipe.comments, res.data] });
+      setComments([res.data, ...comments]);
+      setRecipe({ ...recipe, comments_count: recipe.comments_count + 1 });
       setComment("");
     } catch (err) {
       console.log(err);
@@ -231,7 +246,7 @@ const RecipeDetail = () => {
       );
       
       // Update the comments in state
-      const updatedComments = recipe.comments.map(comment => {
+      const updatedComments = comments.map(comment => {
         if (comment.id === parentId) {
           return {
             ...comment,
@@ -242,7 +257,8 @@ const RecipeDetail = () => {
         return comment;
       });
       
-      setRecipe({ ...recipe, comments: updatedComments });
+      setComments(updatedComments);
+      setRecipe({ ...recipe, comments_count: recipe.comments_count + 1 });
       setReplyContent("");
       setReplyingTo(null);
     } catch (err) {
@@ -265,14 +281,15 @@ const RecipeDetail = () => {
       );
       
       // Remove comment from state
-      const updatedComments = recipe.comments.filter(comment => 
+      const updatedComments = comments.filter(comment => 
         comment.id !== commentId && !comment.replies?.some(reply => reply.id === commentId)
       ).map(comment => ({
         ...comment,
         replies: comment.replies?.filter(reply => reply.id !== commentId) || []
       }));
       
-      setRecipe({ ...recipe, comments: updatedComments });
+      setComments(updatedComments);
+      setRecipe({ ...recipe, comments_count: Math.max(0, recipe.comments_count - 1) });
     } catch (err) {
       console.error("Failed to delete comment:", err);
       alert("Failed to delete comment. Please try again.");
@@ -457,7 +474,7 @@ const RecipeDetail = () => {
     try {
       // Note: You'll need to add an edit comment endpoint in your backend
       // For now, we'll simulate the update locally
-      const updatedComments = recipe.comments.map(comment => {
+      const updatedComments = comments.map(comment => {
         if (comment.id === commentId) {
           return { ...comment, content: editContent, updated_at: new Date().toISOString() };
         }
@@ -475,7 +492,7 @@ const RecipeDetail = () => {
         return comment;
       });
       
-      setRecipe({ ...recipe, comments: updatedComments });
+      setComments(updatedComments);
       setEditContent("");
       setEditingComment(null);
       alert("Comment updated successfully!");
@@ -827,7 +844,7 @@ const RecipeDetail = () => {
               <section className="bg-white/90 backdrop-blur-sm rounded-3xl shadow-2xl border border-white/20 p-8 hover:shadow-3xl transition-all duration-500 transform hover:-translate-y-1">
                 <div className="flex items-center justify-between mb-8">
                   <h2 className="text-3xl font-bold bg-gradient-to-r from-gray-900 to-[#FF6B35] bg-clip-text text-transparent">
-                    Community ({recipe.comments.length})
+                    Community ({recipe.comments_count})
 
                   </h2>
                     <div className="mb-6">
@@ -869,7 +886,7 @@ const RecipeDetail = () => {
 
                 {/* Comments List */}
                 <div className="space-y-6">
-                  {recipe.comments
+                  {comments
                     .filter(comment => !comment.parent) // Only show top-level comments
                     .map((comment, index) => (
                       <CommentItem 
@@ -879,7 +896,16 @@ const RecipeDetail = () => {
                       />
                     ))}
                   
-                  {recipe.comments.filter(comment => !comment.parent).length === 0 && (
+                  {commentsNext && (
+                    <button
+                      onClick={() => loadComments(commentsNext)}
+                      className="w-full py-3 rounded-xl border border-gray-200 text-gray-700 font-semibold hover:border-[#FF6B35]/40 hover:text-[#FF6B35] transition-all duration-300"
+                    >
+                      Load more comments
+                    </button>
+                  )}
+
+                  {comments.filter(comment => !comment.parent).length === 0 && (
                     <div className="text-center py-12">
                       <div className="w-24 h-24 bg-gray-100 rounded-3xl flex items-center justify-center mx-auto mb-4">
                         <svg className="w-12 h-12 text-gray-400" fill="none" stroke="currentColor" viewBox="0 0 24 24">
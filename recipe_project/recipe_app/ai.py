@@ -0,0 +1,326 @@
+"""
+Async Gemini service used by the AI views.
+
+* One shared GenerativeModel per event loop instead of one per request
+  (its grpc.aio channel is bound to the loop that first used it).
+* A global semaphore (AI_MAX_CONCURRENCY) and a per-user one
+  (AI_MAX_CONCURRENCY_PER_USER) bound in-flight model calls. Waiting for a
+  slot is capped by AI_QUEUE_TIMEOUT, after which the caller gets 429/503.
+* Every call is capped by AI_TIMEOUT.
+* generate_cached() answers repeated inputs from recipe_app.ai_cache, and
+  identical requests in flight share one call (recipe_app.singleflight).
+* AnswerStream/sse_response relay a streamed answer as server-sent events,
+  so the first bytes leave as soon as the model's first tokens arrive.
+* The calls are awaited, not run in a thread, so under ASGI a slow model
+  never holds a worker. When the client disconnects Django cancels the view
+  task; the CancelledError unwinds through generate(), which cancels the RPC
+  and frees both slots.
+"""
+import asyncio
+import functools
+import json
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from recipe_app import ai_cache, singleflight
+from recipe_app.authentication import get_jwt_user
+
+
+class AIError(Exception):
+    status = 500
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        if status is not None:
+            self.status = status
+
+
+class AIBusy(AIError):
+    status = 503
+
+
+class AITimeout(AIError):
+    status = 504
+
+
+# like the limiter's semaphores, an async gRPC client belongs to one event loop
+_models = weakref.WeakKeyDictionary()
+
+
+def new_model():
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    model = genai.GenerativeModel(getattr(settings, 'AI_MODEL', 'models/gemini-2.5-flash'))
+    # genai would hand every model the same process-wide async client; give this loop its own
+    use_async_client(model, glm.GenerativeServiceAsyncClient(client_options={'api_key': settings.GEMINI_API_KEY}))
+    return model
+
+
+def use_async_client(model, async_client):
+    """
+    The one place that reaches into GenerativeModel: genai has no public way
+    to pass an async client, so set the attribute its async calls read.
+    """
+    if not hasattr(model, '_async_client'):
+        raise ImproperlyConfigured(
+            "google-generativeai's GenerativeModel no longer has _async_client; "
+            "recipe_app.ai needs updating before per-loop model clients work again."
+        )
+    model._async_client = async_client
+
+
+def get_model():
+    """The GenerativeModel for the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _models:
+        _models[loop] = new_model()
+    return _models[loop]
+
+
+class ConcurrencyLimiter:
+    """
+    Global and per-user semaphores. asyncio primitives belong to one event
+    loop, so state is kept per loop (uvicorn has one per worker; tests and
+    WSGI dev servers may create several).
+    """
+
+    def __init__(self):
+        self._state = weakref.WeakKeyDictionary()
+
+    def _for_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._state:
+            self._state[loop] = (asyncio.Semaphore(getattr(settings, 'AI_MAX_CONCURRENCY', 8)), {})
+        return self._state[loop]
+
+    def in_flight(self):
+        return sum(waiters for _, users in self._state.values() for _, waiters in users.values())
+
+    @asynccontextmanager
+    async def slot(self, user_key):
+        global_slots, users = self._for_loop()
+        queue_timeout = getattr(settings, 'AI_QUEUE_TIMEOUT', 10)
+        if user_key not in users:
+            users[user_key] = [asyncio.Semaphore(getattr(settings, 'AI_MAX_CONCURRENCY_PER_USER', 2)), 0]
+        entry = users[user_key]
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), queue_timeout)
+            except asyncio.TimeoutError:
+                raise AIBusy("You already have AI requests in progress; try again shortly.", status=429)
+            try:
+                try:
+                    await asyncio.wait_for(global_slots.acquire(), queue_timeout)
+                except asyncio.TimeoutError:
+                    raise AIBusy("The AI service is busy; try again shortly.")
+                try:
+                    yield
+                finally:
+                    global_slots.release()
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del users[user_key]
+
+
+limiter = ConcurrencyLimiter()
+
+
+async def generate(prompt, user_key):
+    """Model text for `prompt`, within the caller's concurrency slots and AI_TIMEOUT."""
+    async with limiter.slot(user_key):
+        try:
+            response = await asyncio.wait_for(
+                get_model().generate_content_async(prompt), getattr(settings, 'AI_TIMEOUT', 60),
+            )
+        except asyncio.TimeoutError:
+            raise AITimeout("The AI model took too long to answer.")
+    return response.text
+
+
+async def generate_cached(endpoint, params, prompt, user_key):
+    """
+    Like generate(), but answers from the AI cache when the same normalized
+    `params` were asked of `endpoint` before, and shares one model call
+    between identical requests in flight (recipe_app.singleflight).
+    Returns (text, cache_status) with cache_status 'hit', 'miss',
+    'coalesced' or 'bypass' (caching off for the endpoint).
+    """
+    ttl = ai_cache.ttl_for(endpoint)
+    if not ttl:
+        return await generate(prompt, user_key), 'bypass'
+    key = ai_cache.make_key(endpoint, params)
+    text = ai_cache.responses.get(key)
+    if text is not None:
+        return text, 'hit'
+
+    async def call():
+        started = time.monotonic()
+        text = await generate(prompt, user_key)
+        ai_cache.responses.put(key, text, ttl, time.monotonic() - started)
+        return text
+
+    try:
+        text, coalesced = await singleflight.flights.run(key, call)
+    except asyncio.TimeoutError:
+        raise AITimeout("The AI model took too long to answer.")
+    return text, 'coalesced' if coalesced else 'miss'
+
+
+async def stream(prompt, user_key):
+    """
+    Yield the model's answer in chunks as it is generated. The concurrency
+    slots are held until the stream ends or is closed; AI_TIMEOUT bounds the
+    wait for each chunk.
+    """
+    timeout = getattr(settings, 'AI_TIMEOUT', 60)
+    async with limiter.slot(user_key):
+        try:
+            response = await asyncio.wait_for(get_model().generate_content_async(prompt, stream=True), timeout)
+            chunks = aiter(response)
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), timeout)
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    yield chunk.text
+        except asyncio.TimeoutError:
+            raise AITimeout("The AI model took too long to answer.")
+
+
+class AnswerStream:
+    """
+    Async iterator over an answer's chunks for `endpoint`. A cached answer
+    comes back as a single chunk; a fresh one is streamed and then cached.
+    """
+
+    def __init__(self, endpoint, params, prompt, user_key):
+        self.endpoint = endpoint
+        self.params = params
+        self.prompt = prompt
+        self.user_key = user_key
+        self.cache_status = None
+        self.chunks = []
+        self.started = self.first_chunk_at = self.finished = None
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def timing(self):
+        def ms(moment):
+            return round((moment - self.started) * 1000) if moment is not None else None
+        return {'first_chunk_ms': ms(self.first_chunk_at), 'total_ms': ms(self.finished), 'chunks': len(self.chunks)}
+
+    async def __aiter__(self):
+        self.started = time.monotonic()
+        ttl = ai_cache.ttl_for(self.endpoint)
+        key = ai_cache.make_key(self.endpoint, self.params)
+        cached = ai_cache.responses.get(key) if ttl else None
+        if cached is not None:
+            self.cache_status = 'hit'
+            self._add(cached)
+            yield cached
+        else:
+            self.cache_status = 'miss' if ttl else 'bypass'
+            async for chunk in stream(self.prompt, self.user_key):
+                self._add(chunk)
+                yield chunk
+        self.finished = time.monotonic()
+        if self.cache_status == 'miss':
+            ai_cache.responses.put(key, self.text, ttl, self.finished - self.started)
+
+    def _add(self, chunk):
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+        self.chunks.append(chunk)
+
+
+def wants_stream(request, data):
+    return request.GET.get('stream') in ('1', 'true') or data.get('stream') in (True, 1, '1', 'true')
+
+
+def sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def sse_response(request, events):
+    """
+    Stream `events` (an async generator of sse() strings) as text/event-stream.
+    The first event is produced before the response starts, so a busy
+    service or a model that never answers still gets a proper status code;
+    later failures are sent as an `error` event.
+    """
+    if not isinstance(request, ASGIRequest):
+        # under WSGI the whole stream would be buffered on a worker thread
+        await events.aclose()
+        return JsonResponse({"error": "Streaming needs the ASGI server."}, status=501)
+    try:
+        first = await anext(events, '')
+    except BaseException:
+        await events.aclose()
+        raise
+
+    async def body():
+        try:
+            yield first
+            async for event in events:
+                yield event
+        except AIError as exc:
+            yield sse('error', {'error': str(exc), 'status': exc.status})
+        except Exception as exc:
+            yield sse('error', {'error': f"AI generation failed: {exc}", 'status': 500})
+        finally:
+            # also runs when the client disconnects and the server closes the stream
+            await events.aclose()
+
+    response = StreamingHttpResponse(body(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def ai_view(require_auth=True):
+    """
+    Wraps an async view `view(request, data, user_key)` for the AI endpoints:
+    POST only, JSON or form body, JWT auth, and AIError -> JSON error.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request):
+            if request.method != 'POST':
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+            user = await sync_to_async(get_jwt_user)(request)
+            if require_auth and user is None:
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+            if request.content_type == 'application/json':
+                try:
+                    data = json.loads(request.body or b'{}')
+                except ValueError:
+                    return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+            else:
+                data = request.POST
+            if not isinstance(data, dict):
+                return JsonResponse({"detail": "Expected a JSON object."}, status=400)
+            user_key = f'user:{user.pk}' if user is not None else f"ip:{request.META.get('REMOTE_ADDR')}"
+            try:
+                return await view(request, data, user_key)
+            except AIError as exc:
+                return JsonResponse({"error": str(exc)}, status=exc.status)
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""
+In-process cache of model answers for the AI views.
+
+Entries are keyed on the endpoint plus its inputs in normalized form
+(case-folded, whitespace collapsed, parameters sorted), so "Chicken  Soup"
+and "chicken soup" share one answer. Each endpoint has its own TTL
+(AI_CACHE_TTLS; 0 turns caching off for it), and the whole cache is an LRU
+bounded by AI_CACHE_MAX_ENTRIES and AI_CACHE_MAX_BYTES.
+
+The cache lives in the worker process: answers are large, hot for minutes
+to hours, and the point is to skip a multi-second model call, so a local
+dict beats a network round trip. Metrics are per process too.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_TTLS = {
+    'trending': 15 * 60,
+    'cooking_coach': 60 * 60,
+    'structured_recipe': 24 * 60 * 60,
+    'recipe_guide': 24 * 60 * 60,
+}
+
+
+def normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    return value
+
+
+def make_key(endpoint, params):
+    source = json.dumps(normalize(params), sort_keys=True, default=str)
+    return f'{endpoint}:{hashlib.sha256(source.encode()).hexdigest()}'
+
+
+def ttl_for(endpoint):
+    ttls = {**DEFAULT_TTLS, **getattr(settings, 'AI_CACHE_TTLS', {})}
+    return ttls.get(endpoint, 0)
+
+
+class AIResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (text, expires_at, size, latency)
+        self._bytes = 0
+        self.metrics = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'latency_saved': 0.0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._drop(key)
+                self.metrics['expired'] += 1
+                entry = None
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            self.metrics['latency_saved'] += entry[3]
+            return entry[0]
+
+    def put(self, key, text, ttl, latency):
+        size = len(text.encode())
+        max_bytes = getattr(settings, 'AI_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+        if size > max_bytes:
+            return
+        max_entries = getattr(settings, 'AI_CACHE_MAX_ENTRIES', 1000)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (text, time.monotonic() + ttl, size, latency)
+            self._bytes += size
+            while len(self._entries) > max_entries or self._bytes > max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.metrics['evictions'] += 1
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for name in self.metrics:
+                self.metrics[name] = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return dict(
+                self.metrics,
+                latency_saved=round(self.metrics['latency_saved'], 3),
+                hit_rate=round(self.metrics['hits'] / lookups, 3) if lookups else None,
+                entries=len(self._entries),
+                bytes=self._bytes,
+            )
+
+
+responses = AIResponseCache()
@@ -0,0 +1,20 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+_jwt = JWTAuthentication()
+
+
+def get_jwt_user(request, raw_token=None):
+    """
+    The user for a plain Django request (async views, streams) carrying a
+    simplejwt access token in the Authorization header, or `raw_token` when
+    the client can't send headers. None when missing or invalid.
+    """
+    header = _jwt.get_header(request)
+    raw = _jwt.get_raw_token(header) if header else (raw_token or '').encode()
+    if not raw:
+        return None
+    try:
+        return _jwt.get_user(_jwt.get_validated_token(raw))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
@@ -0,0 +1,106 @@
+"""
+Versioned response cache for anonymous read endpoints.
+
+A cached response is stored under the current version of every namespace
+it depends on ("categories", "recipes", "recipe:<id>"). Model signals bump
+those versions (see signals.py), so stale entries are never read again and
+simply age out. A bump waits for the writing transaction to commit: bumped
+earlier, a concurrent reader could still see the old rows and store them
+under the new version. Hit/miss counters are kept per endpoint in the same cache.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+ENDPOINTS = set()
+
+
+def _version_key(namespace):
+    return f'ver:{namespace}'
+
+
+def get_versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: int(time.time() * 1000) for key in keys if key not in versions}
+    if missing:
+        # start from a timestamp so an evicted counter never reuses an old version
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*namespaces):
+    """Move `namespaces` to a new version once the current transaction commits (at once outside one)."""
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), int(time.time() * 1000), None)
+
+
+def _count(endpoint, outcome):
+    key = f'stats:{endpoint}:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats():
+    keys = [f'stats:{endpoint}:{outcome}' for endpoint in sorted(ENDPOINTS) for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    report = {}
+    for endpoint in sorted(ENDPOINTS):
+        hits = values.get(f'stats:{endpoint}:hit', 0)
+        misses = values.get(f'stats:{endpoint}:miss', 0)
+        total = hits + misses
+        report[endpoint] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else None}
+    return report
+
+
+def cached_response(endpoint, namespaces):
+    """
+    Cache anonymous GET responses of a DRF view method. `namespaces` is a list
+    or a callable taking the view's (request, *args, **kwargs).
+    """
+    ENDPOINTS.add(endpoint)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+
+            depends_on = namespaces(request, *args, **kwargs) if callable(namespaces) else namespaces
+            versions = get_versions(depends_on)
+            query = request.GET.urlencode()
+            digest = hashlib.md5(f'{sorted(kwargs.items())}|{query}'.encode()).hexdigest()
+            key = f"resp:{endpoint}:{'.'.join(map(str, versions))}:{digest}"
+
+            content = cache.get(key)
+            if content is not None:
+                _count(endpoint, 'hit')
+                response = HttpResponse(content, content_type='application/json')
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(endpoint, 'miss')
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, JSONRenderer().render(response.data), settings.RESPONSE_CACHE_TTL)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
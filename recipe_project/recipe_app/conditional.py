@@ -0,0 +1,52 @@
+"""
+Conditional GET support (ETag / Last-Modified).
+
+Views supply cheap validators and a matching If-None-Match /
+If-Modified-Since gets a 304 before anything is serialized. Recipe views
+tag responses with the response cache's namespace versions (see cache.py),
+which every change that shows up in a recipe payload bumps; they send no
+Last-Modified, since no single timestamp covers all of those. Categories
+use max(updated_at) plus a row count.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    # responses embed per-user fields (is_favorite), so the user is part of the tag
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    source = '|'.join(str(part) for part in (*parts, user_id, request.GET.urlencode()))
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+def conditional_get(validators):
+    """
+    Decorate a DRF view method. `validators(view, request, *args, **kwargs)`
+    returns (etag_parts, last_modified) or None to skip the check.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+            result = validators(self, request, *args, **kwargs)
+            if result is None:
+                return view_method(self, request, *args, **kwargs)
+
+            etag_parts, last_modified = result
+            etag = make_etag(request, *etag_parts)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+                patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,222 @@
+"""
+Per-user push events (new direct shares, feed items, comment replies),
+streamed to connected clients as server-sent events by EventStreamView.
+
+Publishing goes through a broker chosen by settings.EVENTS_BROKER:
+
+* InProcessBroker (default) fans events out to the connections held by this
+  process. Enough for a single worker.
+* RedisBroker publishes through Redis pub/sub (needs the `redis` package and
+  REDIS_URL), so every worker delivers to its own connections.
+
+Each connection is an asyncio.Queue on the serving event loop, so an idle
+connection costs one queue and one suspended coroutine, not a thread.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views import View
+
+from recipe_app.authentication import get_jwt_user
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+
+    def deliver(self, event):
+        """Called from any thread; hands the event to the subscriber's loop."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the serving loop has shut down without closing the stream
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            # slow consumer: drop the oldest event rather than grow without bound
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_ids, event_type, data):
+        self.deliver(user_ids, {'id': next(self._ids), 'type': event_type, 'data': data})
+
+    def deliver(self, user_ids, event):
+        with self._lock:
+            targets = [sub for user_id in user_ids for sub in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.deliver(event)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Shares events between workers through one Redis pub/sub channel. If the
+    connection drops, the listener logs it and resubscribes with exponential
+    backoff; events published while it is down are not replayed.
+    """
+    channel = 'recipe-app:events'
+    backoff = (0.5, 30)  # first and longest wait between resubscribe attempts, seconds
+
+    def __init__(self):
+        super().__init__()
+        import redis
+        self.redis = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+
+    def subscribe(self, user_id):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+                    self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_ids, event_type, data):
+        payload = {'user_ids': list(user_ids), 'event': {'type': event_type, 'data': data}}
+        self.redis.publish(self.channel, json.dumps(payload, cls=DjangoJSONEncoder))
+
+    def _listen(self):
+        delay = self.backoff[0]
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                delay = self.backoff[0]
+                for message in pubsub.listen():
+                    self._receive(message)
+            except Exception:
+                logger.exception("Redis event listener lost its subscription; retrying in %.1fs", delay)
+            finally:
+                pubsub.close()
+            time.sleep(delay)
+            delay = min(delay * 2, self.backoff[1])
+
+    def _receive(self, message):
+        try:
+            payload = json.loads(message['data'])
+            user_ids, event = payload['user_ids'], payload['event']
+        except (TypeError, ValueError, KeyError):
+            logger.warning("Ignoring malformed event on %s: %r", self.channel, message.get('data'))
+            return
+        self.deliver(user_ids, dict(event, id=next(self._ids)))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'EVENTS_BROKER', 'recipe_app.events.InProcessBroker'))()
+    return _broker
+
+
+def notify(user_ids, event_type, data):
+    """Publish once the surrounding transaction commits, so clients never see rolled-back rows."""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: get_broker().publish(user_ids, event_type, data))
+
+
+def share_payload(share):
+    return {
+        'share_id': share.id,
+        'sender': share.sender.username,
+        'recipe_id': share.recipe_id,
+        'recipe_title': share.recipe.title,
+        'message': share.message,
+        'shared_at': share.shared_at,
+    }
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class EventStreamView(View):
+    """
+    GET /api/auth/events/ as text/event-stream. EventSource can't send
+    headers, so the access token may also be passed as ?token=. A comment
+    line goes out every EVENTS_KEEPALIVE seconds so proxies keep idle
+    streams open.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # a WSGI worker would block a whole thread per open stream
+            return HttpResponse("Event stream needs the ASGI server.", status=501)
+        user = await sync_to_async(get_jwt_user)(request, request.GET.get('token'))
+        if user is None:
+            return HttpResponse(status=401)
+
+        response = StreamingHttpResponse(self.stream(user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, user_id):
+        keepalive = getattr(settings, 'EVENTS_KEEPALIVE', 15)
+        subscription = get_broker().subscribe(user_id)
+        try:
+            yield f"retry: {getattr(settings, 'EVENTS_RETRY_MS', 5000)}\n\n"
+            while True:
+                try:
+                    event = await subscription.get(keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_event(event)
+        finally:
+            # runs when the client disconnects and the server cancels the stream
+            subscription.close()
@@ -0,0 +1,268 @@
+"""
+Fan-out-on-write home feed.
+
+New recipes and share_to_followers calls are pushed as FeedEntry rows to
+every follower, so reading a feed is one indexed range scan on
+(owner, -created_at, -id). Authors with more than FEED_FANOUT_LIMIT
+followers are not fanned out; their items are merged in at read time
+and no push event is sent for them.
+"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from recipe_app import events
+from recipe_app.models import FeedEntry, Follow, Recipe, SharedRecipe
+
+BATCH_SIZE = 1000
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+
+
+def is_fan_out_on_read(user_id):
+    return Follow.objects.filter(following_id=user_id).count() > fanout_limit()
+
+
+def _push(rows):
+    FeedEntry.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe):
+    if is_fan_out_on_read(recipe.author_id):
+        return
+    follower_ids = list(Follow.objects.filter(following_id=recipe.author_id).values_list('follower_id', flat=True))
+    _push(
+        FeedEntry(owner_id=follower_id, actor_id=recipe.author_id, recipe=recipe, created_at=recipe.created_at)
+        for follower_id in follower_ids
+    )
+    events.notify(follower_ids, 'feed', {'recipe_id': recipe.id, 'title': recipe.title, 'actor_id': recipe.author_id})
+
+
+def fan_out_share(shared):
+    if is_fan_out_on_read(shared.sender_id):
+        return
+    # followers of the recipe's author already get it as an authored item
+    author_id = Recipe.objects.filter(pk=shared.recipe_id).values_list('author_id', flat=True)
+    follower_ids = list(
+        Follow.objects.filter(following_id=shared.sender_id)
+        .exclude(follower_id__in=Follow.objects.filter(following_id__in=author_id).values('follower_id'))
+        .values_list('follower_id', flat=True)
+    )
+    _push(
+        FeedEntry(owner_id=follower_id, actor_id=shared.sender_id, recipe_id=shared.recipe_id,
+                  shared=shared, created_at=shared.shared_at)
+        for follower_id in follower_ids
+    )
+    events.notify(follower_ids, 'feed', {
+        'recipe_id': shared.recipe_id, 'shared_id': shared.id, 'actor_id': shared.sender_id,
+    })
+
+
+def backfill(owner, target):
+    """Seed a new follower's feed with the target's latest items."""
+    if is_fan_out_on_read(target.pk):
+        return
+    size = getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+    followed = Follow.objects.filter(follower=owner).values('following_id')
+    recipes = Recipe.objects.filter(author=target).order_by('-created_at')[:size]
+    shares = SharedRecipe.objects.filter(sender=target).exclude(recipe__author__in=followed).order_by('-shared_at')[:size]
+    _push(
+        [FeedEntry(owner=owner, actor=target, recipe=recipe, created_at=recipe.created_at) for recipe in recipes]
+        + [FeedEntry(owner=owner, actor=target, recipe_id=share.recipe_id, shared=share, created_at=share.shared_at)
+           for share in shares]
+    )
+
+
+def prune(owner, target):
+    FeedEntry.objects.filter(owner=owner, actor=target).delete()
+
+
+def _fan_out_on_read_authors(owner):
+    followed = Follow.objects.filter(follower=owner).values('following_id')
+    return list(
+        Follow.objects.filter(following_id__in=followed)
+        .values('following_id')
+        .annotate(followers=Count('id'))
+        .filter(followers__gt=fanout_limit())
+        .values_list('following_id', flat=True)
+    )
+
+
+def _feed_key(item):
+    """Sort key for newest-first feed order: (-created_at, kind, -item_id), as merged_feed orders rows."""
+    kind, item_id = ('recipe', item.recipe_id) if item.shared_id is None else ('shared', item.shared_id)
+    return -(item.created_at - EPOCH), kind, -item_id
+
+
+def _cursor_row(item):
+    key = _feed_key(item)
+    return {'created_at': item.created_at, 'kind': key[1], 'item_id': -key[2]}
+
+
+def read_feed(owner, cursor=None, limit=20):
+    """
+    One page of the feed, newest first, as FeedEntry-like objects, and the
+    cursor of the next page (or None). `cursor` is a decode_cursor() value;
+    like merged_feed, pages are keyed on (created_at, kind, item id), so
+    items sharing a timestamp are neither skipped nor repeated.
+    """
+    entries = FeedEntry.objects.filter(owner=owner).select_related('recipe__author', 'actor')
+    if cursor is not None:
+        entries = entries.filter(
+            (Q(shared__isnull=True) & _after('recipe', 'created_at', cursor, item_field='recipe_id'))
+            | (Q(shared__isnull=False) & _after('shared', 'created_at', cursor, item_field='shared_id'))
+        )
+    entries = entries.annotate(
+        kind=Case(When(shared__isnull=True, then=Value('recipe')), default=Value('shared')),
+        item_id=Coalesce('shared_id', 'recipe_id'),
+    )
+    sources = [list(entries.order_by('-created_at', 'kind', '-item_id')[:limit + 1])]
+
+    celebrities = _fan_out_on_read_authors(owner)
+    if celebrities:
+        followed = Follow.objects.filter(follower=owner).values('following_id')
+        recipes = Recipe.objects.filter(author_id__in=celebrities).select_related('author')
+        shares = (
+            SharedRecipe.objects.filter(sender_id__in=celebrities)
+            .exclude(recipe__author__in=followed)
+            .select_related('sender', 'recipe__author')
+        )
+        if cursor is not None:
+            recipes = recipes.filter(_after('recipe', 'created_at', cursor))
+            shares = shares.filter(_after('shared', 'shared_at', cursor))
+        sources.append([
+            FeedEntry(owner=owner, actor=recipe.author, recipe=recipe, created_at=recipe.created_at)
+            for recipe in recipes.order_by('-created_at', '-id')[:limit + 1]
+        ])
+        sources.append([
+            FeedEntry(owner=owner, actor=share.sender, recipe=share.recipe, shared=share, created_at=share.shared_at)
+            for share in shares.order_by('-shared_at', '-id')[:limit + 1]
+        ])
+
+    # a source that filled its fetch may have more rows past its last one, so
+    # nothing beyond the earliest such boundary is known to be complete
+    truncated = [_feed_key(rows[-1]) for rows in sources if len(rows) > limit]
+    boundary = min(truncated) if truncated else None
+    items, seen = [], set()
+    for item in sorted((item for rows in sources for item in rows), key=_feed_key):
+        if boundary is not None and _feed_key(item) > boundary:
+            break
+        # an author over the fan-out limit may still have materialized rows
+        # (backfilled or pushed before crossing it): show each recipe once
+        if item.recipe_id in seen:
+            continue
+        seen.add(item.recipe_id)
+        items.append(item)
+
+    if len(items) > limit:
+        return items[:limit], _encode_cursor(_cursor_row(items[limit - 1]))
+    next_cursor = _encode_cursor(_cursor_row(items[-1])) if boundary is not None and items else None
+    return items, next_cursor
+
+
+def serialize_item(item, request):
+    """Same item shapes the feed has always returned for authored and shared recipes."""
+    recipe = item.recipe
+    if item.shared_id is None:
+        return {
+            'id': recipe.id,
+            'title': recipe.title,
+            'image': request.build_absolute_uri(recipe.image.url) if recipe.image else None,
+            'author': recipe.author.username,
+            'created_at': item.created_at,
+            'author_id': recipe.author_id,
+        }
+    return {
+        'id': f'shared-{item.shared_id}',
+        'type': 'shared',
+        'shared_by': item.actor.username,
+        'recipe_id': recipe.id,
+        'title': recipe.title,
+        'image': recipe.image.url if recipe.image else None,
+        'author': recipe.author.username,
+        'created_at': item.created_at,
+    }
+
+
+# ---------- Merged feed without materialization ----------
+def _encode_cursor(row):
+    raw = f"{row['created_at'].isoformat()}|{row['kind']}|{row['item_id']}"
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, kind, item_id); raises ValueError on a bad cursor."""
+    try:
+        created_at, kind, item_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), kind, int(item_id)
+    except (TypeError, UnicodeDecodeError, binascii.Error) as exc:
+        raise ValueError(cursor) from exc
+
+
+def _after(kind, time_field, cursor, item_field='pk'):
+    # rows sort by (-created_at, kind, -item_id); `kind` is constant per branch
+    created_at, cursor_kind, item_id = cursor
+    ties = Q(**{f'{item_field}__lt': item_id}) if kind == cursor_kind else Q() if kind > cursor_kind else Q(pk__in=[])
+    return Q(**{f'{time_field}__lt': created_at}) | (Q(**{time_field: created_at}) & ties)
+
+
+def merged_feed(owner, cursor=None, limit=20):
+    """
+    One page of authored and shared items as a single ordered UNION query,
+    with the recipe, author and sharer columns joined in. Shares of recipes
+    whose author the owner already follows are left out. Returns
+    (rows, next_cursor).
+    """
+    followed = Follow.objects.filter(follower=owner).values('following_id')
+    authored = Recipe.objects.filter(author__in=followed)
+    shared = SharedRecipe.objects.filter(sender__in=followed).exclude(recipe__author__in=followed)
+    if cursor is not None:
+        authored = authored.filter(_after('recipe', 'created_at', cursor))
+        shared = shared.filter(_after('shared', 'shared_at', cursor))
+
+    columns = ['kind', 'item_id', 'recipe_id', 'title', 'image', 'author_name', 'author_id', 'actor_name', 'created_at']
+    authored = authored.annotate(
+        kind=Value('recipe'), item_id=F('id'), recipe_id=F('id'), author_name=F('author__username'),
+        actor_name=F('author__username'),
+    ).values(*columns)
+    shared = shared.annotate(
+        kind=Value('shared'), item_id=F('id'), title=F('recipe__title'), image=F('recipe__image'),
+        author_name=F('recipe__author__username'), author_id=F('recipe__author_id'),
+        actor_name=F('sender__username'), created_at=F('shared_at'),
+    ).values(*columns)
+
+    rows = list(authored.union(shared).order_by('-created_at', 'kind', '-item_id')[:limit + 1])
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def serialize_row(row, request):
+    """Same item shapes as serialize_item, from a merged_feed row."""
+    image = default_storage.url(row['image']) if row['image'] else None
+    if row['kind'] == 'recipe':
+        return {
+            'id': row['item_id'],
+            'title': row['title'],
+            'image': request.build_absolute_uri(image) if image else None,
+            'author': row['author_name'],
+            'created_at': row['created_at'],
+            'author_id': row['author_id'],
+        }
+    return {
+        'id': f"shared-{row['item_id']}",
+        'type': 'shared',
+        'shared_by': row['actor_name'],
+        'recipe_id': row['recipe_id'],
+        'title': row['title'],
+        'image': image,
+        'author': row['author_name'],
+        'created_at': row['created_at'],
+    }
@@ -0,0 +1,128 @@
+"""
+Follow graph: single-statement follow/unfollow, the follower/following
+counters on UserStats, and cached friend-of-friend suggestions, computed for
+many users per query by precompute_suggestions (see the
+precompute_follow_suggestions command) or on demand for one.
+
+Follow rows are written only through follow()/unfollow() (or the viewset
+hooks that call the same counter update), so there are no Follow signals
+and unfollow stays a single DELETE. reconcile_user_stats repairs counters
+after edits made elsewhere, e.g. in the admin.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from recipe_app import feed
+from recipe_app.models import Follow, UserStats
+
+CREATED, EXISTS, MISSING = 'created', 'exists', 'missing'
+
+
+def suggestions_key(user_id):
+    return f'follow-suggestions:{user_id}'
+
+
+def edge_changed(follower_id, following_id, delta):
+    UserStats.apply_follow_delta(follower_id, following_id, delta)
+    # the edge changes the follower's candidates and those of everyone who
+    # follows them; like feed fan-out, past FEED_FANOUT_LIMIT followers their
+    # entries are left to age out (or to the next precompute)
+    limit = feed.fanout_limit()
+    affected = list(Follow.objects.filter(following_id=follower_id).values_list('follower_id', flat=True)[:limit + 1])
+    if len(affected) > limit:
+        affected = []
+    cache.delete_many([suggestions_key(user_id) for user_id in [follower_id, *affected]])
+
+
+def follow(user, target_id):
+    """
+    Insert the edge if the target exists and it is not there yet, in one
+    statement. Returns (CREATED | EXISTS | MISSING, target or None).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {Follow._meta.db_table} (follower_id, following_id, created_at) '
+                f'SELECT %s, id, %s FROM {User._meta.db_table} WHERE id = %s '
+                f'ON CONFLICT (follower_id, following_id) DO NOTHING',
+                [user.pk, timezone.now(), target_id],
+            )
+            created = cursor.rowcount == 1
+        target = User.objects.filter(pk=target_id).first()
+        if target is None:
+            return MISSING, None
+        if not created:
+            return EXISTS, target
+        edge_changed(user.pk, target.pk, 1)
+    feed.backfill(user, target)
+    return CREATED, target
+
+
+def unfollow(user, target_id):
+    """Delete the edge in one statement; returns whether it existed."""
+    deleted, _ = Follow.objects.filter(follower=user, following_id=target_id).delete()
+    if deleted:
+        edge_changed(user.pk, target_id, -1)
+        feed.prune(user, target_id)
+    return bool(deleted)
+
+
+def followers_of(user_id):
+    return Follow.objects.filter(following_id=user_id).select_related('follower')
+
+
+def following_of(user_id):
+    return Follow.objects.filter(follower_id=user_id).select_related('following')
+
+
+def compute_suggestions(user_ids, limit=10):
+    """
+    Friend-of-friend candidates for many users in one grouped query: people
+    followed by the people each user follows, ranked by how many of them
+    do, minus the user and anyone they already follow.
+    Returns {user_id: [(candidate_id, mutual_count), ...]}.
+    """
+    already = Follow.objects.filter(follower_id=OuterRef('viewer'), following_id=OuterRef('following_id'))
+    rows = (
+        Follow.objects.annotate(viewer=F('follower__followers__follower_id'))
+        .filter(viewer__in=user_ids)
+        .exclude(following_id=F('viewer'))
+        .filter(~Exists(already))
+        .values('viewer', 'following_id')
+        .annotate(mutual=Count('id'))
+        .order_by('viewer', '-mutual', 'following_id')
+    )
+    suggestions = {user_id: [] for user_id in user_ids}
+    for row in rows:
+        ranked = suggestions[row['viewer']]
+        if len(ranked) < limit:
+            ranked.append((row['following_id'], row['mutual']))
+    return suggestions
+
+
+def precompute_suggestions(user_ids):
+    """Compute and cache suggestions for `user_ids` with one grouped query; returns them."""
+    computed = compute_suggestions(user_ids, limit=getattr(settings, 'FOLLOW_SUGGESTIONS_SIZE', 20))
+    cache.set_many(
+        {suggestions_key(user_id): ranked for user_id, ranked in computed.items()},
+        getattr(settings, 'FOLLOW_SUGGESTIONS_TTL', 3600),
+    )
+    return computed
+
+
+def suggestions_for(user_id, limit=10):
+    """Cached per user; follow() and unfollow() drop the affected entries."""
+    ranked = cache.get(suggestions_key(user_id))
+    if ranked is None:
+        ranked = precompute_suggestions([user_id])[user_id]
+    ranked = ranked[:limit]
+    users = User.objects.in_bulk([candidate_id for candidate_id, _ in ranked])
+    return [
+        {'id': candidate_id, 'username': users[candidate_id].username, 'mutual_count': mutual}
+        for candidate_id, mutual in ranked
+        if candidate_id in users
+    ]
@@ -0,0 +1,99 @@
+"""
+Ingredient inverted index.
+
+Free-text ingredient lines ("2 cups fresh basil leaves, chopped") are
+reduced to normalized terms ("basil leaf") and stored one row per
+(term, recipe) in RecipeIngredient, so ingredient questions become indexed
+set operations instead of LIKE scans over Recipe.ingredients.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from recipe_app.models import RecipeIngredient
+
+UNITS = {
+    'cup', 'cups', 'tbsp', 'tbs', 'tablespoon', 'tablespoons', 'tsp', 'teaspoon', 'teaspoons',
+    'g', 'gram', 'grams', 'kg', 'kilogram', 'kilograms', 'mg', 'ml', 'milliliter', 'milliliters',
+    'l', 'liter', 'liters', 'litre', 'litres', 'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds',
+    'pinch', 'pinches', 'dash', 'dashes', 'clove', 'cloves', 'slice', 'slices', 'can', 'cans',
+    'package', 'packages', 'bunch', 'bunches', 'handful', 'handfuls', 'piece', 'pieces', 'sprig', 'sprigs',
+    'stick', 'sticks', 'quart', 'quarts', 'pint', 'pints', 'inch', 'inches', 'cm',
+}
+DESCRIPTORS = {
+    'a', 'an', 'and', 'of', 'or', 'to', 'for', 'the', 'taste', 'optional', 'about', 'some',
+    'fresh', 'freshly', 'dried', 'chopped', 'finely', 'roughly', 'diced', 'minced', 'sliced', 'thinly',
+    'grated', 'ground', 'crushed', 'peeled', 'large', 'medium', 'small', 'whole', 'ripe', 'cooked',
+    'uncooked', 'raw', 'boneless', 'skinless', 'softened', 'melted', 'beaten', 'cold', 'warm', 'hot',
+    'extra', 'virgin', 'packed', 'heaping', 'level', 'halved', 'cubed', 'shredded', 'frozen', 'thawed',
+}
+# irregular or ambiguous plurals; everything else goes through singularize()
+SINGULAR = {'leaves': 'leaf', 'potatoes': 'potato', 'tomatoes': 'tomato', 'molasses': 'molasses',
+            'hummus': 'hummus', 'couscous': 'couscous', 'asparagus': 'asparagus', 'swiss': 'swiss'}
+
+MAX_TERM_LENGTH = 100
+
+
+def singularize(word):
+    if word in SINGULAR:
+        return SINGULAR[word]
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize_term(text):
+    """Reduce one ingredient line or pantry item to its normalized term, or '' if nothing is left."""
+    text = re.sub(r'\(.*?\)', ' ', text.lower())
+    text = text.split(',')[0]  # "onion, diced" -> "onion"
+    words = re.findall(r"[a-z][a-z'-]*", text)
+    words = [singularize(word) for word in words if word not in UNITS and word not in DESCRIPTORS]
+    return ' '.join(words)[:MAX_TERM_LENGTH].strip()
+
+
+def parse_ingredients(text):
+    """Normalized, de-duplicated terms for a recipe's free-text ingredients."""
+    lines = re.split(r'[\n;]+', text or '')
+    if len(lines) == 1:
+        # single-line lists are usually comma separated
+        lines = lines[0].split(',')
+    return {term for term in (normalize_term(line) for line in lines) if term}
+
+
+def index_recipe(recipe):
+    """Sync a recipe's index rows with its ingredients. Returns True if the term set changed."""
+    terms = parse_ingredients(recipe.ingredients)
+    existing = set(RecipeIngredient.objects.filter(recipe=recipe).values_list('term', flat=True))
+    if terms == existing:
+        return False
+    with transaction.atomic():
+        RecipeIngredient.objects.filter(recipe=recipe, term__in=existing - terms).delete()
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=recipe, term=term) for term in terms - existing],
+            ignore_conflicts=True,
+        )
+    return True
+
+
+def rank_by_pantry(queryset, terms):
+    """
+    Recipes using at least one of `terms`, ranked by coverage: fewest missing
+    ingredients first, then most matched. Counting happens in the database.
+    """
+    totals = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return (
+        queryset.filter(ingredient_terms__term__in=terms)
+        .annotate(matched_count=Count('ingredient_terms', distinct=True), ingredient_count=Subquery(totals))
+        .annotate(missing_count=F('ingredient_count') - F('matched_count'))
+        .order_by('missing_count', '-matched_count', '-created_at')
+    )
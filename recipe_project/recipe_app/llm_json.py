@@ -0,0 +1,319 @@
+"""
+JSON extraction for model output.
+
+Models wrap their JSON in prose and markdown fences, leave trailing commas,
+write Python literals, and sometimes stop mid-object. parse() turns such an
+answer into a validated dict for one AI endpoint:
+
+* extract() first lets json's C decoder read one object from the first
+  brace and ignore whatever follows. When that fails, ObjectScanner finds
+  the balanced top-level {...} in one pass that tracks strings and escapes,
+  so braces in the prose or inside string values don't confuse it. It can
+  also be fed chunk by chunk.
+* repair() fixes common defects before a second json.loads attempt.
+* SCHEMAS check (and lightly coerce) the fields each endpoint relies on.
+
+SectionScanner builds on the same scan for streamed answers. It hands back
+each top-level member as soon as it is complete.
+"""
+import json
+import re
+
+
+class ExtractionError(ValueError):
+    pass
+
+
+STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.S)
+STRUCTURE = re.compile(r'[{}\[\]",]')
+DECODER = json.JSONDecoder(strict=False)
+
+
+class ObjectScanner:
+    """Finds the first balanced top-level JSON object in text fed in chunks."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.start = None
+        self.end = None
+
+    @property
+    def done(self):
+        return self.end is not None
+
+    def object_text(self):
+        """The object so far: complete once `done`, a truncated prefix before."""
+        if self.start is None:
+            return None
+        return self.buffer[self.start:self.end + 1 if self.done else None]
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        text = self.buffer
+        pos = self.pos
+        while self.end is None:
+            if self.depth == 0:
+                # before the object: prose and fences, not JSON
+                pos = text.find('{', pos)
+                if pos == -1:
+                    pos = len(text)
+                    break
+                self.depth = 1
+                self.start = pos
+                self.opened(pos)
+                pos += 1
+            elif self.in_string:
+                # jump to the closing quote; a trailing backslash waits for the next chunk
+                pos = STRING_BODY.match(text, pos).end()
+                if pos == len(text) or text[pos] != '"':
+                    break
+                pos += 1
+                self.in_string = False
+                if self.depth == 1:
+                    self.value_ended(text, pos)
+            else:
+                match = STRUCTURE.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                char = match.group()
+                pos = match.end()
+                if char == '"':
+                    self.in_string = True
+                elif char in '{[':
+                    self.depth += 1
+                elif char in '}]':
+                    self.depth -= 1
+                    if self.depth == 1:
+                        self.value_ended(text, pos)
+                    elif self.depth == 0:
+                        self.end = pos - 1
+                        self.delimiter(text, pos - 1)
+                elif self.depth == 1:
+                    self.delimiter(text, pos - 1)
+        self.pos = pos
+        return self.done
+
+    # hooks for subclasses, called at top-level boundaries
+    def opened(self, pos):
+        pass
+
+    def value_ended(self, text, end):
+        pass
+
+    def delimiter(self, text, pos):
+        pass
+
+
+class SectionScanner(ObjectScanner):
+    """
+    Streams the top-level members of the first JSON object: feed() returns
+    the [(key, value), ...] members each chunk completed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.member_start = None
+        self.sections = {}
+        self._completed = []
+
+    def feed(self, chunk):
+        self._completed = []
+        super().feed(chunk)
+        return self._completed
+
+    def opened(self, pos):
+        self.member_start = pos + 1
+
+    def value_ended(self, text, end):
+        # a string, object or array value may have just ended
+        self._close_member(text, end)
+
+    def delimiter(self, text, pos):
+        # numbers, booleans and null end only at the delimiter
+        self._close_member(text, pos)
+        self.member_start = pos + 1
+
+    def _close_member(self, text, end):
+        """Emit the member running up to `end` if it parses and hasn't been emitted yet."""
+        if self.member_start is None:
+            return
+        member = text[self.member_start:end]
+        if not member.strip():
+            return
+        try:
+            parsed = loads('{' + member + '}', close_truncated=False)
+        except ValueError:
+            return
+        self.member_start = None
+        for key, value in parsed.items():
+            self.sections[key] = value
+            self._completed.append((key, value))
+
+
+LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+# strings (group 1 is their closing quote), comments, words, brackets, everything else
+REPAIR_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*("?)|//[^\n]*|[A-Za-z_]+|[{}\[\],]|[^"/A-Za-z_{}\[\],]+|.', re.S)
+CLOSERS = {'{': '}', '[': ']'}
+
+
+def repair(text, close_truncated=True):
+    """
+    Fix what models commonly get wrong in otherwise-JSON text: trailing
+    commas, // comments, Python True/False/None, and (with close_truncated)
+    an answer cut off mid-object, closing its open string and brackets.
+    """
+    out = []
+    stack = []
+    unterminated = False
+    for match in REPAIR_TOKENS.finditer(text):
+        token = match.group()
+        if token[0] == '"':
+            out.append(token)
+            if not match.group(1):
+                # cut off inside a string (a dangling backslash is dropped)
+                unterminated = True
+                break
+        elif token.startswith('//'):
+            continue
+        elif token in LITERALS:
+            out.append(LITERALS[token])
+        elif token in CLOSERS:
+            stack.append(CLOSERS[token])
+            out.append(token)
+        elif token in '}]':
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(token)
+        else:
+            out.append(token)
+
+    if close_truncated and (stack or unterminated):
+        if unterminated:
+            out.append('"')
+        _drop_trailing_comma(out)
+        if ''.join(out).rstrip().endswith(':'):
+            out.append(' null')
+        for closer in reversed(stack):
+            _drop_trailing_comma(out)
+            out.append(closer)
+    return ''.join(out)
+
+
+def _drop_trailing_comma(out):
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ',':
+        del out[end - 1]
+
+
+def loads(text, close_truncated=True):
+    """json.loads, retried once on the repaired text."""
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        return json.loads(repair(text, close_truncated), strict=False)
+
+
+def extract(text, max_candidates=20):
+    """
+    The first {...} in `text` that parses (after repair if needed). Braces in
+    leading prose that don't start valid JSON are skipped.
+    """
+    offset = 0
+    for _ in range(max_candidates):
+        start = text.find('{', offset)
+        if start == -1:
+            break
+        try:
+            # well-formed answers: C-speed decode that stops at the object's end
+            data, _ = DECODER.raw_decode(text, start)
+        except ValueError:
+            scanner = ObjectScanner()
+            scanner.feed(text[start:])
+            try:
+                data = loads(scanner.object_text())
+            except ValueError:
+                data = None
+        if isinstance(data, dict):
+            return data
+        offset = start + 1
+    raise ExtractionError("No JSON object found in the model output.")
+
+
+class Schema:
+    """
+    Required and optional fields with their expected types; values are
+    coerced where that is unambiguous. Optional fields may be null.
+    """
+
+    def __init__(self, required=None, optional=None):
+        self.required = required or {}
+        self.optional = optional or {}
+
+    def validate(self, data):
+        # null means "no value": a gap in an optional field, a missing required one
+        problems = [f"missing {name}" for name in self.required if data.get(name) is None]
+        if not data:
+            problems.append("empty object")
+        cleaned = dict(data)
+        for name, kind in {**self.required, **self.optional}.items():
+            if data.get(name) is not None:
+                try:
+                    cleaned[name] = coerce(data[name], kind)
+                except (TypeError, ValueError):
+                    problems.append(f"{name} should be {kind.__name__}")
+        if problems:
+            raise ExtractionError("; ".join(problems))
+        return cleaned
+
+
+def coerce(value, kind):
+    if value is None:
+        raise TypeError(value)
+    if kind is int:
+        if isinstance(value, bool):
+            raise TypeError(value)
+        if isinstance(value, (int, float)):
+            return round(value)
+        match = re.search(r'\d+', str(value))
+        if match is None:
+            raise ValueError(value)
+        return int(match.group())
+    if kind is list:
+        if isinstance(value, list):
+            return value
+        if isinstance(value, str):
+            return [line.strip(' -*•\t') for line in value.splitlines() if line.strip(' -*•\t')]
+        raise TypeError(value)
+    if kind is str:
+        if isinstance(value, (dict, list)):
+            raise TypeError(value)
+        return value if isinstance(value, str) else str(value)
+    if not isinstance(value, kind):
+        raise TypeError(value)
+    return value
+
+
+SCHEMAS = {
+    'structured_recipe': Schema(
+        required={'title': str, 'ingredients': list, 'instructions': list},
+        optional={
+            'description': str, 'prep_time': int, 'cook_time': int, 'servings': int,
+            'difficulty': str, 'tips': list,
+        },
+    ),
+    'trending': Schema(required={'trending_recipes': list}),
+    # the guide prompt asks for "structured JSON" without fixing its keys
+    'recipe_guide': Schema(),
+}
+
+
+def parse(text, endpoint):
+    """Extract and validate the JSON answer for `endpoint`; raises ExtractionError."""
+    return SCHEMAS[endpoint].validate(extract(text))
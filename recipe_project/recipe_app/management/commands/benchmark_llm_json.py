@@ -0,0 +1,64 @@
+import json
+import re
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from recipe_app import llm_json
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / 'testdata' / 'llm_outputs'
+
+
+def legacy_parse(text, endpoint):
+    """What the AI views did before recipe_app.llm_json."""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match is None:
+        raise llm_json.ExtractionError("no match")
+    return json.loads(match.group())
+
+
+def streamed_parse(text, endpoint, chunk_size=64):
+    scanner = llm_json.SectionScanner()
+    for start in range(0, len(text), chunk_size):
+        scanner.feed(text[start:start + chunk_size])
+    if scanner.done and scanner.sections:
+        return llm_json.SCHEMAS[endpoint].validate(scanner.sections)
+    # as the streamed guide does: fall back to the whole answer
+    return llm_json.parse(scanner.buffer, endpoint)
+
+
+class Command(BaseCommand):
+    help = "Compare JSON extraction strategies on recorded model outputs (correctness and time per document)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=str(CORPUS_DIR), help="Directory with *.txt outputs and expected.json.")
+        parser.add_argument('--repeat', type=int, default=200, help="Timed passes over the corpus.")
+
+    def handle(self, *args, **options):
+        corpus = Path(options['corpus'])
+        expected = json.loads((corpus / 'expected.json').read_text())
+        cases = [((corpus / name).read_text(), case['endpoint'], case['data']) for name, case in expected.items()]
+
+        strategies = [('regex', legacy_parse), ('llm_json', llm_json.parse), ('streamed', streamed_parse)]
+        for label, parse in strategies:
+            correct = 0
+            for text, endpoint, data in cases:
+                try:
+                    result = parse(text, endpoint)
+                except ValueError:
+                    result = None
+                correct += result == data
+
+            runs = []
+            for _ in range(3):  # best of three, to keep scheduler noise out
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    for text, endpoint, _data in cases:
+                        try:
+                            parse(text, endpoint)
+                        except ValueError:
+                            pass
+                runs.append(time.perf_counter() - started)
+            per_doc = min(runs) / (options['repeat'] * len(cases))
+            self.stdout.write(f"{label:10} {correct}/{len(cases)} correct  {per_doc * 1e6:8.1f} us/doc")
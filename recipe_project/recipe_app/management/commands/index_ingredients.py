@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app import ingredients
+from recipe_app.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Backfill the ingredient inverted index from Recipe.ingredients."
+
+    def handle(self, *args, **options):
+        changed = total = 0
+        for recipe in Recipe.objects.only('id', 'ingredients').iterator(chunk_size=1000):
+            changed += ingredients.index_recipe(recipe)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} recipes ({changed} updated)."))
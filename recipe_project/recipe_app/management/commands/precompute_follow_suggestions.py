@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app import follows
+from recipe_app.models import Follow
+
+
+class Command(BaseCommand):
+    help = "Compute friend-of-friend follow suggestions in batches and store them in the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # only users who follow someone can have friend-of-friend candidates
+        user_ids = list(Follow.objects.order_by('follower_id').values_list('follower_id', flat=True).distinct())
+        for start in range(0, len(user_ids), batch_size):
+            follows.precompute_suggestions(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Cached follow suggestions for {len(user_ids)} users."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe_app import related
+from recipe_app.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized related-recipes index from category and ingredient overlap. "
+        "With --stale, only re-rank recipes marked stale by recent writes (run it as a worker with --loop)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--stale', action='store_true', help="Re-rank only recipes whose categories or ingredients changed.")
+        parser.add_argument('--loop', action='store_true', help="With --stale, keep polling instead of exiting when nothing is stale.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['stale']:
+            while True:
+                total = 0
+                while handled := related.rebuild_stale(batch_size):
+                    total += handled
+                if total or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(f"Re-ranked related recipes for {total} stale recipes."))
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+
+        recipe_ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(recipe_ids), batch_size):
+            related.rebuild_all(recipe_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related recipes for {len(recipe_ids)} recipes."))
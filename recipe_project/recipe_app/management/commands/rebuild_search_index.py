@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app import search
+from recipe_app.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search document of every recipe."
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        count = 0
+        for recipe in Recipe.objects.only('id', 'title', 'ingredients', 'description').iterator(chunk_size=1000):
+            backend.index(recipe)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} recipes with {type(backend).__name__}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.rating_count/rating_sum/rating_avg from the Rating table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int, help="Only these recipes (default: all).")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['recipe_ids']:
+            recipes = recipes.filter(id__in=options['recipe_ids'])
+        updated = recipes.reconcile_rating_stats()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled rating stats for {updated} recipes."))
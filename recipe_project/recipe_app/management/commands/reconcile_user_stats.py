@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app.models import UserStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the maintained UserStats counters from their source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help="Only these users (default: all with stats rows).")
+
+    def handle(self, *args, **options):
+        stats = UserStats.objects.all()
+        if options['user_ids']:
+            UserStats.ensure(options['user_ids'])
+            stats = stats.filter(user_id__in=options['user_ids'])
+        updated = stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters for {updated} users."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipe_app.digests import PERIODS, build_digests
+from recipe_app.outbox import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Queue daily or weekly digests for users who are due one (schedule hourly or daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('frequency', choices=sorted(PERIODS))
+        parser.add_argument('--batch-size', type=int, default=500, help="Users per transaction/checkpoint.")
+        parser.add_argument('--send', action='store_true', help="Deliver the outbox right away instead of leaving it to the worker.")
+
+    def handle(self, *args, **options):
+        users, queued = build_digests(options['frequency'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Checkpointed {users} users, queued {queued} {options['frequency']} digests."))
+        if options['send']:
+            stats = Dispatcher().drain()
+            self.stdout.write(self.style.SUCCESS(f"Sent {stats['sent']}, retrying {stats['retried']}, failed {stats['failed']}, deferred {stats['deferred']}."))
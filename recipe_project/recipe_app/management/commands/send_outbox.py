@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe_app.outbox import Dispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver due rows from the email outbox, one message per recipient over a reused SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Rows per batch (default: OUTBOX_BATCH_SIZE).")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the outbox is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = Dispatcher(batch_size=options['batch_size']).drain()
+            if stats['batches'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {stats['sent']}, retrying {stats['retried']}, failed {stats['failed']}, deferred {stats['deferred']} "
+                    f"in {stats['batches']} batches ({stats['per_second']} msg/s)."
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE recipe_app_recipe_search ("
+            " recipe_id bigint PRIMARY KEY REFERENCES recipe_app_recipe (id) ON DELETE CASCADE,"
+            " document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX recipe_search_document_gin ON recipe_app_recipe_search USING GIN (document)"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE recipe_app_recipe_search"
+            " USING fts5(title, ingredients, description, tokenize='porter unicode61')"
+        )
+
+
+def index_existing_recipes(apps, schema_editor):
+    # new recipes are indexed by signals.py; this covers the rows already there
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "INSERT INTO recipe_app_recipe_search (recipe_id, document)"
+            " SELECT id,"
+            " setweight(to_tsvector('english', title), 'A') ||"
+            " setweight(to_tsvector('english', ingredients), 'B') ||"
+            " setweight(to_tsvector('english', description), 'C')"
+            " FROM recipe_app_recipe"
+            " ON CONFLICT (recipe_id) DO NOTHING"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "INSERT INTO recipe_app_recipe_search (rowid, title, ingredients, description)"
+            " SELECT id, title, ingredients, description FROM recipe_app_recipe"
+            " WHERE id NOT IN (SELECT rowid FROM recipe_app_recipe_search)"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute("DROP TABLE IF EXISTS recipe_app_recipe_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0008_relatedrecipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+        migrations.RunPython(index_existing_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:37
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Recipe = apps.get_model('recipe_app', 'Recipe')
+    Rating = apps.get_model('recipe_app', 'Rating')
+    ratings = Rating.objects.filter(recipe=OuterRef('pk')).values('recipe')
+    Recipe.objects.update(
+        rating_count=Coalesce(Subquery(ratings.annotate(c=Count('id')).values('c')), 0),
+        rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('stars')).values('s')), 0),
+        rating_avg=Coalesce(Subquery(ratings.annotate(a=Avg('stars')).values('a')), 0.0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0010_recipeingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0.0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
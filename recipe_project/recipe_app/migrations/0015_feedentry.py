@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0014_comment_thread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipe_app.recipe')),
+                ('shared', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipe_app.sharedrecipe')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at', '-id'], name='feed_entry_owner_idx'), models.Index(fields=['owner', 'actor'], name='feed_entry_actor_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('shared__isnull', True)), fields=('owner', 'recipe'), name='feed_entry_unique_recipe'), models.UniqueConstraint(fields=('owner', 'shared'), name='feed_entry_unique_share')],
+            },
+        ),
+    ]
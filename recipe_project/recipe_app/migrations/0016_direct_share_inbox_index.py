@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0015_feedentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='directshare',
+            index=models.Index(fields=['receiver', 'sender', '-shared_at'], name='direct_share_inbox_idx'),
+        ),
+    ]
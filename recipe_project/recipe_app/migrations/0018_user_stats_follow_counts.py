@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follow_counts(apps, schema_editor):
+    UserStats = apps.get_model('recipe_app', 'UserStats')
+    Follow = apps.get_model('recipe_app', 'Follow')
+
+    def counted(field):
+        edges = Follow.objects.filter(**{field: OuterRef('user_id')}).order_by().values(field)
+        return Coalesce(Subquery(edges.annotate(n=Count('id')).values('n')), 0)
+
+    UserStats.objects.update(followers_count=counted('following'), following_count=counted('follower'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0017_user_stats_unread'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
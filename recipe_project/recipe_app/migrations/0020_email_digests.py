@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('recipe_app', '0019_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='body',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='subject',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='kind',
+            field=models.CharField(choices=[('new_recipe', 'New recipe'), ('digest', 'Digest')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='EmailPreference',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='email_preference', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('frequency', models.CharField(choices=[('immediate', 'Immediately'), ('daily', 'Daily digest'), ('weekly', 'Weekly digest')], default='immediate', max_length=10)),
+                ('last_digest_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['frequency', 'last_digest_at'], name='email_pref_due_idx')],
+            },
+        ),
+    ]
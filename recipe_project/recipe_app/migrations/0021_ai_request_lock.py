@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0020_email_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIRequestLock',
+            fields=[
+                ('key', models.CharField(max_length=128, primary_key=True, serialize=False)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='ai_request_lock_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0021_ai_request_lock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_feed_entries(apps, schema_editor):
+    """Seed every existing follower's feed the way recipe_app.feed.backfill does for a new follow."""
+    Follow = apps.get_model('recipe_app', 'Follow')
+    Recipe = apps.get_model('recipe_app', 'Recipe')
+    SharedRecipe = apps.get_model('recipe_app', 'SharedRecipe')
+    FeedEntry = apps.get_model('recipe_app', 'FeedEntry')
+    size = getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+    # authors past the fan-out limit are merged in at read time instead
+    fan_out_on_read = set(
+        Follow.objects.values('following_id').annotate(followers=Count('id'))
+        .filter(followers__gt=getattr(settings, 'FEED_FANOUT_LIMIT', 1000))
+        .values_list('following_id', flat=True)
+    )
+    followed = {}
+    for follower_id, following_id in Follow.objects.values_list('follower_id', 'following_id'):
+        followed.setdefault(follower_id, set()).add(following_id)
+
+    latest = {}
+    for owner_id, targets in followed.items():
+        rows = []
+        for target_id in targets - fan_out_on_read:
+            if target_id not in latest:
+                latest[target_id] = (
+                    list(Recipe.objects.filter(author_id=target_id).order_by('-created_at').values_list('id', 'created_at')[:size]),
+                    list(SharedRecipe.objects.filter(sender_id=target_id).order_by('-shared_at')
+                         .values_list('id', 'recipe_id', 'recipe__author_id', 'shared_at')[:size]),
+                )
+            recipes, shares = latest[target_id]
+            rows += [FeedEntry(owner_id=owner_id, actor_id=target_id, recipe_id=recipe_id, created_at=created_at)
+                     for recipe_id, created_at in recipes]
+            # followers of the recipe's author already get it as an authored item
+            rows += [FeedEntry(owner_id=owner_id, actor_id=target_id, recipe_id=recipe_id, shared_id=shared_id,
+                               created_at=shared_at)
+                     for shared_id, recipe_id, author_id, shared_at in shares if author_id not in targets]
+        FeedEntry.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0022_recipe_rating_fields_not_editable'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_feed_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe_app', '0024_recipe_updated_at_drop_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleRelatedRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipe_app.recipe')),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -2,6 +2,48 @@ from django.db import models
 from django.contrib.auth.models import User
 import datetime
 from django.utils import timezone
+from django.db.models import Avg, Case, Count, F, OuterRef, Prefetch, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_detail(self, comments_preview=3):
+        """
+        Fetch plan for the full RecipeSerializers payload: joins the author and
+        nutrient, prefetches categories, ratings and the newest top-level
+        comments (as comments_preview_list), and annotates the favorite and
+        comment counts so a page costs a fixed number of queries.
+        """
+        preview = Comment.objects.threads().order_by('-created_at', '-id')[:comments_preview]
+        comments = Comment.objects.filter(recipe=OuterRef('pk')).values('recipe').annotate(c=Count('id')).values('c')
+        return (
+            self.select_related('author', 'nutrient')
+            .prefetch_related(
+                'categories',
+                Prefetch('comments', queryset=preview, to_attr='comments_preview_list'),
+                Prefetch('ratings', queryset=Rating.objects.select_related('user')),
+            )
+            .annotate(
+                favorites_count=Count('favorites', distinct=True),
+                comments_count=Coalesce(Subquery(comments), 0),
+            )
+        )
+
+    def reconcile_rating_stats(self):
+        """Recompute the stored rating aggregates from the Rating rows, in one UPDATE."""
+        ratings = Rating.objects.filter(recipe=OuterRef('pk')).values('recipe')
+        count = Coalesce(Subquery(ratings.annotate(c=Count('id')).values('c')), 0)
+        total = Coalesce(Subquery(ratings.annotate(s=Sum('stars')).values('s')), 0)
+        return self.update(
+            rating_count=count,
+            rating_sum=total,
+            rating_avg=Coalesce(Subquery(ratings.annotate(a=Avg('stars')).values('a')), 0.0),
+        )
+
+    def with_card(self):
+        """Fetch plan for RecipeCardSerializer: author join plus the favorites count."""
+        return self.select_related('author').annotate(favorites_count=Count('favorites', distinct=True))
+
 
 # Create your models here.
 class Recipe(models.Model):
@@ -20,7 +62,42 @@ class Recipe(models.Model):
     updated_at=models.DateTimeField(auto_now=True)
     featured=models.BooleanField(default=False)
     is_ai_generated = models.BooleanField(default=False) 
+    # rating aggregates, maintained by Rating signals (see recipe_app.signals)
+    rating_count=models.PositiveIntegerField(default=0,editable=False)
+    rating_sum=models.PositiveIntegerField(default=0,editable=False)
+    rating_avg=models.FloatField(default=0.0,db_index=True,editable=False)
+    
+    objects = RecipeQuerySet.as_manager()
     
+    RATING_FIELDS = ('rating_count', 'rating_sum', 'rating_avg')
+    
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='recipe_created_idx')]
+    
+    def save(self, *args, **kwargs):
+        """
+        Saves of an existing row leave the rating aggregates alone: the loaded
+        values may already be stale, and writing them back would undo
+        apply_rating_delta() calls made since. Name them in update_fields to
+        write them anyway.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def apply_rating_delta(cls, recipe_id, count_delta, sum_delta):
+        """Shift the stored rating aggregates in a single atomic UPDATE."""
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        cls.objects.filter(pk=recipe_id).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Coalesce(Cast(new_sum, models.FloatField()) / NullIf(new_count, 0), 0.0),
+        )
     
     def __str__(self):
         return self.title
@@ -31,11 +108,51 @@ class Category(models.Model):
     cat_image=models.ImageField(upload_to='category/',blank=True,null=True)
     icon = models.CharField(max_length=5, blank=True, null=True)  # optional emoji/icon
     recipes = models.ManyToManyField(Recipe, related_name='categories', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
     
     
+class RecipeIngredient(models.Model):
+    """Inverted index of normalized ingredient terms, maintained by recipe_app.ingredients."""
+    recipe=models.ForeignKey(Recipe,on_delete=models.CASCADE,related_name='ingredient_terms')
+    term=models.CharField(max_length=100)
+
+    class Meta:
+        unique_together=('term','recipe')
+
+    def __str__(self):
+        return f"{self.term} in {self.recipe_id}"
+
+
+class RelatedRecipe(models.Model):
+    """Materialized related-recipes index, maintained by recipe_app.related."""
+    recipe=models.ForeignKey(Recipe,on_delete=models.CASCADE,related_name='related_entries')
+    related=models.ForeignKey(Recipe,on_delete=models.CASCADE,related_name='+')
+    score=models.FloatField(default=0)
+
+    class Meta:
+        unique_together=('recipe','related')
+        indexes=[models.Index(fields=['recipe','-score'],name='related_recipe_score_idx')]
+
+    def __str__(self):
+        return f"{self.recipe_id} -> {self.related_id} ({self.score})"
+
+
+class StaleRelatedRecipe(models.Model):
+    """
+    Recipes whose categories or ingredients changed since their related list
+    was ranked. Writes only insert a row here; the rebuild_related_recipes
+    --stale worker re-ranks them and their neighbours (see recipe_app.related).
+    """
+    recipe=models.OneToOneField(Recipe,on_delete=models.CASCADE,primary_key=True,related_name='+')
+    marked_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.recipe_id} (stale since {self.marked_at})"
+    
+    
 class Nutrient(models.Model):
     recipes_nutrient=models.OneToOneField(Recipe,on_delete=models.CASCADE,related_name='nutrient')
     calories=models.IntegerField(default=0)
@@ -47,6 +164,24 @@ class Nutrient(models.Model):
         return self.recipes_nutrient.title
     
     
+class CommentQuerySet(models.QuerySet):
+    def threads(self):
+        """Top-level comments with their author joined and reply_count annotated."""
+        return self.filter(parent__isnull=True).select_related('user').annotate(reply_count=Count('replies'))
+
+    def with_replies(self):
+        """
+        Fetch plan for CommentSerializer, which nests replies recursively:
+        reply_count is annotated at both levels and the replies' own (empty,
+        since nesting stops at one level) reply lists are prefetched too.
+        """
+        replies = Comment.objects.select_related('user').annotate(reply_count=Count('replies')).prefetch_related('replies')
+        return (
+            self.select_related('user').annotate(reply_count=Count('replies'))
+            .prefetch_related(Prefetch('replies', queryset=replies))
+        )
+
+
 class Comment(models.Model):
     recipe=models.ForeignKey(Recipe,on_delete=models.CASCADE,related_name='comments')
     user=models.ForeignKey(User,on_delete=models.CASCADE,related_name='comments')
@@ -55,6 +190,13 @@ class Comment(models.Model):
     created_at=models.DateTimeField(auto_now_add=True)
     updated_at=models.DateTimeField(auto_now=True)
     
+    objects = CommentQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='comment_user_created_idx'),
+            models.Index(fields=['recipe', 'parent', '-created_at', '-id'], name='comment_thread_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.recipe.title}"
@@ -69,7 +211,15 @@ class Rating(models.Model):
     
     class Meta:
         unique_together = ('recipe', 'user')  # ensures 1 rating per user per recipe
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='rating_user_created_idx')]
        
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored value so saves can apply the difference to Recipe
+        instance._loaded_stars = instance.__dict__.get('stars')
+        return instance
+
     def save(self, *args, **kwargs):
         # ensure stars are between 1 and 5
         if self.stars < 1:
@@ -88,6 +238,9 @@ class Favorite(models.Model):
     user=models.ForeignKey(User,on_delete=models.CASCADE,related_name='favorites')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_created_idx')]
+
     def __str__(self):
         return f"{self.user.username} saved {self.recipe.title}"
     
@@ -118,6 +271,31 @@ class SharedRecipe(models.Model):
         return f"{self.sender.username} shared {self.recipe.title}"
 
     
+class FeedEntry(models.Model):
+    """
+    Materialized home-feed row: `recipe` authored (shared=None) or shared by
+    `actor`, pushed to one follower `owner`. Maintained by recipe_app.feed.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    shared = models.ForeignKey(SharedRecipe, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'recipe'], condition=models.Q(shared__isnull=True), name='feed_entry_unique_recipe'),
+            models.UniqueConstraint(fields=['owner', 'shared'], name='feed_entry_unique_share'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name='feed_entry_owner_idx'),
+            models.Index(fields=['owner', 'actor'], name='feed_entry_actor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} in {self.owner_id}'s feed"
+
+
 # Add this to your models.py
 class DirectShare(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_shares')
@@ -129,10 +307,169 @@ class DirectShare(models.Model):
 
     class Meta:
         unique_together = ('sender', 'receiver', 'recipe')
+        indexes = [
+            models.Index(fields=['receiver', 'sender', '-shared_at'], name='direct_share_inbox_idx'),
+            models.Index(fields=['receiver', 'is_read', '-shared_at'], name='direct_share_unread_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored value so saves can adjust the receiver's unread counter
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        return instance
         
     def __str__(self):
         return f"{self.sender.username} shared {self.recipe.title} with {self.receiver.username}"
-    
-    
-    
-    
+
+
+class UserStatsQuerySet(models.QuerySet):
+    def reconcile_unread(self):
+        """Recompute unread_shares from DirectShare in a single UPDATE."""
+        unread = (
+            DirectShare.objects.filter(receiver=OuterRef('user_id'), is_read=False)
+            .order_by().values('receiver').annotate(n=Count('id')).values('n')
+        )
+        return self.update(unread_shares=Coalesce(Subquery(unread), 0))
+
+    def reconcile_follows(self):
+        """Recompute followers_count/following_count from Follow in a single UPDATE."""
+        def counted(field):
+            return Coalesce(Subquery(
+                Follow.objects.filter(**{field: OuterRef('user_id')})
+                .order_by().values(field).annotate(n=Count('id')).values('n')
+            ), 0)
+        return self.update(followers_count=counted('following'), following_count=counted('follower'))
+
+    def reconcile(self):
+        self.reconcile_unread()
+        return self.reconcile_follows()
+
+
+class UserStats(models.Model):
+    """Per-user counters maintained on write, so badges and profiles read one row instead of counting."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    unread_shares = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return f"stats for {self.user_id}"
+
+    @classmethod
+    def ensure(cls, user_ids):
+        """Create missing rows for existing users, seeded from the source tables."""
+        known = User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)
+        missing = set(known) - set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        if missing:
+            cls.objects.bulk_create([cls(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+            cls.objects.filter(user_id__in=missing).reconcile()
+
+    @classmethod
+    def apply_unread_delta(cls, user_ids, delta):
+        user_ids = set(user_ids)
+        if not user_ids or not delta:
+            return
+        updated = cls.objects.filter(user_id__in=user_ids).update(
+            unread_shares=Greatest(F('unread_shares') + delta, 0)
+        )
+        if updated < len(user_ids):
+            cls.ensure(user_ids)
+
+    @classmethod
+    def apply_follow_delta(cls, follower_id, following_id, delta):
+        """One UPDATE moves both sides of a follow edge."""
+        updated = cls.objects.filter(user_id__in=[follower_id, following_id]).update(
+            following_count=Greatest(F('following_count') + Case(When(user_id=follower_id, then=delta), default=0), 0),
+            followers_count=Greatest(F('followers_count') + Case(When(user_id=following_id, then=delta), default=0), 0),
+        )
+        if updated < 2:
+            cls.ensure([follower_id, following_id])
+
+    @classmethod
+    def for_user(cls, user_id):
+        """The user's stats row, created on first use; None if there is no such user."""
+        stats = cls.objects.filter(user_id=user_id).first()
+        if stats is None:
+            cls.ensure([user_id])
+            stats = cls.objects.filter(user_id=user_id).first()
+        return stats
+
+    @classmethod
+    def unread_for(cls, user_id):
+        count = cls.objects.filter(user_id=user_id).values_list('unread_shares', flat=True).first()
+        if count is None:
+            cls.ensure([user_id])
+            count = cls.objects.filter(user_id=user_id).values_list('unread_shares', flat=True).first()
+        return count
+
+
+class OutboundEmail(models.Model):
+    """
+    Durable email outbox: rows are written in the request's transaction and
+    delivered later by the send_outbox command (see recipe_app.outbox).
+    """
+    PENDING, SENT, FAILED = 'pending', 'sent', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+    NEW_RECIPE, DIGEST = 'new_recipe', 'digest'
+    KIND_CHOICES = [(NEW_RECIPE, 'New recipe'), (DIGEST, 'Digest')]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # pre-rendered per-recipient content (digests); new_recipe mail is rendered at send time
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.recipient} ({self.status})"
+
+
+class EmailPreference(models.Model):
+    """How a user wants new recipes from people they follow: one mail each, or a daily/weekly digest."""
+    IMMEDIATE, DAILY, WEEKLY = 'immediate', 'daily', 'weekly'
+    FREQUENCY_CHOICES = [(IMMEDIATE, 'Immediately'), (DAILY, 'Daily digest'), (WEEKLY, 'Weekly digest')]
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='email_preference')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=IMMEDIATE)
+    # digest checkpoint: recipes created up to this moment have been sent
+    last_digest_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['frequency', 'last_digest_at'], name='email_pref_due_idx')]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.frequency}"
+
+
+class AIRequestLock(models.Model):
+    """
+    Lock table for single-flight AI calls across worker processes (see
+    recipe_app.singleflight). One row per in-flight normalized request; the
+    leader fills `result` and the row lingers briefly so followers in other
+    processes can pick it up.
+    """
+    key = models.CharField(max_length=128, primary_key=True)
+    result = models.TextField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['expires_at'], name='ai_request_lock_expiry_idx')]
+
+    def __str__(self):
+        return f"{self.key} ({'done' if self.result is not None else 'in flight'})"
@@ -0,0 +1,176 @@
+"""
+Email outbox. Requests (and the digest builder) only insert OutboundEmail
+rows, in their own transaction; the send_outbox command delivers them
+afterwards, one message per recipient over a single reused SMTP connection,
+retrying failures with exponential backoff.
+"""
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection, transaction
+from django.utils import timezone
+
+from recipe_app.models import EmailPreference, Follow, OutboundEmail, Recipe
+from recipe_app.utils import new_recipe_email
+
+
+def enqueue_new_recipe(recipe):
+    """
+    Queue the new-recipe email for the author and every follower with an
+    address who hasn't switched to digests (see recipe_app.digests).
+    """
+    emails = dict.fromkeys(
+        Follow.objects.filter(following_id=recipe.author_id)
+        .exclude(follower__email='')
+        .exclude(follower__email_preference__frequency__in=[EmailPreference.DAILY, EmailPreference.WEEKLY])
+        .values_list('follower__email', flat=True)
+    )
+    if recipe.author.email:
+        emails = {recipe.author.email: None, **emails}
+    OutboundEmail.objects.bulk_create(
+        [OutboundEmail(kind=OutboundEmail.NEW_RECIPE, recipient=email, recipe=recipe) for email in emails],
+        batch_size=1000,
+    )
+    return len(emails)
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, 'OUTBOX_RETRY_MAX', 3600)))
+
+
+class Renderer:
+    """Renders each (kind, object) once per run, however many recipients it has."""
+
+    def __init__(self):
+        self.rendered = {}
+
+    def __call__(self, email):
+        if email.kind == OutboundEmail.DIGEST:
+            return email.subject, email.body
+        key = (email.kind, email.recipe_id)
+        if key not in self.rendered:
+            if email.kind == OutboundEmail.NEW_RECIPE:
+                recipe = Recipe.objects.select_related('author').get(pk=email.recipe_id)
+                self.rendered[key] = new_recipe_email(recipe)
+            else:
+                raise ValueError(f"Unknown email kind {email.kind!r}")
+        return self.rendered[key]
+
+
+# the mail server is unreachable or dropped the connection: not the message's fault
+CONNECTION_ERRORS = (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class Dispatcher:
+    """
+    Sends due outbox rows in batches. Each batch is claimed in a short
+    transaction (a lease of OUTBOX_CLAIM_SECONDS on next_attempt_at) and sent
+    after it commits, so no row locks are held while talking to SMTP. One
+    SMTP connection is opened lazily and reused for every batch, and reopened
+    once if the server drops it. When the server can't be reached the rest
+    of the batch is put back without using up an attempt.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None):
+        self.batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+        self.max_attempts = max_attempts or getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+        self.render = Renderer()
+        self.connection = None
+        self.metrics = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0, 'batches': 0, 'seconds': 0.0}
+
+    def open(self):
+        if self.connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def due(self):
+        rows = OutboundEmail.objects.filter(status=OutboundEmail.PENDING, next_attempt_at__lte=timezone.now())
+        if db_connection.features.has_select_for_update_skip_locked:
+            # lets several workers claim from the outbox without sending twice
+            rows = rows.select_for_update(skip_locked=True)
+        return rows.order_by('next_attempt_at', 'id')[:self.batch_size]
+
+    def claim(self):
+        """Lease a batch of due rows; a worker that dies mid-batch leaves them due again when the lease ends."""
+        lease = timedelta(seconds=getattr(settings, 'OUTBOX_CLAIM_SECONDS', 300))
+        with transaction.atomic():
+            batch = list(self.due())
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=timezone.now() + lease,
+            )
+        return batch
+
+    def send(self, email):
+        subject, body = self.render(email)
+        message = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email.recipient])
+        reused = self.connection is not None
+        try:
+            self.open().send_messages([message])
+        except CONNECTION_ERRORS:
+            self.connection = None
+            if not reused:
+                raise
+            # the server closed the idle connection; try once more on a fresh one
+            self.send(email)
+
+    def run_batch(self):
+        """Send one batch; returns how many rows it handled."""
+        started = time.monotonic()
+        batch = self.claim()
+        now = timezone.now()
+        for index, email in enumerate(batch):
+            try:
+                self.send(email)
+            except CONNECTION_ERRORS as exc:
+                # retry the rest later, without charging them an attempt
+                for pending in batch[index:]:
+                    pending.next_attempt_at = now + retry_delay(1)
+                    pending.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+                self.metrics['deferred'] += len(batch) - index
+                break
+            except Exception as exc:
+                email.attempts += 1
+                email.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+                if email.attempts >= self.max_attempts:
+                    email.status = OutboundEmail.FAILED
+                    self.metrics['failed'] += 1
+                else:
+                    email.next_attempt_at = now + retry_delay(email.attempts)
+                    self.metrics['retried'] += 1
+            else:
+                email.attempts += 1
+                email.status = OutboundEmail.SENT
+                email.sent_at = now
+                email.last_error = ''
+                self.metrics['sent'] += 1
+        OutboundEmail.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+        if batch:
+            self.metrics['batches'] += 1
+            self.metrics['seconds'] += time.monotonic() - started
+        return len(batch)
+
+    def drain(self):
+        """Send batches until nothing is due (or the mail server is unreachable)."""
+        try:
+            while self.run_batch() and not self.metrics['deferred']:
+                pass
+        finally:
+            self.close()
+        return self.stats()
+
+    def stats(self):
+        seconds = self.metrics['seconds']
+        return dict(self.metrics, per_second=round(self.metrics['sent'] / seconds, 1) if seconds else 0.0)
@@ -0,0 +1,148 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """Planner row estimate on PostgreSQL (no table scan); exact count elsewhere."""
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), served by the matching composite
+    indexes, so deep pages cost the same as the first and no COUNT(*) runs.
+    Clients may ask for ?page_size= up to max_page_size, and for a total with
+    ?count=exact or the cheaper ?count=estimate.
+
+    A client ?ordering= picks the first sort column; id always follows it as
+    the tiebreaker, and the cursor carries both values, so long runs of equal
+    values (rating_avg, prep_time, ...) page without gaps or repeats.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'estimate':
+            self.count = estimate_count(queryset)
+        elif mode in ('exact', 'true', '1'):
+            self.count = queryset.count()
+        else:
+            self.count = None
+
+        # CursorPagination.paginate_queryset, filtering on (field, id) instead of field alone
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            descending = self.ordering[0].startswith('-') != reverse
+            queryset = queryset.filter(self.after(queryset.model, current_position, descending))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        first = super().get_ordering(request, queryset, view)[0]
+        if first.lstrip('-') in ('id', 'pk'):
+            return (first,)
+        return (first, '-id' if first.startswith('-') else 'id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        field = ordering[0].lstrip('-')
+        return f'{getattr(instance, field)}|{instance.pk}'
+
+    def after(self, model, position, descending):
+        """Rows past `position` ("value|id") in the page direction."""
+        field = self.ordering[0].lstrip('-')
+        value, _, pk = position.rpartition('|')
+        try:
+            value = model._meta.get_field('id' if field == 'pk' else field).to_python(value)
+            pk = int(pk)
+        except (ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'lt' if descending else 'gt'
+        if field in ('id', 'pk'):
+            return Q(**{f'pk__{lookup}': pk})
+        return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+
+class RankedPagination(PageNumberPagination):
+    """Page numbers for relevance-ranked results (search, pantry), whose order a cursor can't encode."""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class LinkHeaderCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id) for lists read by existing clients:
+    the body stays a plain list and the next page URL goes in the Link header.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        return schema
+
+
+class SharedAtCursorPagination(LinkHeaderCursorPagination):
+    ordering = ('-shared_at', '-id')
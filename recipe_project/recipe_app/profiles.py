@@ -0,0 +1,40 @@
+"""
+Profile statistics for any number of users in one query: per-user totals as
+correlated subqueries (no join fan-out), follower counts from the maintained
+UserStats row, and received ratings summed from Recipe's stored aggregates.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from recipe_app.models import Comment, Favorite, Follow, Recipe
+
+
+def _per_user(queryset, field, aggregate):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+            .annotate(value=aggregate).values('value'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def with_profile_stats(users=None):
+    users = User.objects.all() if users is None else users
+    return users.annotate(
+        total_recipes=_per_user(Recipe.objects, 'author', Count('id')),
+        total_comments=_per_user(Comment.objects, 'user', Count('id')),
+        total_favorites=_per_user(Favorite.objects, 'user', Count('id')),
+        ratings_received=_per_user(Recipe.objects, 'author', Sum('rating_count')),
+        rating_sum_received=_per_user(Recipe.objects, 'author', Sum('rating_sum')),
+        # maintained counters, falling back to a count for users without a stats row yet
+        followers_count=Coalesce(F('stats__followers_count'), _per_user(Follow.objects, 'following', Count('id'))),
+        following_count=Coalesce(F('stats__following_count'), _per_user(Follow.objects, 'follower', Count('id'))),
+    )
+
+
+def profiles_for(user_ids):
+    """{user_id: user} with profile stats annotated, for author cards and batch lookups."""
+    return with_profile_stats(User.objects.filter(pk__in=user_ids)).in_bulk()
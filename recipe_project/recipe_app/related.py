@@ -0,0 +1,138 @@
+"""
+Materialized related-recipes index.
+
+Each recipe keeps its top RELATED_INDEX_SIZE neighbours in RelatedRecipe,
+scored by the number of categories they share plus a smaller weight per
+shared ingredient term. Rows are rebuilt for a recipe, and for the
+neighbours whose lists that can change, whenever its categories or
+ingredients change, and read back for a whole page with one indexed query.
+Re-ranking touches every affected neighbour, so writes only mark the recipe
+stale (see signals.py) and rebuild_stale() does the work in batches, from
+the rebuild_related_recipes --stale worker.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber
+
+from recipe_app import cache
+from recipe_app.models import Category, RecipeIngredient, RelatedRecipe, StaleRelatedRecipe
+
+RELATED_INDEX_SIZE = 10
+CATEGORY_WEIGHT = 1.0
+INGREDIENT_WEIGHT = 0.25
+# candidates pulled from each signal before the scores are combined
+CANDIDATE_POOL = 50
+
+CategoryMembership = Category.recipes.through
+
+
+def _overlap(model, key, recipe_id):
+    """{other_recipe_id: shared count} over the `key` column, top CANDIDATE_POOL only."""
+    keys = model.objects.filter(recipe_id=recipe_id).values(key)
+    rows = (
+        model.objects.filter(**{f'{key}__in': keys})
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id')
+        .annotate(shared=Count(key))
+        .order_by('-shared', '-recipe_id')[:CANDIDATE_POOL]
+    )
+    return {row['recipe_id']: row['shared'] for row in rows}
+
+
+def rank_related(recipe_id, limit=RELATED_INDEX_SIZE):
+    """Top (recipe_id, score) candidates for a recipe; overlaps are counted in the database."""
+    scores = {}
+    for other_id, shared in _overlap(CategoryMembership, 'category_id', recipe_id).items():
+        scores[other_id] = scores.get(other_id, 0.0) + CATEGORY_WEIGHT * shared
+    for other_id, shared in _overlap(RecipeIngredient, 'term', recipe_id).items():
+        scores[other_id] = scores.get(other_id, 0.0) + INGREDIENT_WEIGHT * shared
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    return ranked[:limit]
+
+
+def _replace(recipe_id, ranked):
+    RelatedRecipe.objects.filter(recipe_id=recipe_id).delete()
+    RelatedRecipe.objects.bulk_create([
+        RelatedRecipe(recipe_id=recipe_id, related_id=other_id, score=score) for other_id, score in ranked
+    ])
+
+
+def rebuild_related(recipe_id):
+    """
+    Recompute one recipe's neighbours, then the lists of the other recipes
+    whose top RELATED_INDEX_SIZE the change can affect: those that listed it
+    before, and candidates whose list has room or whose lowest score the new
+    (symmetric) score reaches. Each of those is re-ranked from scratch, so
+    the index matches rebuild_all(). Returns the IDs of the re-ranked
+    neighbours.
+    """
+    pool = rank_related(recipe_id, limit=CANDIDATE_POOL)
+    with transaction.atomic():
+        previous = set(RelatedRecipe.objects.filter(related_id=recipe_id).values_list('recipe_id', flat=True))
+        lists = {
+            row['recipe_id']: (row['size'], row['floor'])
+            for row in RelatedRecipe.objects.filter(recipe_id__in=[other_id for other_id, _ in pool])
+            .values('recipe_id').annotate(size=Count('id'), floor=Min('score'))
+        }
+        affected = previous | {
+            other_id for other_id, score in pool
+            if other_id not in lists or lists[other_id][0] < RELATED_INDEX_SIZE or score >= lists[other_id][1]
+        }
+        _replace(recipe_id, pool[:RELATED_INDEX_SIZE])
+        for other_id in affected:
+            _replace(other_id, rank_related(other_id))
+    return affected
+
+
+def mark_stale(recipe_ids):
+    StaleRelatedRecipe.objects.bulk_create(
+        [StaleRelatedRecipe(recipe_id=recipe_id) for recipe_id in recipe_ids], ignore_conflicts=True,
+    )
+
+
+def rebuild_stale(batch_size=100):
+    """
+    Re-rank up to `batch_size` stale recipes and their affected neighbours,
+    oldest marks first, and move the cache versions of every recipe whose
+    list changed. The marks are removed in the same transaction, so a crash
+    leaves them queued. Returns how many stale recipes were handled.
+    """
+    with transaction.atomic():
+        recipe_ids = list(
+            StaleRelatedRecipe.objects.order_by('marked_at', 'recipe_id').values_list('recipe_id', flat=True)[:batch_size]
+        )
+        StaleRelatedRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+        changed = set(recipe_ids)
+        for recipe_id in recipe_ids:
+            changed |= rebuild_related(recipe_id)
+        if changed:
+            # full (?view=full) lists embed related recipes too
+            cache.bump('recipes', *[f'recipe:{recipe_id}' for recipe_id in changed])
+    return len(recipe_ids)
+
+
+def rebuild_all(recipe_ids):
+    """Full rebuild used by the rebuild_related_recipes command."""
+    with transaction.atomic():
+        RelatedRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+        RelatedRecipe.objects.bulk_create([
+            RelatedRecipe(recipe_id=recipe_id, related_id=other_id, score=score)
+            for recipe_id in recipe_ids
+            for other_id, score in rank_related(recipe_id)
+        ])
+
+
+def related_recipes_for(recipe_ids, limit=5):
+    """Top related recipes for a page of recipe IDs, in a single query."""
+    entries = (
+        RelatedRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .select_related('related')
+        .only('recipe_id', 'score', 'related__id', 'related__title', 'related__image')
+        .annotate(rank=Window(RowNumber(), partition_by=F('recipe_id'), order_by=[F('score').desc(), F('related_id').desc()]))
+        .filter(rank__lte=limit)
+        .order_by('recipe_id', 'rank')
+    )
+    related = {recipe_id: [] for recipe_id in recipe_ids}
+    for entry in entries:
+        related[entry.recipe_id].append(entry.related)
+    return related
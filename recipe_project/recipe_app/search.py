@@ -0,0 +1,190 @@
+"""
+Full-text search for recipes.
+
+Every recipe has a search document (title weighted over ingredients over
+description) kept in sync by signals.py. On PostgreSQL the document is a
+GIN-indexed tsvector; on SQLite it lives in an FTS5 virtual table. Both
+tables are created by migration 0009. Other databases fall back to
+icontains lookups.
+"""
+import re
+from html import escape
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from rest_framework import filters
+
+from recipe_app.models import Recipe
+
+SEARCH_TABLE = 'recipe_app_recipe_search'
+MARK_START, MARK_END = '<mark>', '</mark>'
+# the engines wrap matches in these private-use characters; mark_up() escapes
+# the user's text and only then turns them into tags
+SENTINEL_START, SENTINEL_END = '\ue000', '\ue001'
+
+
+def mark_up(text):
+    if text is None:
+        return None
+    return escape(text).replace(SENTINEL_START, MARK_START).replace(SENTINEL_END, MARK_END)
+
+
+def marked_rows(rows):
+    return {row[0]: {'title': mark_up(row[1]), 'snippet': mark_up(row[2])} for row in rows}
+
+
+class PostgresSearchBackend:
+    def index(self, recipe):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+                VALUES (%s,
+                    setweight(to_tsvector('english', %s), 'A') ||
+                    setweight(to_tsvector('english', %s), 'B') ||
+                    setweight(to_tsvector('english', %s), 'C'))
+                ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                [recipe.pk, recipe.title, recipe.ingredients, recipe.description],
+            )
+
+    def remove(self, recipe_id):
+        # rows go away with the recipe through ON DELETE CASCADE
+        pass
+
+    def search(self, query, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT recipe_id FROM {SEARCH_TABLE}, websearch_to_tsquery('english', %s) query
+                WHERE document @@ query
+                ORDER BY ts_rank_cd(document, query) DESC, recipe_id DESC
+                LIMIT %s
+                """,
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def highlights(self, query, recipe_ids):
+        options = f'StartSel={SENTINEL_START}, StopSel={SENTINEL_END}'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id,
+                    ts_headline('english', title, query, %s),
+                    ts_headline('english', description, query, %s)
+                FROM recipe_app_recipe, websearch_to_tsquery('english', %s) query
+                WHERE id = ANY(%s)
+                """,
+                [options, options + ', MaxFragments=1, MaxWords=20, MinWords=5', query, list(recipe_ids)],
+            )
+            return marked_rows(cursor.fetchall())
+
+
+class SQLiteSearchBackend:
+    # bm25 column weights, in table column order: title, ingredients, description
+    WEIGHTS = (10.0, 5.0, 1.0)
+
+    @staticmethod
+    def match_expression(query):
+        # quote every token so user input can't inject FTS5 syntax; prefix-match each term
+        terms = re.findall(r'\w+', query.lower())
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def index(self, recipe):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [recipe.pk])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, ingredients, description) VALUES (%s, %s, %s, %s)",
+                [recipe.pk, recipe.title, recipe.ingredients, recipe.description],
+            )
+
+    def remove(self, recipe_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [recipe_id])
+
+    def search(self, query, limit):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT rowid FROM {SEARCH_TABLE}
+                WHERE {SEARCH_TABLE} MATCH %s
+                ORDER BY bm25({SEARCH_TABLE}, %s, %s, %s), rowid DESC
+                LIMIT %s
+                """,
+                [match, *self.WEIGHTS, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def highlights(self, query, recipe_ids):
+        match = self.match_expression(query)
+        if not match or not recipe_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT rowid,
+                    highlight({SEARCH_TABLE}, 0, %s, %s),
+                    snippet({SEARCH_TABLE}, 2, %s, %s, '…', 20)
+                FROM {SEARCH_TABLE}
+                WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})
+                """,
+                [SENTINEL_START, SENTINEL_END, SENTINEL_START, SENTINEL_END, match, *recipe_ids],
+            )
+            return marked_rows(cursor.fetchall())
+
+
+class FallbackSearchBackend:
+    """Unranked icontains search for databases without a full-text engine."""
+
+    def index(self, recipe):
+        pass
+
+    def remove(self, recipe_id):
+        pass
+
+    def search(self, query, limit):
+        matches = Recipe.objects.filter(
+            Q(title__icontains=query) | Q(ingredients__icontains=query) | Q(description__icontains=query)
+        )
+        return list(matches.order_by('-created_at').values_list('id', flat=True)[:limit])
+
+    def highlights(self, query, recipe_ids):
+        return {}
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return FallbackSearchBackend()
+
+
+def search_highlights(request, recipe_ids):
+    query = request.query_params.get('search', '').strip() if request is not None else ''
+    if not query:
+        return {}
+    return get_backend().highlights(query, recipe_ids)
+
+
+class RecipeSearchFilter(filters.BaseFilterBackend):
+    """
+    Routes ?search= through the full-text backend and orders the results by
+    relevance. At most SEARCH_MAX_RESULTS ranked matches are returned.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        recipe_ids = get_backend().search(query, getattr(settings, 'SEARCH_MAX_RESULTS', 500))
+        rank = Case(*[When(id=recipe_id, then=position) for position, recipe_id in enumerate(recipe_ids)],
+                    output_field=IntegerField())
+        return queryset.filter(id__in=recipe_ids).order_by(rank) if recipe_ids else queryset.none()
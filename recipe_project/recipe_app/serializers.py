@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from recipe_app.models import*
 from recipe_app.models import User
+from recipe_app.related import related_recipes_for
+from recipe_app.search import search_highlights
 
 
 
@@ -12,13 +14,42 @@ class CommentSerializer(serializers.ModelSerializer):
         model=Comment
         fields=['id', 'user','content','created_at','parent','replies','has_replies']
     def get_replies(self, obj):
-       replies = obj.replies.all().order_by('created_at')
+       # sort in Python so prefetched replies are reused instead of re-queried
+       replies = sorted(obj.replies.all(), key=lambda reply: reply.created_at)
        return CommentSerializer(replies, many=True, context=self.context).data
    
     def get_has_replies(self, obj):
-        return obj.replies.exists()
+        # annotated by Comment.objects.with_replies(); ask the database otherwise
+        count = getattr(obj, 'reply_count', None)
+        return obj.replies.exists() if count is None else count > 0
         
         
+class CommentReplySerializer(serializers.ModelSerializer):
+    user=serializers.CharField(source='user.username',read_only=True)
+    class Meta:
+        model=Comment
+        fields=['id', 'user', 'content', 'created_at', 'parent']
+
+
+class CommentPreviewSerializer(serializers.ModelSerializer):
+    """Top-level comment from Comment.objects.threads(), with its annotated reply_count."""
+    user=serializers.CharField(source='user.username',read_only=True)
+    reply_count=serializers.IntegerField(read_only=True)
+    class Meta:
+        model=Comment
+        fields=['id', 'user', 'content', 'created_at', 'reply_count']
+
+
+class CommentThreadSerializer(CommentPreviewSerializer):
+    replies=serializers.SerializerMethodField()
+    class Meta(CommentPreviewSerializer.Meta):
+        fields=CommentPreviewSerializer.Meta.fields + ['replies']
+
+    def get_replies(self, obj):
+        # attached in memory by the comments endpoint
+        return CommentReplySerializer(getattr(obj, 'thread_replies', []), many=True).data
+
+
 class RatingSerializer(serializers.ModelSerializer):
     user=serializers.CharField(source='user.username',read_only=True)
     class Meta:
@@ -56,33 +87,84 @@ class RelatedRecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'image']
 
 
+def prime_recipe_context(context, recipes):
+    """
+    Per-request lookups shared by every row of a page: the current user's
+    favorite IDs and the related recipes, so rows don't query one by one.
+    """
+    request = context.get('request')
+    user = getattr(request, 'user', None)
+    recipe_ids = [recipe.id for recipe in recipes]
+    if user is not None and user.is_authenticated:
+        context['favorite_ids'] = set(
+            Favorite.objects.filter(user=user, recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+        )
+    else:
+        context['favorite_ids'] = set()
+    context['related_recipes'] = related_recipes_for(recipe_ids)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        prime_recipe_context(self.context, recipes)
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
 class RecipeSerializers(serializers.ModelSerializer):
     image=serializers.ImageField(required=True,use_url=True)
     author=serializers.CharField(source='author.username',read_only=True)
     author_id=serializers.IntegerField(source='author.id',read_only=True)
     nutrient=serializers.SerializerMethodField()
     related_recipes=serializers.SerializerMethodField()
-    comments=CommentSerializer(many=True,read_only=True)
+    comments_count=serializers.SerializerMethodField()
+    comments_preview=serializers.SerializerMethodField()
     ratings=RatingSerializer(many=True,read_only=True)
-    favorites_count = serializers.IntegerField(source='favorites.count', read_only=True)
+    average_rating=serializers.FloatField(source='rating_avg',read_only=True)
+    ratings_count=serializers.IntegerField(source='rating_count',read_only=True)
+    favorites_count = serializers.SerializerMethodField()
     is_favorite = serializers.SerializerMethodField()
     is_ai_generated = serializers.BooleanField(default=False) 
     featured=serializers.BooleanField()
     class Meta:
         model=Recipe
+        list_serializer_class = RecipeListSerializer
         fields= [
             'id', 'title', 'description', 'ingredients', 'instruction',
             'image', 'video', 'author', 'author_id','prep_time', 'cook_time', 'servings',
             'difficulty', 'featured', 'created_at', 'updated_at','is_ai_generated',
-            'categories', 'nutrient', 'comments', 'ratings', 'favorites_count','is_favorite','related_recipes'
+            'categories', 'nutrient', 'comments_count', 'comments_preview', 'ratings', 'average_rating', 'ratings_count',
+            'favorites_count','is_favorite','related_recipes'
         ]
         read_only_fields=['author','author_id','created_at','updated_at']
     
     
+    def to_representation(self, instance):
+        # single-object serialization (retrieve/create) primes its own lookups
+        if 'favorite_ids' not in self.context:
+            prime_recipe_context(self.context, [instance])
+        return super().to_representation(instance)
+
     def get_related_recipes(self, obj):
-     related = Recipe.objects.filter(categories__in=obj.categories.all()).exclude(id=obj.id).distinct()[:5]  # optional limit
+     related = self.context['related_recipes'].get(obj.id, [])
      return RelatedRecipeSerializer(related, many=True, context=self.context).data
 
+    def get_comments_count(self, obj):
+        # annotated by Recipe.objects.with_detail(); count directly otherwise
+        count = getattr(obj, 'comments_count', None)
+        return obj.comments.count() if count is None else count
+
+    def get_comments_preview(self, obj):
+        preview = getattr(obj, 'comments_preview_list', None)
+        if preview is None:
+            preview = obj.comments.threads().order_by('-created_at', '-id')[:3]
+        return CommentPreviewSerializer(preview, many=True, context=self.context).data
+
+    def get_favorites_count(self, obj):
+        # annotated by Recipe.objects.with_detail(); count directly otherwise
+        count = getattr(obj, 'favorites_count', None)
+        return obj.favorites.count() if count is None else count
+
         
     def get_nutrient(self, obj):
      nutrient = getattr(obj, 'nutrient', None)
@@ -93,11 +175,50 @@ class RecipeSerializers(serializers.ModelSerializer):
 
     
     def get_is_favorite(self, obj):
-        user = self.context.get('request').user
-        if user.is_authenticated:
-            return obj.favorites.filter(user=user).exists()
-        return False
+        return obj.id in self.context['favorite_ids']
  
+class RecipeCardListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['search_highlights'] = search_highlights(self.context.get('request'), [r.id for r in recipes])
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
+class RecipeCardSerializer(serializers.ModelSerializer):
+    """
+    Compact representation for recipe collections. Expects a queryset from
+    Recipe.objects.with_card(); the full document comes from RecipeSerializers.
+    """
+    image=serializers.ImageField(read_only=True,use_url=True)
+    author=serializers.CharField(source='author.username',read_only=True)
+    author_id=serializers.IntegerField(source='author.id',read_only=True)
+    average_rating=serializers.FloatField(source='rating_avg',read_only=True)
+    ratings_count=serializers.IntegerField(source='rating_count',read_only=True)
+    favorites_count=serializers.IntegerField(read_only=True)
+    highlight=serializers.SerializerMethodField()
+
+    class Meta:
+        model=Recipe
+        fields=[
+            'id', 'title', 'description', 'image', 'author', 'author_id', 'prep_time', 'cook_time',
+            'servings', 'difficulty', 'created_at', 'average_rating', 'ratings_count', 'favorites_count',
+            'highlight'
+        ]
+        list_serializer_class = RecipeCardListSerializer
+
+    def get_highlight(self, obj):
+        # marked-up title/snippet, only present on ?search= results
+        return self.context.get('search_highlights', {}).get(obj.id)
+
+
+class PantryRecipeSerializer(RecipeCardSerializer):
+    matched_count=serializers.IntegerField(read_only=True)
+    missing_count=serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeCardSerializer.Meta):
+        fields=RecipeCardSerializer.Meta.fields + ['matched_count', 'missing_count']
+
+
 class SignupSerializers(serializers.ModelSerializer):
     full_name = serializers.CharField(write_only=True)
     password = serializers.CharField(write_only=True, min_length=6)
@@ -129,28 +250,44 @@ class CategorySerializer(serializers.ModelSerializer):
         
 
 class UserSerializer(serializers.ModelSerializer):
-    total_recipes=serializers.IntegerField(source='recipes.count',read_only=True)
-    total_comments=serializers.IntegerField(source='comments.count',read_only=True)
-    total_favorites=serializers.IntegerField(source='favorites.count',read_only=True)
+    """Expects a user from profiles.with_profile_stats(), which annotates every count in one query."""
+    total_recipes=serializers.IntegerField(read_only=True)
+    total_comments=serializers.IntegerField(read_only=True)
+    total_favorites=serializers.IntegerField(read_only=True)
+    followers_count=serializers.IntegerField(read_only=True)
+    following_count=serializers.IntegerField(read_only=True)
+    ratings_received=serializers.IntegerField(read_only=True)
+    average_rating=serializers.SerializerMethodField()
     
     class Meta:
         model=User
-        fields= ['id', 'username', 'email', 'date_joined', 'total_recipes', 'total_comments', 'total_favorites']
+        fields= ['id', 'username', 'email', 'date_joined', 'total_recipes', 'total_comments', 'total_favorites',
+                 'followers_count', 'following_count', 'ratings_received', 'average_rating']
+
+    def get_average_rating(self, obj):
+        if not obj.ratings_received:
+            return 0.0
+        return round(obj.rating_sum_received / obj.ratings_received, 2)
+
+
+class PublicProfileSerializer(UserSerializer):
+    class Meta(UserSerializer.Meta):
+        fields = [field for field in UserSerializer.Meta.fields if field != 'email']
         
         
 class MyRecipeSerializer(serializers.ModelSerializer):
-    favorites_count = serializers.IntegerField(source='favorites.count', read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    """Expects Recipe.objects.with_card(), which annotates favorites_count."""
+    favorites_count = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='rating_avg', read_only=True)
 
     class Meta:
         model = Recipe
         fields = ['id', 'title', 'image', 'created_at', 'updated_at', 'favorites_count', 'average_rating']
 
-    def get_average_rating(self, obj):
-        ratings = obj.ratings.all()
-        if ratings.exists():
-            return sum([r.stars for r in ratings]) / ratings.count()
-        return 0
+    def get_favorites_count(self, obj):
+        # annotated by Recipe.objects.with_card(); count directly otherwise
+        count = getattr(obj, 'favorites_count', None)
+        return obj.favorites.count() if count is None else count
 
 class MyFavoriteSerializer(serializers.ModelSerializer):
     recipe_title = serializers.CharField(source='recipe.title', read_only=True)
@@ -190,12 +327,11 @@ class MyRatingSerializer(serializers.ModelSerializer):
 
 
 class FollowerSerializer(serializers.ModelSerializer):
-    followers=serializers.CharField(source='followers.username',read_only=True)
-    following=serializers.CharField(source='following.username',read_only=True)
-    
     class Meta:
         model=Follow
         fields=['id','follower','following','created_at']
+        # the follower is always the requesting user
+        read_only_fields=['follower']
         
 
 class FeedRecipeSerializer(serializers.ModelSerializer):
@@ -239,4 +375,29 @@ class FollowerListSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Follow
-        fields = ['id', 'username', 'email', 'created_at']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'created_at']
+
+
+class FollowerUserSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='follower.id')
+    username = serializers.CharField(source='follower.username')
+
+    class Meta:
+        model = Follow
+        fields = ['id', 'username', 'created_at']
+
+
+class FollowingUserSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='following.id')
+    username = serializers.CharField(source='following.username')
+
+    class Meta:
+        model = Follow
+        fields = ['id', 'username', 'created_at']
+
+
+class EmailPreferenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EmailPreference
+        fields = ['frequency', 'last_digest_at']
+        read_only_fields = ['last_digest_at']
@@ -0,0 +1,169 @@
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipe_app import cache, events, feed, ingredients, related, search
+from recipe_app.models import Category, Comment, DirectShare, Favorite, Nutrient, Rating, Recipe, UserStats
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_ingredients(sender, instance, raw=False, **kwargs):
+    if not raw and ingredients.index_recipe(instance):
+        related.mark_stale([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: feed.fan_out_recipe(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_document(sender, instance, **kwargs):
+    search.get_backend().remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=Category.recipes.through)
+def rebuild_related_on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # clear() reports no pk_set: remember the other side before the rows go
+        other_side = instance.categories if reverse else instance.recipes
+        instance._cleared_ids = list(other_side.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    other_ids = getattr(instance, '_cleared_ids', []) if action == 'post_clear' else list(pk_set or [])
+    if reverse:
+        recipe_ids, category_ids = [instance.pk], other_ids
+    else:
+        recipe_ids, category_ids = other_ids, [instance.pk]
+
+    related.mark_stale(recipe_ids)
+    # recipes_count changed: move the category list's Last-Modified forward
+    Category.objects.filter(pk__in=category_ids).update(updated_at=timezone.now())
+    cache.bump('categories', 'recipes', *[f'recipe:{recipe_id}' for recipe_id in recipe_ids])
+
+
+@receiver(post_save, sender=Rating)
+def apply_rating_to_recipe(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_stars', None)
+    if created:
+        Recipe.apply_rating_delta(instance.recipe_id, 1, instance.stars)
+    elif previous is None:
+        # saved without loading the stored value first; recompute from scratch
+        Recipe.objects.filter(pk=instance.recipe_id).reconcile_rating_stats()
+    else:
+        Recipe.apply_rating_delta(instance.recipe_id, 0, instance.stars - previous)
+    instance._loaded_stars = instance.stars
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_recipe(sender, instance, **kwargs):
+    stars = getattr(instance, '_loaded_stars', None) or instance.stars
+    Recipe.apply_rating_delta(instance.recipe_id, -1, -stars)
+
+
+# ---------- Unread notification counters ----------
+@receiver(post_save, sender=DirectShare)
+def count_unread_share(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_is_read', None)
+    if created:
+        delta = 0 if instance.is_read else 1
+    elif previous is None:
+        UserStats.objects.filter(user_id=instance.receiver_id).reconcile_unread()
+        delta = 0
+    else:
+        delta = int(previous) - int(instance.is_read)
+    UserStats.apply_unread_delta([instance.receiver_id], delta)
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=DirectShare)
+def uncount_deleted_share(sender, instance, **kwargs):
+    if not instance.is_read:
+        UserStats.apply_unread_delta([instance.receiver_id], -1)
+
+
+# ---------- Push events ----------
+@receiver(post_save, sender=DirectShare)
+def push_new_share(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        events.notify([instance.receiver_id], 'share', events.share_payload(instance))
+
+
+@receiver(post_save, sender=Comment)
+def push_comment_reply(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or instance.parent_id is None:
+        return
+    parent = instance.parent
+    if parent.user_id != instance.user_id:
+        events.notify([parent.user_id], 'comment_reply', {
+            'comment_id': instance.id,
+            'parent_id': parent.id,
+            'recipe_id': instance.recipe_id,
+            'user': instance.user.username,
+            'content': instance.content,
+            'created_at': instance.created_at,
+        })
+
+
+# ---------- Response cache invalidation ----------
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_recipe_versions(sender, instance, **kwargs):
+    cache.bump('recipes', 'categories', f'recipe:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def bump_category_versions(sender, instance, **kwargs):
+    cache.bump('categories', 'recipes')
+
+
+@receiver([post_save, post_delete], sender=Nutrient)
+def bump_nutrient_versions(sender, instance, **kwargs):
+    cache.bump('recipes', f'recipe:{instance.recipes_nutrient_id}')
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Rating)
+@receiver([post_save, post_delete], sender=Favorite)
+def bump_recipe_child_versions(sender, instance, **kwargs):
+    cache.bump('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    if instance.pk and not raw and (update_fields is None or 'username' in update_fields):
+        instance._saved_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def bump_versions_on_rename(sender, instance, created=False, **kwargs):
+    # recipe payloads embed the usernames of the author, commenters and raters
+    old_username = getattr(instance, '_saved_username', None)
+    instance._saved_username = instance.username
+    if created or old_username is None or old_username == instance.username:
+        return
+    recipe_ids = set(Recipe.objects.filter(author=instance).values_list('id', flat=True))
+    recipe_ids.update(Comment.objects.filter(user=instance).values_list('recipe_id', flat=True))
+    recipe_ids.update(Rating.objects.filter(user=instance).values_list('recipe_id', flat=True))
+    cache.bump('recipes', *[f'recipe:{recipe_id}' for recipe_id in recipe_ids])
+
+
+# ---------- Conditional GET validators ----------
+@receiver(pre_delete, sender=Recipe)
+def touch_recipe_categories(sender, instance, **kwargs):
+    # the membership rows are cascaded without m2m_changed, so recipes_count moves silently
+    Category.objects.filter(recipes=instance).update(updated_at=timezone.now())
@@ -0,0 +1,155 @@
+"""
+Single-flight coalescing for AI calls: concurrent requests with the same
+normalized inputs (the AI cache key) share one upstream model call.
+
+* Within a process, the first caller starts the call as a task and later
+  callers await the same task. The task belongs to the flight, not to the
+  leader's request, so a leader that disconnects doesn't fail its
+  followers; it is cancelled only when every caller has gone.
+* Across processes (AI_COALESCE_ACROSS_PROCESSES), the flight first claims
+  a row in the AIRequestLock table. If another process holds it, this one
+  polls the row until that leader publishes its answer, instead of calling
+  the model again. If the other leader fails, the row disappears and this
+  process makes the call itself.
+* Only answers are shared. When the leader's call fails (its per-user quota
+  is full, its call timed out, the model errored) each follower makes the
+  call itself, under its own concurrency slots.
+
+Nobody waits longer than the leader's own deadline: AI_QUEUE_TIMEOUT to get
+a slot plus AI_TIMEOUT for the call. Past it, run() raises asyncio.TimeoutError.
+"""
+import asyncio
+import time
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from recipe_app.models import AIRequestLock
+
+
+def flight_timeout():
+    return getattr(settings, 'AI_QUEUE_TIMEOUT', 10) + getattr(settings, 'AI_TIMEOUT', 60)
+
+
+# ---------- lock table ----------
+def claim(key, seconds):
+    """Insert the lock row for `key`; False if another live flight holds it."""
+    now = timezone.now()
+    AIRequestLock.objects.filter(expires_at__lt=now).delete()
+    try:
+        with transaction.atomic():
+            AIRequestLock.objects.create(key=key, expires_at=now + timedelta(seconds=seconds))
+    except IntegrityError:
+        return False
+    return True
+
+
+def peek(key):
+    """(row exists, published result or None) for `key`."""
+    rows = AIRequestLock.objects.filter(key=key, expires_at__gte=timezone.now()).values_list('result', flat=True)
+    results = list(rows)
+    return bool(results), results[0] if results else None
+
+
+def publish(key, text):
+    linger = timedelta(seconds=getattr(settings, 'AI_COALESCE_LINGER', 5))
+    AIRequestLock.objects.filter(key=key).update(result=text, expires_at=timezone.now() + linger)
+
+
+def release(key):
+    AIRequestLock.objects.filter(key=key, result__isnull=True).delete()
+
+
+class SingleFlight:
+    def __init__(self):
+        # asyncio tasks belong to one event loop, so flights are kept per loop
+        self._flights = weakref.WeakKeyDictionary()
+        self.metrics = {'leaders': 0, 'coalesced_local': 0, 'coalesced_remote': 0, 'fallbacks': 0, 'retries': 0}
+
+    def _for_loop(self):
+        return self._flights.setdefault(asyncio.get_running_loop(), {})
+
+    def in_flight(self):
+        return sum(len(flights) for flights in self._flights.values())
+
+    async def run(self, key, call):
+        """
+        Await `call()` (a coroutine function) once per key across concurrent
+        callers. Returns (result, coalesced) where coalesced is True when the
+        result came from another caller's flight.
+        """
+        flights = self._for_loop()
+        flight = flights.get(key)
+        if flight is None:
+            deadline = time.monotonic() + flight_timeout()
+            task = asyncio.ensure_future(self._lead(key, call, deadline))
+            flight = flights[key] = {'task': task, 'deadline': deadline, 'waiters': 0}
+
+            def landed(_):
+                if flights.get(key) is flight:
+                    del flights[key]
+            task.add_done_callback(landed)
+            coalesced = False
+        else:
+            self.metrics['coalesced_local'] += 1
+            coalesced = True
+
+        task = flight['task']
+        flight['waiters'] += 1
+        try:
+            remaining = max(flight['deadline'] - time.monotonic(), 0)
+            text, remote = await asyncio.wait_for(asyncio.shield(task), remaining)
+        except Exception:
+            if not coalesced or not task.done() or task.cancelled() or task.exception() is None:
+                raise
+            leader_failed = True
+        else:
+            leader_failed = False
+        finally:
+            flight['waiters'] -= 1
+            if not flight['waiters'] and not task.done():
+                task.cancel()
+        if leader_failed:
+            # the leader's error is the leader's own (e.g. its per-user quota): make this caller's call
+            self.metrics['retries'] += 1
+            return await call(), False
+        return text, coalesced or remote
+
+    async def _lead(self, key, call, deadline):
+        if not getattr(settings, 'AI_COALESCE_ACROSS_PROCESSES', True):
+            self.metrics['leaders'] += 1
+            return await call(), False
+
+        if not await sync_to_async(claim)(key, flight_timeout()):
+            poll = getattr(settings, 'AI_COALESCE_POLL', 0.2)
+            while True:
+                exists, text = await sync_to_async(peek)(key)
+                if text is not None:
+                    self.metrics['coalesced_remote'] += 1
+                    return text, True
+                if not exists:
+                    # the other leader failed or expired; make the call here
+                    self.metrics['fallbacks'] += 1
+                    return await call(), False
+                if time.monotonic() >= deadline:
+                    raise asyncio.TimeoutError
+                await asyncio.sleep(poll)
+
+        self.metrics['leaders'] += 1
+        try:
+            text = await call()
+        except BaseException:
+            await sync_to_async(release)(key)
+            raise
+        await sync_to_async(publish)(key, text)
+        return text, False
+
+    def stats(self):
+        return dict(self.metrics, in_flight=self.in_flight())
+
+
+flights = SingleFlight()
@@ -1,3 +1,1410 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import json
+import smtplib
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from recipe_app.models import (
+    AIRequestLock, Category, Comment, DirectShare, EmailPreference, Favorite, FeedEntry, Follow, Nutrient, OutboundEmail,
+    Rating, Recipe, RelatedRecipe, SharedRecipe, StaleRelatedRecipe, UserStats,
+)
+from recipe_app import ai, ai_cache, digests, events, follows, llm_json, related, search, singleflight
+from recipe_app.digests import build_digests
+from recipe_app.ingredients import parse_ingredients
+from recipe_app.outbox import Dispatcher, enqueue_new_recipe
+from recipe_app.related import rebuild_all, related_recipes_for
+from recipe_app.serializers import CommentSerializer, MyRecipeSerializer
+
+
+class RecipeQueryBudgetTests(TestCase):
+    """List and detail endpoints must cost the same number of queries however many rows they serialize."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.category = Category.objects.create(name='Dinner')
+
+    def make_recipes(self, count):
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {i}', description='desc', ingredients='salt', instruction='cook', author=self.user,
+            )
+            self.category.recipes.add(recipe)
+            Nutrient.objects.create(recipes_nutrient=recipe, calories=100)
+            comment = Comment.objects.create(recipe=recipe, user=self.user, content='nice')
+            Comment.objects.create(recipe=recipe, user=self.user, content='thanks', parent=comment)
+            Rating.objects.create(recipe=recipe, user=self.user, stars=4)
+            Favorite.objects.create(recipe=recipe, user=self.user)
+        related.rebuild_stale()
+        return recipe
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        self.make_recipes(2)
+        two_rows = self.count_queries('/api/auth/recipes/?view=full')
+        self.make_recipes(3)
+        full_page = self.count_queries('/api/auth/recipes/?view=full')
+        self.assertEqual(two_rows, full_page)
+        self.assertLessEqual(full_page, 10)
+
+    def test_authenticated_list_query_count_is_independent_of_page_size(self):
+        self.client.force_authenticate(self.user)
+        self.make_recipes(2)
+        two_rows = self.count_queries('/api/auth/recipes/?view=full')
+        self.make_recipes(3)
+        full_page = self.count_queries('/api/auth/recipes/?view=full')
+        self.assertEqual(two_rows, full_page)
+        self.assertLessEqual(full_page, 10)
+
+    def test_detail_query_count_is_independent_of_comment_count(self):
+        self.client.force_authenticate(self.user)
+        recipe = self.make_recipes(3)
+        before = self.count_queries(f'/api/auth/recipes/{recipe.id}/')
+        for _ in range(5):
+            Comment.objects.create(recipe=recipe, user=self.user, content='more')
+        after = self.count_queries(f'/api/auth/recipes/{recipe.id}/')
+        self.assertEqual(before, after)
+        self.assertLessEqual(after, 10)
+
+    def test_list_payload(self):
+        self.client.force_authenticate(self.user)
+        self.make_recipes(2)
+        row = self.client.get('/api/auth/recipes/?view=full').data['results'][0]
+        self.assertEqual(row['favorites_count'], 1)
+        self.assertTrue(row['is_favorite'])
+        self.assertEqual(len(row['related_recipes']), 1)
+        self.assertEqual(row['nutrient']['calories'], 100)
+
+    def test_card_list_query_count_is_independent_of_page_size(self):
+        self.make_recipes(2)
+        two_rows = self.count_queries('/api/auth/recipes/')
+        self.make_recipes(3)
+        self.assertEqual(two_rows, self.count_queries('/api/auth/recipes/'))
+
+    def test_my_recipe_serializer_reads_the_annotated_favorites_count(self):
+        self.make_recipes(3)
+        recipes = Recipe.objects.filter(author=self.user).with_card()
+        with CaptureQueriesContext(connection) as ctx:
+            data = MyRecipeSerializer(recipes, many=True).data
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([row['favorites_count'] for row in data], [1, 1, 1])
+
+    def test_card_payload(self):
+        self.make_recipes(2)
+        row = self.client.get('/api/auth/recipes/').data['results'][0]
+        # what the recipe list, category and dashboard cards render
+        self.assertEqual(set(row), {
+            'id', 'title', 'description', 'image', 'author', 'author_id', 'prep_time', 'cook_time', 'servings',
+            'difficulty', 'created_at', 'average_rating', 'ratings_count', 'favorites_count', 'highlight',
+        })
+        self.assertEqual(row['average_rating'], 4)
+        self.assertEqual(row['ratings_count'], 1)
+        self.assertEqual(row['favorites_count'], 1)
+
+
+class RelatedRecipeIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.dinner = Category.objects.create(name='Dinner')
+        self.vegan = Category.objects.create(name='Vegan')
+
+    def make_recipe(self, title, *categories, ingredients=None):
+        recipe = Recipe.objects.create(
+            title=title, description='d', ingredients=ingredients or title, instruction='s', author=self.user,
+        )
+        recipe.categories.set(categories)
+        related.rebuild_stale()
+        return recipe
+
+    def test_writes_only_mark_recipes_stale_for_the_worker(self):
+        base = self.make_recipe('Base')
+        other = self.make_recipe('Other')
+        with CaptureQueriesContext(connection) as ctx:
+            self.dinner.recipes.add(base, other)
+        self.assertFalse([q for q in ctx.captured_queries if 'recipe_app_relatedrecipe' in q['sql']])
+        self.assertEqual(related_recipes_for([base.id]), {base.id: []})
+        self.assertEqual(StaleRelatedRecipe.objects.count(), 2)
+
+        out = io.StringIO()
+        call_command('rebuild_related_recipes', '--stale', '--batch-size', '1', stdout=out)
+        self.assertIn('2 stale recipes', out.getvalue())
+        self.assertEqual([r.id for r in related_recipes_for([base.id])[base.id]], [other.id])
+        self.assertFalse(StaleRelatedRecipe.objects.exists())
+
+    def test_ranked_by_shared_categories(self):
+        base = self.make_recipe('Base', self.dinner, self.vegan)
+        one = self.make_recipe('One', self.dinner)
+        both = self.make_recipe('Both', self.dinner, self.vegan)
+        self.make_recipe('Unrelated')
+        related = related_recipes_for([base.id, one.id])
+        self.assertEqual([r.id for r in related[base.id]], [both.id, one.id])
+        self.assertEqual({r.id for r in related[one.id]}, {base.id, both.id})
+
+    def test_shared_ingredients_break_ties(self):
+        base = self.make_recipe('Base', self.dinner, ingredients='rice\nsaffron')
+        plain = self.make_recipe('Plain', self.dinner)
+        paella = self.make_recipe('Paella', self.dinner, ingredients='saffron\nprawns')
+        self.assertEqual([r.id for r in related_recipes_for([base.id])[base.id]], [paella.id, plain.id])
+
+    def test_removed_category_drops_pairs(self):
+        base = self.make_recipe('Base', self.dinner)
+        other = self.make_recipe('Other', self.dinner)
+        other.categories.remove(self.dinner)
+        related.rebuild_stale()
+        self.assertEqual(related_recipes_for([base.id, other.id]), {base.id: [], other.id: []})
+
+
+    def test_incremental_index_matches_full_rebuild(self):
+        lunch = Category.objects.create(name='Lunch')
+        categories = [self.dinner, self.vegan, lunch]
+        terms = ['rice', 'beans', 'corn', 'lime', 'chili', 'tofu']
+        recipes = [
+            self.make_recipe(f'R{i}', *categories[i % 3:i % 3 + 1 + i % 2], ingredients='\n'.join(terms[i % 4:i % 4 + 3]))
+            for i in range(14)
+        ]
+        recipes[0].categories.set(categories)
+        recipes[3].categories.remove(self.vegan)
+        recipes[5].ingredients = 'tofu\nlime'
+        recipes[5].save()
+        recipes[7].categories.clear()
+        # the worker takes all of those marks in one batch
+        self.assertEqual(related.rebuild_stale(), 4)
+
+        def index():
+            return set(RelatedRecipe.objects.values_list('recipe_id', 'related_id', 'score'))
+
+        incremental = index()
+        rebuild_all([recipe.id for recipe in recipes])
+        self.assertEqual(incremental, index())
+        self.assertLessEqual(
+            max(RelatedRecipe.objects.values('recipe_id').annotate(n=Count('id')).values_list('n', flat=True)), 10,
+        )
+
+class RecipeSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+
+    def make_recipe(self, title, ingredients='water', description='plain'):
+        return Recipe.objects.create(
+            title=title, description=description, ingredients=ingredients, instruction='s', author=self.user,
+        )
+
+    def search(self, query):
+        return self.client.get('/api/auth/recipes/', {'search': query}).data['results']
+
+    def test_title_matches_rank_above_ingredient_and_description_matches(self):
+        in_description = self.make_recipe('Soup', description='served with basil oil')
+        in_title = self.make_recipe('Basil pesto')
+        in_ingredients = self.make_recipe('Pasta', ingredients='fresh basil leaves')
+        self.make_recipe('Toast')
+        self.assertEqual([r['id'] for r in self.search('basil')], [in_title.id, in_ingredients.id, in_description.id])
+
+    def test_highlight_and_index_maintenance(self):
+        recipe = self.make_recipe('Lemon tart')
+        self.assertEqual(self.search('lemon')[0]['highlight']['title'], '<mark>Lemon</mark> tart')
+        recipe.title = 'Orange tart'
+        recipe.save()
+        self.assertEqual(self.search('lemon'), [])
+        recipe.delete()
+        self.assertEqual(self.search('orange'), [])
+
+    def test_migration_indexes_recipes_that_predate_the_search_table(self):
+        recipe = self.make_recipe('Lemon tart')
+        search.get_backend().remove(recipe.pk)
+        self.assertEqual(self.search('lemon'), [])
+        migration = importlib.import_module('recipe_app.migrations.0009_recipe_search')
+        with connection.cursor() as cursor:
+            migration.index_existing_recipes(django_apps, SimpleNamespace(connection=connection, execute=cursor.execute))
+        self.assertEqual([r['id'] for r in self.search('lemon')], [recipe.id])
+
+    def test_highlight_escapes_recipe_text(self):
+        self.make_recipe('<script>alert(1)</script> soup', description='<img src=x onerror=alert(1)> soup base')
+        highlight = self.search('soup')[0]['highlight']
+        self.assertEqual(highlight['title'], '&lt;script&gt;alert(1)&lt;/script&gt; <mark>soup</mark>')
+        self.assertNotIn('<img', highlight['snippet'])
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt; <mark>soup</mark>', highlight['snippet'])
+
+
+class PantryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+
+    def make_recipe(self, title, ingredients):
+        return Recipe.objects.create(title=title, description='d', ingredients=ingredients, instruction='s', author=self.user)
+
+    def test_parse_ingredients(self):
+        self.assertEqual(
+            parse_ingredients('2 cups fresh basil leaves, chopped\n3 large Tomatoes (ripe)\n1 tbsp olive oil'),
+            {'basil leaf', 'tomato', 'olive oil'},
+        )
+
+    def test_ranked_by_missing_ingredients(self):
+        complete = self.make_recipe('Salad', 'tomatoes\nolive oil')
+        missing_one = self.make_recipe('Bruschetta', 'tomato\nbread\nolive oil')
+        self.make_recipe('Cake', 'flour\nsugar')
+        results = self.client.get('/api/auth/recipes/cook_with/', {'items': 'Tomato, olive oil'}).data['results']
+        self.assertEqual([(r['id'], r['missing_count']) for r in results], [(complete.id, 0), (missing_one.id, 1)])
+
+    def test_rejects_non_string_items(self):
+        for items in (['tomato', 3], [None], [{'name': 'tomato'}], {'tomato': 1}):
+            response = self.client.post('/api/auth/recipes/cook_with/', {'items': items}, format='json')
+            self.assertEqual(response.status_code, 400, items)
+
+    def test_index_follows_updates(self):
+        recipe = self.make_recipe('Soup', 'leek\npotatoes')
+        recipe.ingredients = 'leek\ncarrots'
+        recipe.save()
+        self.assertEqual(set(recipe.ingredient_terms.values_list('term', flat=True)), {'leek', 'carrot'})
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', email='a@example.com', password='secret123')
+        self.rater = User.objects.create_user(username='rater', email='r@example.com', password='secret123')
+        self.recipe = Recipe.objects.create(title='Stew', description='d', ingredients='beef', instruction='s', author=self.author)
+        self.client.force_authenticate(self.rater)
+
+    def assertStats(self, count, total, avg):
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum, self.recipe.rating_avg), (count, total, avg))
+
+    def test_create_update_and_delete_keep_stats_in_sync(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/add_rating/'
+        self.client.post(url, {'stars': 4})
+        Rating.objects.create(recipe=self.recipe, user=self.author, stars=1)
+        self.assertStats(2, 5, 2.5)
+        self.client.post(url, {'stars': 2})
+        self.assertStats(2, 3, 1.5)
+        rating = Rating.objects.get(user=self.rater)
+        self.client.delete(f'/api/auth/user-ratings/{rating.id}/')
+        self.assertStats(1, 1, 1.0)
+
+    def test_reconcile(self):
+        Rating.objects.create(recipe=self.recipe, user=self.rater, stars=5)
+        Recipe.objects.update(rating_count=0, rating_sum=0, rating_avg=0)
+        Recipe.objects.reconcile_rating_stats()
+        self.assertStats(1, 5, 5.0)
+
+    def test_saving_a_stale_instance_keeps_ratings_made_since(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Rating.objects.create(recipe=self.recipe, user=self.rater, stars=4)
+        stale.title = 'Beef stew'
+        stale.save()
+        self.assertStats(1, 4, 4.0)
+        self.assertEqual(self.recipe.title, 'Beef stew')
+
+    def test_recipe_update_keeps_ratings_made_during_the_request(self):
+        self.client.force_authenticate(self.author)
+        real_save = Recipe.save
+
+        def rate_then_save(recipe, *args, **kwargs):
+            # a rating lands after the view loaded the recipe
+            if not Rating.objects.exists():
+                Rating.objects.create(recipe=self.recipe, user=self.rater, stars=5)
+            real_save(recipe, *args, **kwargs)
+
+        with mock.patch.object(Recipe, 'save', rate_then_save):
+            response = self.client.patch(f'/api/auth/recipes/{self.recipe.id}/', {'title': 'Beef stew'})
+        self.assertEqual(response.status_code, 200)
+        self.assertStats(1, 5, 5.0)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.recipes = [
+            Recipe.objects.create(title=f'R{i}', description='d', ingredients='i', instruction='s', author=self.user)
+            for i in range(7)
+        ]
+
+    def test_walks_all_pages_newest_first(self):
+        seen = []
+        response = self.client.get('/api/auth/recipes/', {'page_size': 3, 'count': 'exact'})
+        self.assertEqual(response.data['count'], 7)
+        while True:
+            seen += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_ties_on_the_ordering_field_break_on_id(self):
+        rater = User.objects.create_user(username='rater', email='r@example.com', password='secret123')
+        for recipe in self.recipes[2:4]:
+            Rating.objects.create(recipe=recipe, user=rater, stars=5)
+        expected = [recipe.id for recipe in sorted(self.recipes, key=lambda r: (-r.ratings.count(), -r.id))]
+
+        seen, pages = [], []
+        response = self.client.get('/api/auth/recipes/', {'page_size': 2, 'ordering': '-rating_avg'})
+        while True:
+            pages.append([row['id'] for row in response.data['results']])
+            seen += pages[-1]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+
+        # and back again through the previous links
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([row['id'] for row in previous.data['results']], pages[-2])
+
+    def test_bad_cursor_is_404(self):
+        response = self.client.get('/api/auth/recipes/', {'cursor': 'cD15ZXN0ZXJkYXklN0N4'})  # p=yesterday|x
+        self.assertEqual(response.status_code, 404)
+
+    def test_count_is_opt_in_and_page_size_is_capped(self):
+        response = self.client.get('/api/auth/recipes/', {'page_size': 1000})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 7)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.recipe = Recipe.objects.create(title='Stew', description='d', ingredients='beef', instruction='s', author=self.user)
+
+    def test_category_list_is_cached_until_a_category_changes(self):
+        category = Category.objects.create(name='Dinner')
+        self.assertEqual(self.client.get('/api/auth/categories/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/auth/categories/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            category.recipes.add(self.recipe)
+        response = self.client.get('/api/auth/categories/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data[0]['recipes_count'], 1)
+
+    def test_detail_is_invalidated_by_nested_changes(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(recipe=self.recipe, user=self.user, content='yum')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_versions_move_only_when_the_write_commits(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/'
+        self.client.get(url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Comment.objects.create(recipe=self.recipe, user=self.user, content='yum')
+            # a reader inside the write's window must not cache under the new version
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/auth/recipes/featured/')
+        self.assertFalse(self.client.get('/api/auth/recipes/featured/').has_header('X-Cache'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.recipe = Recipe.objects.create(title='Stew', description='d', ingredients='beef', instruction='s', author=self.user)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_detail_returns_304_until_a_nested_change(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                Favorite.objects.create(recipe=self.recipe, user=self.user)
+        # the version bump is the validator; the recipe row itself isn't touched
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "recipe_app_recipe"')])
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_detail_follows_related_recipes_and_author_renames(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/'
+        dinner = Category.objects.create(name='Dinner')
+        dinner.recipes.add(self.recipe)
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Recipe.objects.create(title='Soup', description='d', ingredients='leek', instruction='s', author=self.user)
+            dinner.recipes.add(other)
+            related.rebuild_stale()
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.user.last_login = self.user.date_joined
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        self.user.username = 'chef'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_list_and_category_validators(self):
+        category = Category.objects.create(name='Dinner')
+        list_etag = self.client.get('/api/auth/recipes/')['ETag']
+        category_etag = self.client.get('/api/auth/categories/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate('/api/auth/recipes/', list_etag).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(self.revalidate('/api/auth/categories/', category_etag).status_code, 304)
+        category.recipes.add(self.recipe)
+        self.assertEqual(self.revalidate('/api/auth/categories/', category_etag).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(self.revalidate('/api/auth/recipes/', list_etag).status_code, 200)
+
+    def test_etag_varies_by_user(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='cook', email='cook@example.com', password='secret123')
+        self.recipe = Recipe.objects.create(title='Stew', description='d', ingredients='beef', instruction='s', author=self.user)
+
+    def add_threads(self, count):
+        for i in range(count):
+            comment = Comment.objects.create(recipe=self.recipe, user=self.user, content=f'c{i}')
+            for j in range(2):
+                Comment.objects.create(recipe=self.recipe, user=self.user, content=f'r{i}.{j}', parent=comment)
+
+    def test_nested_comment_serializer_reads_annotated_reply_counts(self):
+        self.add_threads(3)
+        comments = self.recipe.comments.filter(parent__isnull=True).with_replies()
+        with CaptureQueriesContext(connection) as ctx:
+            data = CommentSerializer(comments, many=True).data
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual({row['has_replies'] for row in data}, {True})
+        self.assertEqual({reply['has_replies'] for row in data for reply in row['replies']}, {False})
+
+    def test_threads_endpoint_uses_constant_queries(self):
+        url = f'/api/auth/recipes/{self.recipe.id}/comments/'
+        self.add_threads(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self.add_threads(4)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        first = response.data['results'][0]
+        self.assertEqual((first['content'], first['reply_count']), ('c3', 2))
+        self.assertEqual([reply['content'] for reply in first['replies']], ['r3.0', 'r3.1'])
+
+    def test_threads_ignore_recipe_list_parameters(self):
+        self.add_threads(7)
+        url = f'/api/auth/recipes/{self.recipe.id}/comments/'
+        newest_first = [f'c{i}' for i in reversed(range(7))]
+        for params in ({}, {'search': 'stew'}, {'ordering': 'created_at'}):
+            seen = []
+            response = self.client.get(url, params)
+            while True:
+                seen += [row['content'] for row in response.data['results']]
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+            self.assertEqual(seen, newest_first, params)
+
+    def test_recipe_payload_carries_count_and_preview(self):
+        self.add_threads(4)
+        data = self.client.get(f'/api/auth/recipes/{self.recipe.id}/').data
+        self.assertEqual(data['comments_count'], 12)
+        self.assertEqual([c['content'] for c in data['comments_preview']], ['c3', 'c2', 'c1'])
+        data = self.client.get(f'/api/auth/recipes/{self.recipe.id}/', {'comments_preview': 0}).data
+        self.assertEqual(data['comments_preview'], [])
+
+
+class MaterializedFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', email='r@example.com', password='secret123')
+        self.chef = User.objects.create_user(username='chef', email='c@example.com', password='secret123')
+        self.friend = User.objects.create_user(username='friend', email='f@example.com', password='secret123')
+        self.client.force_authenticate(self.reader)
+
+    def make_recipe(self, title, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(title=title, description='d', ingredients='x', instruction='s', author=author)
+
+    def follow(self, user):
+        return self.client.post('/api/auth/follows/follow/', {'user_id': user.id})
+
+    def test_follow_backfills_and_new_recipes_fan_out(self):
+        self.make_recipe('Old', self.chef)
+        self.follow(self.chef)
+        self.make_recipe('New', self.chef)
+        self.assertEqual([item['title'] for item in self.client.get('/api/auth/feed/').data], ['New', 'Old'])
+
+    def test_follows_endpoint_backfills_and_prunes(self):
+        self.make_recipe('Old', self.chef)
+        response = self.client.post('/api/auth/follows/', {'following': self.chef.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['title'] for item in self.client.get('/api/auth/feed/').data], ['Old'])
+        self.assertEqual(self.client.delete(f"/api/auth/follows/{response.data['id']}/").status_code, 204)
+        self.assertEqual(self.client.get('/api/auth/feed/').data, [])
+
+    def test_migration_backfills_follows_that_predate_the_feed(self):
+        Follow.objects.create(follower=self.reader, following=self.chef)
+        Follow.objects.create(follower=self.reader, following=self.friend)
+        soup = self.make_recipe('Soup', self.chef)
+        pie = self.make_recipe('Pie', self.reader)
+        SharedRecipe.objects.create(sender=self.friend, recipe=soup)  # reader gets Soup from chef
+        SharedRecipe.objects.create(sender=self.friend, recipe=pie)
+        FeedEntry.objects.all().delete()
+        migration = importlib.import_module('recipe_app.migrations.0023_backfill_feed_entries')
+        migration.backfill_feed_entries(django_apps, None)
+        data = self.client.get('/api/auth/feed/').data
+        self.assertEqual([(item['title'], item.get('type')) for item in data], [('Pie', 'shared'), ('Soup', None)])
+        self.assertEqual(data, self.client.get('/api/auth/feed/', {'mode': 'merged'}).data)
+
+    def test_shares_dedup_against_followed_authors_and_unfollow_prunes(self):
+        self.follow(self.chef)
+        self.follow(self.friend)
+        recipe = self.make_recipe('Soup', self.chef)
+        other = self.make_recipe('Pie', self.reader)
+        self.client.force_authenticate(self.friend)
+        self.client.post(f'/api/auth/recipes/{recipe.id}/share_to_followers/')
+        self.client.post(f'/api/auth/recipes/{other.id}/share_to_followers/')
+        self.client.force_authenticate(self.reader)
+        data = self.client.get('/api/auth/feed/').data
+        self.assertEqual([(item['title'], item.get('type')) for item in data], [('Pie', 'shared'), ('Soup', None)])
+        self.client.post('/api/auth/follows/unfollow/', {'user_id': self.friend.id})
+        self.assertEqual([item['title'] for item in self.client.get('/api/auth/feed/').data], ['Soup'])
+
+    def read_all(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen += [item['title'] for item in response.data]
+            url = response.get('Link', '').split(';')[0].strip('<>')
+        return seen
+
+    def test_feed_pages_with_cursor(self):
+        self.follow(self.chef)
+        for i in range(3):
+            self.make_recipe(f'R{i}', self.chef)
+        response = self.client.get('/api/auth/feed/', {'limit': 2})
+        self.assertEqual([item['title'] for item in response.data], ['R2', 'R1'])
+        next_url = response['Link'].split(';')[0].strip('<>')
+        self.assertEqual([item['title'] for item in self.client.get(next_url).data], ['R0'])
+        self.assertEqual(self.client.get('/api/auth/feed/', {'cursor': 'bogus'}).status_code, 400)
+
+    def test_items_sharing_a_timestamp_are_neither_skipped_nor_repeated(self):
+        self.follow(self.chef)
+        recipes = [self.make_recipe(f'R{i}', self.chef) for i in range(5)]
+        FeedEntry.objects.filter(owner=self.reader).update(created_at=recipes[0].created_at)
+        self.assertEqual(self.read_all('/api/auth/feed/?limit=2'), ['R4', 'R3', 'R2', 'R1', 'R0'])
+
+    def test_authors_over_fanout_limit_are_merged_on_read(self):
+        self.follow(self.chef)
+        with self.settings(FEED_FANOUT_LIMIT=0):
+            self.make_recipe('Viral', self.chef)
+            self.assertFalse(FeedEntry.objects.filter(recipe__title='Viral').exists())
+            self.assertEqual([item['title'] for item in self.client.get('/api/auth/feed/').data], ['Viral'])
+
+    def test_merge_on_read_skips_recipes_already_materialized(self):
+        self.follow(self.chef)
+        for i in range(3):
+            self.make_recipe(f'R{i}', self.chef)
+        # the chef crosses the fan-out limit after these rows were pushed
+        with self.settings(FEED_FANOUT_LIMIT=0):
+            self.make_recipe('Viral', self.chef)
+            self.assertEqual(self.read_all('/api/auth/feed/?limit=2'), ['Viral', 'R2', 'R1', 'R0'])
+
+    def test_merged_mode_is_one_query_per_page(self):
+        self.follow(self.chef)
+        self.follow(self.friend)
+        soup = self.make_recipe('Soup', self.chef)
+        pie = self.make_recipe('Pie', self.reader)
+        for i in range(3):
+            self.make_recipe(f'R{i}', self.friend)
+        self.client.force_authenticate(self.friend)
+        self.client.post(f'/api/auth/recipes/{soup.id}/share_to_followers/')
+        self.client.post(f'/api/auth/recipes/{pie.id}/share_to_followers/')
+        self.client.force_authenticate(self.reader)
+
+        expected = [item['id'] for item in self.client.get('/api/auth/feed/').data]
+        seen, url, pages = [], '/api/auth/feed/?mode=merged&limit=2', []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            pages.append(len(ctx.captured_queries))
+            seen += [item['id'] for item in response.data]
+            url = response.get('Link', '').split(';')[0].strip('<>')
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(pages), {1})
+
+
+class SharedInboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', email='r@example.com', password='secret123')
+        self.client.force_authenticate(self.reader)
+
+    def add_sharer(self, name, shares):
+        sharer = User.objects.create_user(username=name, email=f'{name}@example.com', password='secret123')
+        for i in range(shares):
+            recipe = Recipe.objects.create(title=f'{name}{i}', description='d', ingredients='x', instruction='s', author=sharer)
+            DirectShare.objects.create(sender=sharer, receiver=self.reader, recipe=recipe, is_read=i == 0)
+        return sharer
+
+    def test_inbox_costs_constant_queries_and_caps_recent(self):
+        self.add_sharer('ann', 2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/auth/shared-recipes/')
+        self.add_sharer('bob', 4)
+        self.add_sharer('cat', 3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/auth/shared-recipes/', {'recent': 2})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual([row['sharer_username'] for row in response.data], ['cat', 'bob', 'ann'])
+        bob = response.data[1]
+        self.assertEqual((bob['total_shared'], bob['unread_count']), (4, 3))
+        self.assertEqual([share['recipe_title'] for share in bob['shared_recipes']], ['bob3', 'bob2'])
+
+    def test_inbox_pages_over_sharers(self):
+        for name in ('ann', 'bob', 'cat'):
+            self.add_sharer(name, 1)
+        response = self.client.get('/api/auth/shared-recipes/', {'page_size': 2})
+        self.assertEqual([row['sharer_username'] for row in response.data], ['cat', 'bob'])
+        next_url = response['Link'].split(';')[0].strip('<>')
+        self.assertEqual([row['sharer_username'] for row in self.client.get(next_url).data], ['ann'])
+
+
+class BulkDirectShareTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.sender = User.objects.create_user(username='sender', email='s@example.com', password='secret123')
+        self.recipe = Recipe.objects.create(title='Soup', description='d', ingredients='x', instruction='s', author=self.sender)
+        self.client.force_authenticate(self.sender)
+
+    def make_followed(self, count, prefix='f'):
+        users = [
+            User.objects.create_user(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password='x')
+            for i in range(count)
+        ]
+        Follow.objects.bulk_create([Follow(follower=self.sender, following=user) for user in users])
+        return [user.id for user in users]
+
+    def share(self, receiver_ids):
+        return self.client.post(f'/api/auth/recipes/{self.recipe.id}/direct_share/', {'receiver_ids': receiver_ids}, format='json')
+
+    def test_query_count_is_independent_of_receiver_count(self):
+        few, many = self.make_followed(2, 'a'), self.make_followed(40, 'b')
+        with CaptureQueriesContext(connection) as small:
+            self.share(few)
+        with CaptureQueriesContext(connection) as large:
+            response = self.share(many)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 40)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_reports_created_skipped_and_invalid(self):
+        first, second = self.make_followed(2)
+        stranger = User.objects.create_user(username='stranger', email='x@example.com', password='x')
+        self.share([first])
+        response = self.share([first, second, stranger.id, 'nope'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            (response.data['created'], response.data['skipped'], response.data['invalid']),
+            ([second], [first], ['nope', stranger.id]),
+        )
+        self.assertEqual(DirectShare.objects.filter(recipe=self.recipe).count(), 2)
+        self.assertEqual(self.share([first]).status_code, 400)
+
+
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', email='r@example.com', password='secret123')
+        self.senders = [
+            User.objects.create_user(username=f's{i}', email=f's{i}@example.com', password='x') for i in range(2)
+        ]
+        self.client.force_authenticate(self.reader)
+
+    def share(self, sender, title):
+        recipe = Recipe.objects.create(title=title, description='d', ingredients='x', instruction='s', author=sender)
+        return DirectShare.objects.create(sender=sender, receiver=self.reader, recipe=recipe)
+
+    def unread_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            count = self.client.get('/api/auth/notifications/unread-count/').data['unread_count']
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return count
+
+    def test_counter_follows_creates_saves_and_deletes(self):
+        shares = [self.share(sender, f'{sender.username}-{i}') for sender in self.senders for i in range(2)]
+        self.assertEqual(self.unread_count(), 4)
+        share = DirectShare.objects.get(pk=shares[0].pk)
+        share.is_read = True
+        share.save()
+        shares[1].delete()
+        self.assertEqual(self.unread_count(), 2)
+
+    def test_bulk_mark_read_by_ids_sender_and_all(self):
+        shares = [self.share(sender, f'{sender.username}-{i}') for sender in self.senders for i in range(3)]
+        mark = lambda payload: self.client.post('/api/auth/notifications/mark-read/', payload, format='json').data
+        self.assertEqual(mark({'ids': [shares[0].id, shares[1].id]}), {'updated': 2, 'unread_count': 4})
+        self.assertEqual(mark({'sender_id': self.senders[1].id}), {'updated': 3, 'unread_count': 1})
+        self.assertEqual(mark({'all': True}), {'updated': 1, 'unread_count': 0})
+        self.assertEqual(self.client.post('/api/auth/notifications/mark-read/', {}, format='json').status_code, 400)
+
+    def test_list_is_paginated_newest_first(self):
+        for i in range(3):
+            self.share(self.senders[0], f'r{i}')
+        response = self.client.get('/api/auth/notifications/', {'page_size': 2})
+        self.assertEqual([item['recipe_title'] for item in response.data], ['r2', 'r1'])
+        next_url = response['Link'].split(';')[0].strip('<>')
+        self.assertEqual([item['recipe_title'] for item in self.client.get(next_url).data], ['r0'])
+
+    def test_bulk_direct_share_bumps_counter(self):
+        Follow.objects.create(follower=self.senders[0], following=self.reader)
+        recipe = Recipe.objects.create(title='Soup', description='d', ingredients='x', instruction='s', author=self.senders[0])
+        self.client.force_authenticate(self.senders[0])
+        self.client.post(f'/api/auth/recipes/{recipe.id}/direct_share/', {'receiver_ids': [self.reader.id]}, format='json')
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.unread_count(), 1)
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(5)
+        ]
+        self.me = self.users[0]
+        self.client.force_authenticate(self.me)
+
+    def follow(self, user, target):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/auth/follows/follow/', {'user_id': target.id})
+        self.client.force_authenticate(self.me)
+        return response
+
+    def counts(self, user):
+        return self.client.get('/api/auth/follows/counts/', {'user_id': user.id}).data
+
+    def test_follow_and_unfollow_are_single_writes_with_counters(self):
+        target = self.users[1]
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.follow(self.me, target).status_code, 201)
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'DELETE'))]
+        self.assertEqual(len([sql for sql in writes if 'recipe_app_follow' in sql]), 1)
+        self.assertEqual(self.follow(self.me, target).status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/follows/follow/', {'user_id': 999}).status_code, 404)
+        self.assertEqual((self.counts(target)['followers_count'], self.counts(self.me)['following_count']), (1, 1))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.post('/api/auth/follows/unfollow/', {'user_id': target.id}).status_code, 200)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('DELETE') and 'recipe_app_follow"' in q['sql']]), 1)
+        self.assertEqual(self.client.post('/api/auth/follows/unfollow/', {'user_id': target.id}).status_code, 404)
+        self.assertEqual(self.counts(target)['followers_count'], 0)
+
+    def test_lists_are_paginated(self):
+        for user in self.users[1:]:
+            self.follow(user, self.me)
+        response = self.client.get('/api/auth/follows/followers/', {'page_size': 3})
+        self.assertEqual([row['username'] for row in response.data], ['u4', 'u3', 'u2'])
+        next_url = response['Link'].split(';')[0].strip('<>')
+        self.assertEqual([row['username'] for row in self.client.get(next_url).data], ['u1'])
+
+    def test_suggestions_rank_mutuals_and_invalidate_on_follow(self):
+        a, b, c, d = self.users[1:]
+        self.follow(self.me, a)
+        self.follow(self.me, b)
+        self.follow(a, c)
+        self.follow(b, c)
+        self.follow(a, d)
+        self.follow(a, self.me)
+        data = self.client.get('/api/auth/follows/suggestions/').data
+        self.assertEqual([(row['username'], row['mutual_count']) for row in data], [('u3', 2), ('u4', 1)])
+        self.follow(self.me, c)
+        self.assertEqual([row['username'] for row in self.client.get('/api/auth/follows/suggestions/').data], ['u4'])
+
+    def test_follows_by_people_i_follow_refresh_my_suggestions(self):
+        a, b = self.users[1:3]
+        self.follow(self.me, a)
+        self.assertEqual(self.client.get('/api/auth/follows/suggestions/').data, [])
+        self.follow(a, b)
+        self.assertEqual([row['username'] for row in self.client.get('/api/auth/follows/suggestions/').data], ['u2'])
+
+    def test_precompute_command_fills_the_cache_in_batches(self):
+        a, b, c = self.users[1:4]
+        self.follow(self.me, a)
+        self.follow(b, a)
+        self.follow(a, c)
+        cache.clear()
+        call_command('precompute_follow_suggestions', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(cache.get(follows.suggestions_key(self.me.id)), [(c.id, 1)])
+        self.assertEqual(cache.get(follows.suggestions_key(b.id)), [(c.id, 1)])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(follows.suggestions_for(self.me.id)[0]['username'], 'u3')
+        self.assertEqual(len(ctx.captured_queries), 1)  # just the usernames
+
+    def test_bad_and_unknown_user_ids(self):
+        for action in ('counts', 'followers', 'following'):
+            url = f'/api/auth/follows/{action}/'
+            self.assertEqual(self.client.get(url, {'user_id': 'abc'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'user_id': 999}).status_code, 404)
+        self.assertIsNone(UserStats.for_user(999))
+        self.assertFalse(UserStats.objects.filter(user_id=999).exists())
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', email='r@example.com', password='secret123')
+        self.sender = User.objects.create_user(username='sender', email='s@example.com', password='secret123')
+        self.token = str(RefreshToken.for_user(self.reader).access_token)
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get('/api/auth/events/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_pushes_shares_and_keepalives(self):
+        with self.settings(EVENTS_KEEPALIVE=0.05):
+            response = await self.async_client.get('/api/auth/events/', {'token': self.token})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+            self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+            self.assertEqual(await anext(chunks), b': keep-alive\n\n')
+
+            @sync_to_async
+            def share():
+                recipe = Recipe.objects.create(title='Soup', description='d', ingredients='x', instruction='s', author=self.sender)
+                with self.captureOnCommitCallbacks(execute=True):
+                    DirectShare.objects.create(sender=self.sender, receiver=self.reader, recipe=recipe)
+
+            await share()
+            chunk = await anext(chunks)
+            while chunk == b': keep-alive\n\n':
+                chunk = await anext(chunks)
+            self.assertIn(b'event: share\n', chunk)
+            self.assertIn(b'"recipe_title": "Soup"', chunk)
+
+    async def test_closed_stream_unsubscribes(self):
+        broker = events.get_broker()
+        before = broker.connection_count()
+        stream = events.EventStreamView().stream(self.reader.pk)
+        await anext(stream)
+        self.assertEqual(broker.connection_count(), before + 1)
+        await stream.aclose()
+        self.assertEqual(broker.connection_count(), before)
+
+    def test_redis_listener_survives_errors_and_resubscribes(self):
+        class Stop(BaseException):
+            pass
+
+        event = {'user_ids': [self.reader.pk], 'event': {'type': 'share', 'data': {}}}
+        sessions = iter([
+            ConnectionError('redis went away'),
+            [{'data': 'not json'}, {'data': json.dumps(event)}],
+            Stop(),
+        ])
+
+        class FakePubSub:
+            def subscribe(self, channel):
+                self.session = next(sessions)
+                if isinstance(self.session, BaseException):
+                    raise self.session
+
+            def listen(self):
+                yield from self.session
+                raise ConnectionError('connection reset')
+
+            def close(self):
+                pass
+
+        broker = events.RedisBroker.__new__(events.RedisBroker)  # no redis package needed
+        events.InProcessBroker.__init__(broker)
+        broker.redis = SimpleNamespace(pubsub=lambda **kwargs: FakePubSub())
+        broker.deliver = mock.Mock()
+        with mock.patch.object(events.time, 'sleep') as sleep, self.assertLogs('recipe_app.events') as logs:
+            with self.assertRaises(Stop):
+                broker._listen()
+        broker.deliver.assert_called_once_with([self.reader.pk], {'type': 'share', 'data': {}, 'id': 1})
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 0.5])
+        self.assertEqual(len(logs.records), 3)
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """Refuses mail to bounce@example.com; counts connections opened."""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'bounce@example.com' in message.to:
+                raise smtplib.SMTPRecipientsRefused({'bounce@example.com': (550, b'no such user')})
+        mail.outbox.extend(messages)
+        return len(messages)
+
+
+class DownEmailBackend(BaseEmailBackend):
+    """An SMTP server that can't be reached."""
+
+    def open(self):
+        raise ConnectionRefusedError('connection refused')
+
+    def send_messages(self, messages):
+        raise AssertionError('never connected')
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='secret123')
+        for name in ('a', 'b', 'bounce'):
+            follower = User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            Follow.objects.create(follower=follower, following=self.author)
+        User.objects.create_user(username='stranger', email='stranger@example.com', password='x')
+        FlakyEmailBackend.opened = 0
+
+    def test_create_queues_instead_of_sending(self):
+        self.client.force_authenticate(self.author)
+        image = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(image, 'PNG')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post('/api/auth/recipes/', {
+                'title': 'Soup', 'description': 'd', 'ingredients': 'x', 'instruction': 's',
+                'image': SimpleUploadedFile('soup.png', image.getvalue(), content_type='image/png'),
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('recipient', flat=True)),
+            ['a@example.com', 'author@example.com', 'b@example.com', 'bounce@example.com'],
+        )
+
+    @override_settings(EMAIL_BACKEND='recipe_app.tests.FlakyEmailBackend', OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE=0)
+    def test_worker_sends_per_recipient_and_retries_failures(self):
+        recipe = Recipe.objects.create(title='Soup', description='d', ingredients='x', instruction='s', author=self.author)
+        enqueue_new_recipe(recipe)
+        stats = Dispatcher(batch_size=2).drain()
+        self.assertEqual((stats['sent'], stats['retried'], stats['failed']), (3, 1, 1))
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'author@example.com', 'b@example.com'])
+        bounced = OutboundEmail.objects.get(recipient='bounce@example.com')
+        self.assertEqual((bounced.status, bounced.attempts), (OutboundEmail.FAILED, 2))
+        self.assertIn('SMTPRecipientsRefused', bounced.last_error)
+
+    @override_settings(EMAIL_BACKEND='recipe_app.tests.DownEmailBackend', OUTBOX_MAX_ATTEMPTS=1)
+    def test_unreachable_server_defers_without_charging_attempts(self):
+        recipe = Recipe.objects.create(title='Soup', description='d', ingredients='x', instruction='s', author=self.author)
+        enqueue_new_recipe(recipe)
+        stats = Dispatcher(batch_size=2).drain()
+        self.assertEqual((stats['sent'], stats['failed'], stats['deferred'], stats['batches']), (0, 0, 2, 1))
+        rows = OutboundEmail.objects.order_by('id')
+        self.assertEqual({(row.status, row.attempts) for row in rows}, {(OutboundEmail.PENDING, 0)})
+        # the first batch is put back for later; the drain stops instead of trying the second
+        self.assertEqual([row.next_attempt_at > timezone.now() for row in rows], [True, True, False, False])
+        self.assertIn('ConnectionRefusedError', rows[0].last_error)
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='x')
+        self.readers = []
+        for name, frequency in (('dee', 'daily'), ('dan', 'daily'), ('ivy', 'immediate')):
+            reader = User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            EmailPreference.objects.create(user=reader, frequency=frequency)
+            Follow.objects.create(follower=reader, following=self.author)
+            self.readers.append(reader)
+        for title in ('Soup', 'Pie'):
+            recipe = Recipe.objects.create(title=title, description='d', ingredients='x', instruction='s', author=self.author)
+            enqueue_new_recipe(recipe)
+
+    def test_digest_users_skip_immediate_mail_and_get_one_digest(self):
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('recipient', flat=True)),
+            ['author@example.com'] * 2 + ['ivy@example.com'] * 2,
+        )
+        OutboundEmail.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(build_digests('daily', batch_size=10), (2, 2))
+        self.assertLess(len(ctx.captured_queries), 10)
+        digest = OutboundEmail.objects.get(recipient='dee@example.com')
+        self.assertIn('"Pie" by author', digest.body)
+        self.assertLess(digest.body.index('Pie'), digest.body.index('Soup'))
+        self.assertEqual(build_digests('daily'), (0, 0))
+
+    def test_interrupted_run_resumes_without_duplicates(self):
+        calls = []
+        original = digests.new_recipes_for
+
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return original(*args)
+
+        with mock.patch('recipe_app.digests.new_recipes_for', fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                build_digests('daily', batch_size=1)
+        self.assertEqual(OutboundEmail.objects.filter(kind=OutboundEmail.DIGEST).count(), 1)
+        self.assertEqual(build_digests('daily', batch_size=1), (1, 1))
+        self.assertEqual(
+            sorted(OutboundEmail.objects.filter(kind=OutboundEmail.DIGEST).values_list('recipient', flat=True)),
+            ['dan@example.com', 'dee@example.com'],
+        )
+
+
+class ProfileStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(4)
+        ]
+
+    def add_activity(self, author, raters):
+        recipe = Recipe.objects.create(title='Dish', description='d', ingredients='x', instruction='s', author=author)
+        for stars, rater in zip((5, 4, 3), raters):
+            Rating.objects.create(recipe=recipe, user=rater, stars=stars)
+            Comment.objects.create(recipe=recipe, user=rater, content='yum')
+            Favorite.objects.create(recipe=recipe, user=rater)
+            Follow.objects.get_or_create(follower=rater, following=author)
+
+    def test_profile_stats_come_from_one_query(self):
+        author = self.users[0]
+        self.add_activity(author, self.users[1:])
+        self.add_activity(author, self.users[1:3])
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(f'/api/auth/users/{author.id}/profile/').data
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('email', data)
+        self.assertEqual(
+            {key: data[key] for key in ('total_recipes', 'followers_count', 'following_count', 'ratings_received', 'average_rating')},
+            {'total_recipes': 2, 'followers_count': 3, 'following_count': 0, 'ratings_received': 5, 'average_rating': 4.2},
+        )
+        rater = self.client.get(f'/api/auth/users/{self.users[1].id}/profile/').data
+        self.assertEqual((rater['total_comments'], rater['total_favorites'], rater['following_count']), (2, 2, 1))
+
+    def test_batch_lookup_keeps_order_in_one_query(self):
+        self.add_activity(self.users[0], self.users[1:])
+        ids = [self.users[2].id, self.users[0].id, 999]
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/auth/users/profiles/', {'ids': ','.join(map(str, ids))}).data
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([row['username'] for row in data], ['u2', 'u0'])
+        self.assertEqual(self.client.get('/api/auth/users/profiles/', {'ids': 'x'}).status_code, 400)
+
+    def test_own_profile_includes_email(self):
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get('/api/auth/profile/').data['email'], 'u0@example.com')
+
+
+class FakeModel:
+    def __init__(self, text='', delay=0, chunks=None):
+        self.text = text if chunks is None else ''.join(chunks)
+        self.chunks = chunks or [text]
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if stream:
+            return self.stream()
+        return SimpleNamespace(text=self.text)
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield SimpleNamespace(text=chunk)
+
+
+class AIServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cook', email='c@example.com', password='secret123')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        ai_cache.responses.clear()
+        self.addCleanup(ai_cache.responses.clear)
+
+    def ask(self, path, payload, headers=None):
+        return self.async_client.post(path, payload, content_type='application/json', headers=headers or self.auth)
+
+    @override_settings(GEMINI_API_KEY='test-key')
+    def test_each_event_loop_gets_its_own_model_client(self):
+        async def models():
+            return ai.get_model(), ai.get_model()
+
+        first, again = asyncio.run(models())
+        second, _ = asyncio.run(models())
+        self.assertIs(first, again)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first._async_client, second._async_client)
+
+    def test_model_client_hook_fails_loudly_when_genai_changes(self):
+        # new_model() relies on GenerativeModel reading _async_client; a genai upgrade must not drop it silently
+        import google.generativeai as genai
+        self.assertIn('_async_client', vars(genai.GenerativeModel('models/test')))
+        with self.assertRaises(ImproperlyConfigured):
+            ai.use_async_client(SimpleNamespace(), object())
+
+    async def test_views_return_model_output(self):
+        with mock.patch.object(ai, 'get_model', return_value=FakeModel('Keep the pan hot.')):
+            response = await self.ask('/api/auth/ai/cooking-coach/', {'question': 'Why does it stick?'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['answer'], 'Keep the pan hot.')
+
+        recipe = '```json {"title": "Soup", "ingredients": ["water"], "instructions": ["Boil"], "servings": "4"} ```'
+        with mock.patch.object(ai, 'get_model', return_value=FakeModel(recipe)):
+            response = await self.ask('/api/auth/ai/generate-structured-recipe/', {'description': 'soup'}, headers={})
+        self.assertEqual(
+            response.json()['recipe_data'],
+            {'title': 'Soup', 'ingredients': ['water'], 'instructions': ['Boil'], 'servings': 4},
+        )
+
+    async def test_requires_auth_and_post(self):
+        response = await self.ask('/api/auth/ai/cooking-coach/', {'question': 'q'}, headers={'X-Nothing': '1'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/auth/ai/cooking-coach/', headers=self.auth)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_slow_model_times_out(self):
+        with self.settings(AI_TIMEOUT=0.01), mock.patch.object(ai, 'get_model', return_value=FakeModel('late', delay=1)):
+            response = await self.ask('/api/auth/ai/cooking-coach/', {'question': 'q'})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(ai.limiter.in_flight(), 0)
+
+    async def test_per_user_concurrency_is_limited(self):
+        settings = dict(AI_MAX_CONCURRENCY_PER_USER=1, AI_QUEUE_TIMEOUT=0.05)
+        with self.settings(**settings), mock.patch.object(ai, 'get_model', return_value=FakeModel('ok', delay=0.3)):
+            responses = await asyncio.gather(
+                self.ask('/api/auth/ai/cooking-coach/', {'question': 'one'}),
+                self.ask('/api/auth/ai/cooking-coach/', {'question': 'two'}),
+            )
+        self.assertEqual(sorted(r.status_code for r in responses), [200, 429])
+        self.assertEqual(ai.limiter.in_flight(), 0)
+
+    async def test_repeated_inputs_are_answered_from_cache(self):
+        model = FakeModel('{"trending_recipes": []}')
+        with mock.patch.object(ai, 'get_model', return_value=model):
+            first = await self.ask('/api/auth/ai/trending-recipes/', {'category': 'Soup', 'dietary': 'vegan'})
+            second = await self.ask('/api/auth/ai/trending-recipes/', {'dietary': ' VEGAN ', 'category': 'soup'})
+            other = await self.ask('/api/auth/ai/trending-recipes/', {'category': 'salad'})
+        self.assertEqual([r.json()['cache_status'] for r in (first, second, other)], ['miss', 'hit', 'miss'])
+        self.assertEqual(second.json()['filters_used']['dietary'], ' VEGAN ')
+        self.assertEqual(model.calls, 2)
+        stats = ai_cache.responses.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 2, 2))
+        self.assertEqual(stats['bytes'], 2 * len(model.text))
+
+        with self.settings(AI_CACHE_TTLS={'trending': 0}), mock.patch.object(ai, 'get_model', return_value=model):
+            response = await self.ask('/api/auth/ai/trending-recipes/', {'category': 'soup'})
+        self.assertEqual(response.json()['cache_status'], 'bypass')
+
+
+    async def read_events(self, response):
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        parsed = []
+        for block in filter(None, body.split('\n\n')):
+            event, data = block.split('\n')
+            parsed.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return parsed
+
+    async def test_coach_streams_chunks_then_timing(self):
+        model = FakeModel(chunks=['Lower ', 'the heat.'])
+        with mock.patch.object(ai, 'get_model', return_value=model):
+            streamed = await self.read_events(
+                await self.ask('/api/auth/ai/cooking-coach/?stream=1', {'question': 'It burns'})
+            )
+            replayed = await self.read_events(
+                await self.ask('/api/auth/ai/cooking-coach/', {'question': 'it  burns', 'stream': True})
+            )
+        self.assertEqual([event for event, _ in streamed], ['chunk', 'chunk', 'done'])
+        self.assertEqual(''.join(data['text'] for event, data in streamed if event == 'chunk'), 'Lower the heat.')
+        done = streamed[-1][1]
+        self.assertEqual((done['cache_status'], done['timing']['chunks']), ('miss', 2))
+        self.assertIsNotNone(done['timing']['first_chunk_ms'])
+        self.assertEqual(replayed[0], ('chunk', {'text': 'Lower the heat.'}))
+        self.assertEqual(replayed[-1][1]['cache_status'], 'hit')
+        self.assertEqual(model.calls, 1)
+
+    async def test_guide_emits_sections_as_they_complete(self):
+        chunks = ['```json\n{"steps": ["chop", "fry"],', ' "tips": {"heat": "keep it }"}', ', "serves": 2}\n```']
+        with mock.patch.object(ai, 'get_model', return_value=FakeModel(chunks=chunks)):
+            events_ = await self.read_events(await self.ask(
+                '/api/auth/ai/recipe-guide/?stream=1', {'recipe_title': 'Rice', 'recipe_instructions': 'Cook'},
+            ))
+        self.assertEqual(
+            [(event, data.get('key')) for event, data in events_],
+            [('chunk', None), ('section', 'steps'), ('chunk', None), ('section', 'tips'),
+             ('chunk', None), ('section', 'serves'), ('done', None)],
+        )
+        self.assertEqual(
+            events_[-1][1]['guided_instructions'],
+            {'steps': ['chop', 'fry'], 'tips': {'heat': 'keep it }'}, 'serves': 2},
+        )
+
+    async def test_stream_errors(self):
+        with self.settings(AI_TIMEOUT=0.01), mock.patch.object(ai, 'get_model', return_value=FakeModel('x', delay=1)):
+            response = await self.ask('/api/auth/ai/cooking-coach/?stream=1', {'question': 'q'})
+        self.assertEqual(response.status_code, 504)
+        response = await sync_to_async(self.client.post)(
+            '/api/auth/ai/cooking-coach/?stream=1', {'question': 'q'}, headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 501)
+
+    async def test_identical_requests_share_one_call(self):
+        flights = singleflight.SingleFlight()
+        model = FakeModel('{"steps": []}', delay=0.1)
+        payload = {'recipe_title': 'Ramen', 'recipe_instructions': 'Boil'}
+        with mock.patch.object(singleflight, 'flights', flights), mock.patch.object(ai, 'get_model', return_value=model):
+            responses = await asyncio.gather(*[self.ask('/api/auth/ai/recipe-guide/', payload) for _ in range(3)])
+        self.assertEqual(sorted(r.json()['cache_status'] for r in responses), ['coalesced', 'coalesced', 'miss'])
+        self.assertEqual({r.json()['guided_instructions'] == {'steps': []} for r in responses}, {True})
+        self.assertEqual(model.calls, 1)
+        self.assertEqual((flights.stats()['coalesced_local'], flights.stats()['in_flight']), (2, 0))
+        self.assertFalse(await AIRequestLock.objects.filter(result__isnull=True).aexists())
+
+    async def test_followers_do_not_inherit_the_leaders_error(self):
+        flights = singleflight.SingleFlight()
+
+        async def leader():
+            await asyncio.sleep(0.05)
+            raise ai.AIBusy("You already have AI requests in progress; try again shortly.", status=429)
+
+        async def follower():
+            return 'answer'
+
+        results = await asyncio.gather(
+            flights.run('key', leader), flights.run('key', follower), return_exceptions=True,
+        )
+        self.assertIsInstance(results[0], ai.AIBusy)
+        self.assertEqual(results[1], ('answer', False))
+        self.assertEqual((flights.metrics['retries'], flights.in_flight()), (1, 0))
+        self.assertFalse(await AIRequestLock.objects.aexists())
+
+    async def test_waits_for_a_leader_in_another_process(self):
+        flights = singleflight.SingleFlight()
+        payload = {'recipe_title': 'Ramen', 'recipe_instructions': 'Boil'}
+        key = ai_cache.make_key('recipe_guide', payload)
+        model = FakeModel('{"from": "here"}')
+
+        async def other_process(result):
+            await asyncio.sleep(0.05)
+            if result is None:
+                await sync_to_async(singleflight.release)(key)
+            else:
+                await sync_to_async(singleflight.publish)(key, result)
+
+        with self.settings(AI_COALESCE_POLL=0.01), mock.patch.object(singleflight, 'flights', flights), \
+                mock.patch.object(ai, 'get_model', return_value=model):
+            await sync_to_async(singleflight.claim)(key, 60)
+            response, _ = await asyncio.gather(
+                self.ask('/api/auth/ai/recipe-guide/', payload), other_process('{"from": "there"}'),
+            )
+            self.assertEqual(response.json()['cache_status'], 'coalesced')
+            self.assertEqual(response.json()['guided_instructions'], {'from': 'there'})
+            self.assertEqual(model.calls, 0)
+
+            # the other leader gives up: this process makes the call itself
+            payload['recipe_instructions'] = 'Simmer'
+            key = ai_cache.make_key('recipe_guide', payload)
+            await sync_to_async(singleflight.claim)(key, 60)
+            response, _ = await asyncio.gather(self.ask('/api/auth/ai/recipe-guide/', payload), other_process(None))
+            self.assertEqual(response.json()['guided_instructions'], {'from': 'here'})
+        self.assertEqual((flights.metrics['coalesced_remote'], flights.metrics['fallbacks']), (1, 1))
+
+class AIResponseCacheTests(TestCase):
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = ai_cache.AIResponseCache()
+        with self.settings(AI_CACHE_MAX_ENTRIES=2, AI_CACHE_MAX_BYTES=10):
+            cache.put('a', 'aaa', 60, 1.0)
+            cache.put('b', 'bbb', 60, 1.0)
+            self.assertEqual(cache.get('a'), 'aaa')  # b is now least recently used
+            cache.put('c', 'ccc', 60, 1.0)
+            self.assertIsNone(cache.get('b'))
+            cache.put('d', 'dddddddd', 60, 1.0)  # over the byte budget: a and c go
+            self.assertIsNone(cache.get('a'))
+            cache.put('e', 'x' * 11, 60, 1.0)  # larger than the whole cache: not stored
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes'], stats['evictions']), (1, 8, 3))
+        self.assertEqual(stats['latency_saved'], 1.0)
+
+    def test_expired_entries_miss(self):
+        cache = ai_cache.AIResponseCache()
+        cache.put('a', 'text', 60, 2.0)
+        with mock.patch('recipe_app.ai_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_keys_ignore_case_spacing_and_order(self):
+        self.assertEqual(
+            ai_cache.make_key('guide', {'title': 'Pad  Thai', 'steps': 'Boil\nnoodles'}),
+            ai_cache.make_key('guide', {'steps': 'boil noodles ', 'title': 'pad thai'}),
+        )
+        self.assertNotEqual(ai_cache.make_key('guide', {'title': 'x'}), ai_cache.make_key('recipe', {'title': 'x'}))
+
+
+class LLMJsonTests(TestCase):
+    corpus = Path(__file__).resolve().parent / 'testdata' / 'llm_outputs'
+
+    def test_recorded_outputs(self):
+        for name, case in json.loads((self.corpus / 'expected.json').read_text()).items():
+            with self.subTest(name):
+                text = (self.corpus / name).read_text()
+                if case['data'] is None:
+                    with self.assertRaises(llm_json.ExtractionError):
+                        llm_json.parse(text, case['endpoint'])
+                else:
+                    self.assertEqual(llm_json.parse(text, case['endpoint']), case['data'])
+
+    def test_sections_survive_any_chunking(self):
+        text = 'Sure:\n```json\n{"a": "say \\"hi\\" }", "b": [1, 2,], "c": {"d": null}, "e": 3}\n```'
+        scanner = llm_json.SectionScanner()
+        emitted = [section for char in text for section in scanner.feed(char)]
+        self.assertEqual(emitted, [('a', 'say "hi" }'), ('b', [1, 2]), ('c', {'d': None}), ('e', 3)])
+        self.assertTrue(scanner.done)
+
+    def test_repair_closes_truncated_output(self):
+        self.assertEqual(llm_json.loads('{"steps": ["boil", "dra'), {'steps': ['boil', 'dra']})
+        self.assertEqual(llm_json.loads('{"tip": "use a \\'), {'tip': 'use a '})
+        self.assertEqual(llm_json.loads('{"done": True, "next":'), {'done': True, 'next': None})
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from .events import EventStreamView
 from recipe_app.views import (
     RecipeViewSet,
     UserRecipeViewSet,
@@ -16,8 +17,15 @@ from recipe_app.views import (
     FollowersListView,
     DirectShareView,
     UserNotificationsView,
+    UnreadNotificationCountView,
+    MarkNotificationsReadView,
+    EmailPreferenceView,
+    UserProfileView,
+    PublicProfileView,
     SharedRecipesView,
     MarkSharedAsReadView,
+    CacheStatsView,
+    AICacheStatsView,
    # Keep existing
     ai_generate_structured_recipe,
     
@@ -42,12 +50,20 @@ urlpatterns = [
     # Categories
     path('categories/', CategoryListView.as_view(), name='categories-list'),
     path('categories/<int:category_id>/recipes/', CategoryRecipesView.as_view(), name='category-recipes'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
      path('feed/', FeedView.as_view(), name='feed'),
+     path('events/', EventStreamView.as_view(), name='events'),
      # Add these to your urls.py
      path('followers/', FollowersListView.as_view(), name='followers-list'),
      path('recipes/<int:recipe_id>/direct_share/', DirectShareView.as_view(), name='direct-share'),
      path('notifications/', UserNotificationsView.as_view(), name='user-notifications'),
      path('notifications/<int:share_id>/read/', UserNotificationsView.as_view(), name='mark-notification-read'),
+     path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notifications-unread-count'),
+     path('notifications/mark-read/', MarkNotificationsReadView.as_view(), name='notifications-mark-read'),
+     path('email-preferences/', EmailPreferenceView.as_view(), name='email-preferences'),
+     path('profile/', UserProfileView.as_view(), name='user-profile'),
+     path('users/profiles/', PublicProfileView.as_view(), name='user-profiles'),
+     path('users/<int:user_id>/profile/', PublicProfileView.as_view(), name='public-profile'),
      # Add to urls.py
     path('shared-recipes/', SharedRecipesView.as_view(), name='shared-recipes'),
     path('shared-recipes/<int:share_id>/read/', MarkSharedAsReadView.as_view(), name='mark-shared-read'),
@@ -56,4 +72,5 @@ urlpatterns = [
     path('ai/trending-recipes/', views.ai_trending_recipes, name='ai_trending_recipes'),
     path('ai/cooking-coach/', views.ai_cooking_coach, name='ai_cooking_coach'),
     path('ai/recipe-guide/', views.ai_recipe_guide, name='ai_recipe_guide'), 
+    path('ai/cache-stats/', AICacheStatsView.as_view(), name='ai-cache-stats'),
 ]
@@ -1,11 +1,7 @@
-from django.core.mail import send_mail
-from django.conf import settings
-
-def send_new_recipe_email(recipe, recipients):
+def new_recipe_email(recipe):
     """
-    Send email notification about new recipe.
-    :param recipe: Recipe instance
-    :param recipients: List of email addresses
+    Subject and body of the new-recipe notification, rendered once per
+    recipe and sent to each recipient separately by recipe_app.outbox.
     """
     subject = f"New Recipe: {recipe.title}"
     message = f"""
@@ -20,10 +16,4 @@ Check it out in our app!
 
 - Recipe Platform Team
 """
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        recipients,
-        fail_silently=False,
-    )
+    return subject, message
@@ -3,44 +3,48 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from recipe_app.models import *
 from recipe_app.serializers import *
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny, IsAuthenticated
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
 from django.shortcuts import get_object_or_404
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.parsers import MultiPartParser, FormParser,JSONParser
 from datetime import datetime
-import google.generativeai as genai
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
-import json
-import re
-from .utils import send_new_recipe_email
+from .search import RecipeSearchFilter
+from .ingredients import normalize_term, rank_by_pantry
+from .pagination import CreatedAtCursorPagination, LinkHeaderCursorPagination, RankedPagination, SharedAtCursorPagination
+from .cache import cached_response
+from .conditional import conditional_get
+from django.db.models import Count, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from . import cache as response_cache
+from . import ai, ai_cache, events, feed, follows, llm_json, outbox, profiles, singleflight
+from .ai import ai_view
+from django.db import transaction
 from django.http import JsonResponse
 
 
 
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
 def home(request):
     return JsonResponse({"message": "API is running"})
     
     
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def ai_generate_structured_recipe(request):
+@ai_view(require_auth=False)
+async def ai_generate_structured_recipe(request, data, user_key):
     """
     Generate recipe with structured JSON data for form auto-fill
     """
     try:
-        description = request.data.get('description', '').strip()
+        description = data.get('description', '').strip()
         
         if not description:
-            return Response({"error": "Please provide a recipe description."}, 
+            return JsonResponse({"error": "Please provide a recipe description."}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
         # Enhanced prompt for structured data
@@ -64,62 +68,44 @@ def ai_generate_structured_recipe(request):
         """
 
         try:
-            # Use a valid Gemini model
-            model = genai.GenerativeModel("models/gemini-2.5-flash")
-            response = model.generate_content(prompt)
-            
-            # Extract JSON from response
-            text = response.text.strip()
+            text, cache_status = await ai.generate_cached(
+                'structured_recipe', {'description': description}, prompt, user_key,
+            )
+            text = text.strip()
             
-            # Try to parse JSON from the response
             try:
-                # Find JSON pattern in the response
-                json_match = re.search(r'\{.*\}', text, re.DOTALL)
-                if json_match:
-                    recipe_data = json.loads(json_match.group())
-                else:
-                    # Fallback: return as raw text but structured
-                    recipe_data = {
-                        "title": f"AI Recipe: {description}",
-                        "description": "AI-generated recipe",
-                        "ingredients": ["Check the raw response for details"],
-                        "instructions": ["Check the raw response for steps"],
-                        "prep_time": 15,
-                        "cook_time": 30,
-                        "servings": 4,
-                        "difficulty": "Medium",
-                        "raw_response": text
-                    }
-                
-                return Response({
-                    "success": True,
-                    "recipe_data": recipe_data
-                })
-                
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return structured error
-                return Response({
-                    "success": True,
-                    "recipe_data": {
-                        "title": f"AI Recipe: {description}",
-                        "description": text[:200] + "..." if len(text) > 200 else text,
-                        "ingredients": ["Please manually extract from the description"],
-                        "instructions": ["Please manually extract from the description"],
-                        "prep_time": 15,
-                        "cook_time": 30,
-                        "servings": 4,
-                        "difficulty": "Medium",
-                        "raw_response": text
-                    }
-                })
-                
+                recipe_data = llm_json.parse(text, 'structured_recipe')
+            except llm_json.ExtractionError:
+                # No usable JSON: return the raw text in the form's shape
+                recipe_data = {
+                    "title": f"AI Recipe: {description}",
+                    "description": text[:200] + "..." if len(text) > 200 else text,
+                    "ingredients": ["Please manually extract from the description"],
+                    "instructions": ["Please manually extract from the description"],
+                    "prep_time": 15,
+                    "cook_time": 30,
+                    "servings": 4,
+                    "difficulty": "Medium",
+                    "raw_response": text
+                }
+
+            return JsonResponse({
+                "success": True,
+                "recipe_data": recipe_data,
+                "cache_status": cache_status
+            })
+
+        except ai.AIError:
+            raise
         except Exception as gen_error:
-            return Response({
+            return JsonResponse({
                 "error": f"AI generation failed: {str(gen_error)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    except ai.AIError:
+        raise
     except Exception as e:
-        return Response({
+        return JsonResponse({
             "error": f"Internal server error: {str(e)}"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -141,18 +127,67 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         return False
 
 
+def wants_full_recipe(request):
+    """Collections return compact cards unless the client asks for ?view=full."""
+    return request.query_params.get('view') == 'full'
+
+
+def comments_preview_size(request):
+    """Number of newest comments embedded in full recipe payloads (?comments_preview=0..10)."""
+    try:
+        return max(0, min(int(request.query_params.get('comments_preview', 3)), 10))
+    except ValueError:
+        return 3
+
+
+def recipe_detail_validators(view, request, pk=None, **kwargs):
+    # recipe:<pk> also moves with its related list and renamed authors, which updated_at misses
+    return (pk, *response_cache.get_versions([f'recipe:{pk}'])), None
+
+
+def recipe_list_validators(view, request, *args, **kwargs):
+    # the query string (filters, cursor) is part of the tag, so one version covers every page
+    return tuple(response_cache.get_versions(['recipes'])), None
+
+
+def category_list_validators(view, request, *args, **kwargs):
+    stats = Category.objects.aggregate(last=Max('updated_at'), total=Count('id'))
+    last = stats['last']
+    return (last.isoformat() if last else '', stats['total']), last
+
+
 # ---------- Recipe ViewSet ----------
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by('-created_at')
     serializer_class = RecipeSerializers
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
-    search_fields = ['title', 'description', 'ingredients']
-    filterset_fields = ['categories__id','featured']
-    # pagination_class = StandardResultsSetPagination
+    filter_backends = [RecipeSearchFilter, DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {'categories__id': ['exact'], 'featured': ['exact'], 'rating_avg': ['gte', 'lte']}
+    pagination_class = CreatedAtCursorPagination
     parser_classes = [MultiPartParser, FormParser, JSONParser] 
-    ordering_fields = ['created_at', 'prep_time', 'cook_time', 'difficulty']
+    ordering_fields = ['created_at', 'prep_time', 'cook_time', 'difficulty', 'rating_avg']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list' and not wants_full_recipe(self.request):
+            queryset = queryset.with_card()
+        elif self.action in ('list', 'retrieve'):
+            queryset = queryset.with_detail(comments_preview_size(self.request))
+        return queryset
+
+    @property
+    def paginator(self):
+        # ranked results keep their relevance order, so they can't be keyset-paginated
+        if not hasattr(self, '_paginator') and (self.action == 'cook_with' or self.request.query_params.get('search')):
+            self._paginator = RankedPagination()
+        return super().paginator
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'featured') and not wants_full_recipe(self.request):
+            return RecipeCardSerializer
+        return super().get_serializer_class()
+
+    @transaction.atomic
     def perform_create(self, serializer):
         recipe = serializer.save(author=self.request.user)
         nutrient_data = {
@@ -164,22 +199,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if any(nutrient_data.values()):
             Nutrient.objects.create(recipes_nutrient=recipe, **nutrient_data)
             
-        recipients = [recipe.author.email] 
-        
-        followers = Follow.objects.filter(following=recipe.author)
-        followers_emails = [f.follower.email for f in followers if f.follower.email]
-        recipients += followers_emails
-        
-        if recipients:
-         send_new_recipe_email(recipe, recipients)
+        # queued with the recipe; the send_outbox worker delivers after commit
+        outbox.enqueue_new_recipe(recipe)
          
 
+    @conditional_get(recipe_list_validators)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(recipe_detail_validators)
+    @cached_response('recipe-detail', lambda request, pk=None, **kwargs: [f'recipe:{pk}'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=['get'])
+    @cached_response('featured-recipes', ['recipes'])
     def featured(self, request):
-        featured_recipes = Recipe.objects.filter(featured=True)
+        featured_recipes = Recipe.objects.filter(featured=True).order_by('-created_at')
+        if wants_full_recipe(request):
+            featured_recipes = featured_recipes.with_detail(comments_preview_size(request))
+        else:
+            featured_recipes = featured_recipes.with_card()
         serializer = self.get_serializer(featured_recipes, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get', 'post'], permission_classes=[AllowAny])
+    def cook_with(self, request):
+        """
+        "Cook with what I have": pantry items come as ?items=a,b or {"items": [...]},
+        results are ranked by the number of ingredients still missing.
+        """
+        if request.method == 'POST':
+            items = request.data.get('items', [])
+        else:
+            items = request.query_params.get('items', '').split(',')
+        if isinstance(items, str):
+            items = items.split(',')
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            return Response({"detail": "Pantry items must be a list of strings."}, status=status.HTTP_400_BAD_REQUEST)
+        pantry = {term for term in (normalize_term(item) for item in items) if term}
+        if not pantry:
+            return Response({"detail": "Please list at least one ingredient."}, status=status.HTTP_400_BAD_REQUEST)
+
+        recipes = rank_by_pantry(Recipe.objects.all(), pantry).with_card()
+        page = self.paginate_queryset(recipes)
+        serializer = PantryRecipeSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def comments(self, request, pk=None):
+        """
+        Paginated comment threads, newest first: one query for the page of
+        top-level comments (with annotated reply counts), one for their replies.
+        """
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        threads = Comment.objects.threads().filter(recipe_id=pk)
+        # not the viewset's paginator: ?search= and ?ordering= are recipe-list parameters
+        paginator = CreatedAtCursorPagination()
+        page = paginator.paginate_queryset(threads, request)
+
+        replies = {}
+        reply_rows = Comment.objects.filter(parent_id__in=[c.id for c in page]).select_related('user')
+        for reply in reply_rows.order_by('created_at', 'id'):
+            replies.setdefault(reply.parent_id, []).append(reply)
+        for comment in page:
+            comment.thread_replies = replies.get(comment.id, [])
+
+        serializer = CommentThreadSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def add_comment(self, request, pk=None):
         recipe = self.get_object()
@@ -248,7 +336,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def share_to_followers(self, request, pk=None):
      recipe = self.get_object()
-     SharedRecipe.objects.create(sender=request.user, recipe=recipe)
+     shared = SharedRecipe.objects.create(sender=request.user, recipe=recipe)
+     feed.fan_out_share(shared)
      return Response({"detail": f"Recipe '{recipe.title}' shared to your followers!"}, status=status.HTTP_201_CREATED)
 
 
@@ -305,6 +394,8 @@ class CategoryListView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [AllowAny]
 
+    @conditional_get(category_list_validators)
+    @cached_response('category-list', ['categories'])
     def get(self, request):
         categories = Category.objects.all()
         serializer = CategorySerializer(categories, many=True)
@@ -314,57 +405,113 @@ class CategoryListView(APIView):
 class CategoryRecipesView(APIView):
     permission_classes = [AllowAny]
 
+    @cached_response('category-recipes', ['recipes'])
     def get(self, request, category_id):
         category = get_object_or_404(Category, id=category_id)
-        recipes = category.recipes.all()
-        serializer = RecipeSerializers(recipes, many=True, context={'request': request})
+        if wants_full_recipe(request):
+            recipes = category.recipes.with_detail(comments_preview_size(request))
+            serializer = RecipeSerializers(recipes, many=True, context={'request': request})
+        else:
+            serializer = RecipeCardSerializer(category.recipes.with_card(), many=True, context={'request': request})
         return Response(serializer.data)
 
 
-# # ---------- User Profile ----------
-# class UserProfileView(APIView):
-#     permission_classes = [IsAuthenticatedOrReadOnly]
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+class AICacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(dict(ai_cache.responses.stats(), single_flight=singleflight.flights.stats()))
+
+
+# ---------- User Profile ----------
+class UserProfileView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = profiles.with_profile_stats().get(pk=request.user.pk)
+        serializer = UserSerializer(user)
+        return Response(serializer.data)
+
+
+class PublicProfileView(APIView):
+    """
+    Public profile stats: /users/<id>/profile/ for one user, or
+    /users/profiles/?ids=1,2,3 (up to 100) for a batch of author cards.
+    Either way it is a single query.
+    """
+    permission_classes = [AllowAny]
+    max_batch = 100
+
+    def get(self, request, user_id=None):
+        if user_id is not None:
+            user = get_object_or_404(profiles.with_profile_stats(), pk=user_id)
+            return Response(PublicProfileSerializer(user).data)
 
-#     def get(self, request):
-#         serializer = UserSerializer(request.user)
-#         return Response(serializer.data)
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > self.max_batch:
+            return Response({"detail": f"Pass between 1 and {self.max_batch} ids."}, status=status.HTTP_400_BAD_REQUEST)
+        found = profiles.profiles_for(ids)
+        users = [found[user_id] for user_id in dict.fromkeys(ids) if user_id in found]
+        return Response(PublicProfileSerializer(users, many=True).data)
 
 
-#     
 # ---------- User Recipes (CRUD) ----------
 
 
 class UserRecipeViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeSerializers
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
     parser_classes = [MultiPartParser, FormParser] 
    
 
     def get_queryset(self):
         # Only recipes created by the logged-in user
-        return Recipe.objects.filter(author=self.request.user).order_by('-created_at')
+        queryset = Recipe.objects.filter(author=self.request.user).order_by('-created_at')
+        if self.action == 'list' and not wants_full_recipe(self.request):
+            return queryset.with_card()
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_detail(comments_preview_size(self.request))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not wants_full_recipe(self.request):
+            return RecipeCardSerializer
+        return super().get_serializer_class()
 
 
 # ---------- User Comments (CRUD) ----------
 class UserCommentViewSet(viewsets.ModelViewSet):
     serializer_class = MyCommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
    
 
     def get_queryset(self):
         # Only comments by the logged-in user
-        return Comment.objects.filter(user=self.request.user).order_by('-created_at')
+        return Comment.objects.filter(user=self.request.user).select_related('recipe').order_by('-created_at', '-id')
 
 
 # ---------- User Ratings (CRUD) ----------
 class UserRatingViewSet(viewsets.ModelViewSet):
     serializer_class = MyRatingSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
     
 
     def get_queryset(self):
         # Only ratings by the logged-in user
-        return Rating.objects.filter(user=self.request.user).order_by('-created_at')
+        return Rating.objects.filter(user=self.request.user).select_related('recipe').order_by('-created_at', '-id')
 
 
 # ---------- User Favorites (View + Delete) ----------
@@ -375,10 +522,11 @@ class UserFavoriteViewSet(viewsets.ModelViewSet):
     """
     serializer_class = MyFavoriteSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
     
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user).order_by('-id')
+        return Favorite.objects.filter(user=self.request.user).select_related('recipe__author').order_by('-created_at', '-id')
     
     
     
@@ -393,90 +541,146 @@ class FollowViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Follow.objects.filter(follower=self.request.user)
 
+    def perform_create(self, serializer):
+        # same path as the follow action: counters, suggestions and the feed backfill
+        following = serializer.validated_data['following']
+        follows.follow(self.request.user, following.pk)
+        serializer.instance = self.get_queryset().get(following=following)
+
+    def perform_destroy(self, instance):
+        follows.unfollow(self.request.user, instance.following_id)
+
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def follow(self, request):
-        user_id = request.data.get('user_id')
-        if not user_id:
+        try:
+            user_id = int(request.data.get('user_id'))
+        except (TypeError, ValueError):
             return Response({"detail": "User ID required"}, status=status.HTTP_400_BAD_REQUEST)
+        if user_id == request.user.pk:
+            return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            target_user = User.objects.get(id=user_id)
-            if target_user == request.user:
-                return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
-
-            follow, created = Follow.objects.get_or_create(follower=request.user, following=target_user)
-            if created:
-                return Response({"detail": f"You are now following {target_user.username}."}, status=status.HTTP_201_CREATED)
-            return Response({"detail": "Already following this user."}, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
+        outcome, target_user = follows.follow(request.user, user_id)
+        if outcome == follows.MISSING:
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+        if outcome == follows.CREATED:
+            return Response({"detail": f"You are now following {target_user.username}."}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "Already following this user."}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticatedOrReadOnly])
     def unfollow(self, request):
-        user_id = request.data.get('user_id')
         try:
-            target_user = User.objects.get(id=user_id)
-            follow = Follow.objects.get(follower=request.user, following=target_user)
-            follow.delete()
-            return Response({"detail": f"Unfollowed {target_user.username}."}, status=status.HTTP_200_OK)
-        except (User.DoesNotExist, Follow.DoesNotExist):
+            user_id = int(request.data.get('user_id'))
+        except (TypeError, ValueError):
+            user_id = None
+        if user_id is None or not follows.unfollow(request.user, user_id):
             return Response({"detail": "Follow relationship not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"detail": "Unfollowed."}, status=status.HTTP_200_OK)
+
+    def listed_user_id(self, request):
+        """?user_id= (default: you) as an existing user's id; 400 if missing or not a number, 404 if unknown."""
+        user_id = request.query_params.get('user_id') or request.user.pk
+        if user_id is None:
+            raise ParseError("User ID required")
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            raise ParseError("User ID must be a number.")
+        if not User.objects.filter(pk=user_id).exists():
+            raise NotFound("User not found.")
+        return user_id
+
+    def paginated(self, request, queryset, serializer_class):
+        paginator = LinkHeaderCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(serializer_class(page, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def followers(self, request):
+        """Who follows ?user_id= (default: you), newest first."""
+        return self.paginated(request, follows.followers_of(self.listed_user_id(request)), FollowerUserSerializer)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def following(self, request):
+        """Who ?user_id= (default: you) follows, newest first."""
+        return self.paginated(request, follows.following_of(self.listed_user_id(request)), FollowingUserSerializer)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def counts(self, request):
+        stats = UserStats.for_user(self.listed_user_id(request))
+        return Response({
+            "user_id": stats.user_id,
+            "followers_count": stats.followers_count,
+            "following_count": stats.following_count,
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def suggestions(self, request):
+        """People followed by the people you follow, most mutual connections first."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response(follows.suggestions_for(request.user.pk, limit=limit))
 
 
 class FeedView(APIView):
+    """
+    Home feed read from the materialized FeedEntry table. Pages with
+    ?cursor=<opaque>&limit=N; the next page URL is in the Link header so the
+    body stays a plain list. ?mode=merged builds the page straight from
+    recipes and shares in one UNION query, with the same cursor format.
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request):
-        # 1️⃣ Get IDs of users the current user is following
-        following_user_ids = request.user.following.values_list('following', flat=True)
-
-        # 2️⃣ Fetch recipes created by followed users
-        recipes = Recipe.objects.filter(author__in=following_user_ids)
-        recipe_data = FeedRecipeSerializer(recipes, many=True, context={'request': request}).data
-
-        # Track IDs to avoid duplicates
-        existing_recipe_ids = {r['id'] for r in recipe_data}
-
-        # 3️⃣ Fetch recipes shared by followed users, exclude duplicates
-        shared_recipes = SharedRecipe.objects.filter(sender__in=following_user_ids)
-        shared_data = [
-            {
-                'id': f'shared-{s.id}',  # unique ID for React keys
-                'type': 'shared',
-                'shared_by': s.sender.username,
-                'recipe_id': s.recipe.id,
-                'title': s.recipe.title,
-                'image': s.recipe.image.url if s.recipe.image else None,
-                'author': s.recipe.author.username if s.recipe.author else '—',
-                'created_at': s.shared_at
-            }
-            for s in shared_recipes
-            if s.recipe.id not in existing_recipe_ids  # ✅ avoid duplicate recipes
-        ]
-
-        # 4️⃣ Helper function to parse dates for sorting
-        def parse_date(item):
-            date_value = item.get('created_at')
-            if isinstance(date_value, str):
-                return datetime.fromisoformat(date_value.replace('Z', '+00:00'))
-            return date_value
-
-        # 5️⃣ Combine authored + shared recipes and sort by newest
-        combined_feed = sorted(recipe_data + shared_data, key=parse_date, reverse=True)
-
-        return Response(combined_feed)
+        try:
+            limit = min(max(int(request.query_params.get('limit', settings.FEED_PAGE_SIZE)), 1), 100)
+        except ValueError:
+            limit = settings.FEED_PAGE_SIZE
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                cursor = feed.decode_cursor(cursor)
+            except ValueError:
+                return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('mode') == 'merged':
+            return self.merged(request, cursor, limit)
+
+        items, next_cursor = feed.read_feed(request.user, cursor=cursor or None, limit=limit)
+        response = Response([feed.serialize_item(item, request) for item in items])
+        if next_cursor:
+            next_url = request.build_absolute_uri(f"{request.path}?limit={limit}&cursor={next_cursor}")
+            response['Link'] = f'<{next_url}>; rel="next"'
+        return response
+
+    def merged(self, request, cursor, limit):
+        rows, next_cursor = feed.merged_feed(request.user, cursor=cursor or None, limit=limit)
+        response = Response([feed.serialize_row(row, request) for row in rows])
+        if next_cursor:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?mode=merged&limit={limit}&cursor={next_cursor}"
+            )
+            response['Link'] = f'<{next_url}>; rel="next"'
+        return response
 
 
 
 # Add these views to your views.py
 class FollowersListView(APIView):
+    """
+    Users the current user follows (the share dialog's recipient list),
+    paged by LinkHeaderCursorPagination.
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get(self, request):
         # Get users that the current user is following
-        following_users = Follow.objects.filter(follower=request.user).select_related('following')
-        serializer = FollowerListSerializer(following_users, many=True)
-        return Response(serializer.data)
+        following_users = follows.following_of(request.user.pk)
+        paginator = LinkHeaderCursorPagination()
+        paginator.page_size = 100
+        page = paginator.paginate_queryset(following_users, request, view=self)
+        serializer = FollowerListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class DirectShareView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -490,123 +694,249 @@ class DirectShareView(APIView):
             return Response({"detail": "Please select at least one follower to share with."}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        shares_created = []
+        requested = []
+        invalid = []
         for receiver_id in receiver_ids:
             try:
-                receiver = User.objects.get(id=receiver_id)
-                # Check if user is actually following this receiver
-                if not Follow.objects.filter(follower=request.user, following=receiver).exists():
-                    continue
-                
-                share, created = DirectShare.objects.get_or_create(
-                    sender=request.user,
-                    receiver=receiver,
-                    recipe=recipe,
-                    defaults={'message': message}
-                )
-                if created:
-                    shares_created.append(share)
-            except User.DoesNotExist:
-                continue
-        
+                requested.append(int(receiver_id))
+            except (TypeError, ValueError):
+                invalid.append(receiver_id)
+
+        # Only users the sender follows can receive; one join resolves them all
+        valid_ids = set(
+            Follow.objects.filter(follower=request.user, following_id__in=requested)
+            .values_list('following_id', flat=True)
+        )
+        invalid += [receiver_id for receiver_id in dict.fromkeys(requested) if receiver_id not in valid_ids]
+        skipped = set(
+            DirectShare.objects.filter(sender=request.user, recipe=recipe, receiver_id__in=valid_ids)
+            .values_list('receiver_id', flat=True)
+        )
+        DirectShare.objects.bulk_create(
+            [
+                DirectShare(sender=request.user, receiver_id=receiver_id, recipe=recipe, message=message)
+                for receiver_id in valid_ids - skipped
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        shares_created = list(
+            DirectShare.objects.filter(sender=request.user, recipe=recipe, receiver_id__in=valid_ids - skipped)
+            .select_related('sender', 'receiver', 'recipe')
+            .order_by('id')
+        )
+        # bulk_create skips post_save, so bump the receivers' unread counters and push here
+        UserStats.apply_unread_delta([share.receiver_id for share in shares_created], 1)
+        for share in shares_created:
+            events.notify([share.receiver_id], 'share', events.share_payload(share))
+        summary = {
+            "created": [share.receiver_id for share in shares_created],
+            "skipped": sorted(skipped),
+            "invalid": invalid,
+        }
+
         if shares_created:
             serializer = DirectShareSerializer(shares_created, many=True)
             return Response({
                 "detail": f"Recipe shared with {len(shares_created)} follower(s) successfully!",
-                "shares": serializer.data
+                "shares": serializer.data,
+                **summary,
             }, status=status.HTTP_201_CREATED)
         else:
-            return Response({"detail": "No valid followers selected or recipe already shared."}, 
+            return Response({"detail": "No valid followers selected or recipe already shared.", **summary},
                           status=status.HTTP_400_BAD_REQUEST)
             
             
 
 class UserNotificationsView(APIView):
+    """
+    Unread shares for the current user, newest first, paged by
+    SharedAtCursorPagination (plain list body, next page in the Link header).
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = SharedAtCursorPagination
     
     def get(self, request):
         # Get unread shares for the current user
-        unread_shares = DirectShare.objects.filter(receiver=request.user, is_read=False)
-        serializer = DirectShareSerializer(unread_shares, many=True)
-        return Response(serializer.data)
+        unread_shares = (
+            DirectShare.objects.filter(receiver=request.user, is_read=False)
+            .select_related('sender', 'receiver', 'recipe')
+        )
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(unread_shares, request, view=self)
+        serializer = DirectShareSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     def patch(self, request, share_id):
         # Mark a share as read
-        share = get_object_or_404(DirectShare, id=share_id, receiver=request.user)
-        share.is_read = True
-        share.save()
+        if not mark_shares_read(request.user, ids=[share_id]):
+            get_object_or_404(DirectShare, id=share_id, receiver=request.user)
         return Response({"detail": "Notification marked as read."})
 
+
+def mark_shares_read(user, ids=None, sender_id=None):
+    """Mark the user's unread shares read in one UPDATE; returns how many changed."""
+    shares = DirectShare.objects.filter(receiver=user, is_read=False)
+    if ids is not None:
+        shares = shares.filter(id__in=ids)
+    if sender_id is not None:
+        shares = shares.filter(sender_id=sender_id)
+    updated = shares.update(is_read=True)
+    UserStats.apply_unread_delta([user.id], -updated)
+    return updated
+
+
+class UnreadNotificationCountView(APIView):
+    """Badge count from the maintained counter: one primary-key lookup."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"unread_count": UserStats.unread_for(request.user.id)})
+
+
+class MarkNotificationsReadView(APIView):
+    """
+    Bulk mark-as-read: {"ids": [...]}, {"sender_id": n} or {"all": true}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        sender_id = request.data.get('sender_id')
+        if ids is None and sender_id is None and not request.data.get('all'):
+            return Response({"detail": "Provide ids, sender_id or all."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = None if ids is None else [int(share_id) for share_id in ids]
+            sender_id = None if sender_id is None else int(sender_id)
+        except (TypeError, ValueError):
+            return Response({"detail": "ids and sender_id must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = mark_shares_read(request.user, ids=ids, sender_id=sender_id)
+        return Response({"updated": updated, "unread_count": UserStats.unread_for(request.user.id)})
+
+class EmailPreferenceView(APIView):
+    """New-recipe emails as they happen (default) or as a daily/weekly digest."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        preference = EmailPreference.objects.filter(user=request.user).first() or EmailPreference(user=request.user)
+        return Response(EmailPreferenceSerializer(preference).data)
+
+    def put(self, request):
+        preference = EmailPreference.objects.filter(user=request.user).first() or EmailPreference(user=request.user)
+        serializer = EmailPreferenceSerializer(preference, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    patch = put
+
 # Update your urls.py to include these new endpoints
 
 
 
 # Add this to your views.py
 class SharedRecipesView(APIView):
+    """
+    "Shared with me" inbox grouped by sharer, most recent sharer first.
+    Totals, unread counts and last-shared times come from one grouped query
+    and each sharer's `recent` latest shares from one windowed query.
+    Pages over sharers with ?page=&page_size=; the next page URL is in the
+    Link header so the body stays a plain list.
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
-    
+    page_size = 20
+    max_page_size = 100
+    recent_per_sharer = 10
+
+    def int_param(self, request, name, default, upper):
+        try:
+            return min(max(int(request.query_params.get(name, default)), 1), upper)
+        except ValueError:
+            return default
+
     def get(self, request):
-        # Get all users who shared recipes with current user
-        sharers = User.objects.filter(
-            sent_shares__receiver=request.user
-        ).distinct()
-        
-        sharer_data = []
-        for sharer in sharers:
-            # Get shared recipes from this user
-            shared_recipes = DirectShare.objects.filter(
-                sender=sharer,
-                receiver=request.user
-            ).select_related('recipe')
-            
-            sharer_data.append({
-                'sharer_id': sharer.id,
-                'sharer_username': sharer.username,
-                'sharer_email': sharer.email,
-                'total_shared': shared_recipes.count(),
-                'unread_count': shared_recipes.filter(is_read=False).count(),
-                'last_shared': shared_recipes.order_by('-shared_at').first().shared_at if shared_recipes.exists() else None,
-                'shared_recipes': [
-                    {
-                        'share_id': share.id,
-                        'recipe_id': share.recipe.id,
-                        'recipe_title': share.recipe.title,
-                        'recipe_image': share.recipe.image.url if share.recipe.image else None,
-                        'recipe_description': share.recipe.description,
-                        'shared_at': share.shared_at,
-                        'is_read': share.is_read,
-                        'message': share.message
-                    }
-                    for share in shared_recipes
-                ]
+        page = self.int_param(request, 'page', 1, 10 ** 6)
+        page_size = self.int_param(request, 'page_size', self.page_size, self.max_page_size)
+        recent = self.int_param(request, 'recent', self.recent_per_sharer, self.max_page_size)
+
+        offset = (page - 1) * page_size
+        sharers = list(
+            DirectShare.objects.filter(receiver=request.user)
+            .values('sender_id', 'sender__username', 'sender__email')
+            .annotate(
+                total_shared=Count('id'),
+                unread_count=Count('id', filter=Q(is_read=False)),
+                last_shared=Max('shared_at'),
+            )
+            .order_by('-last_shared', 'sender_id')[offset:offset + page_size + 1]
+        )
+        has_next = len(sharers) > page_size
+        sharers = sharers[:page_size]
+
+        shares = (
+            DirectShare.objects.filter(receiver=request.user, sender_id__in=[row['sender_id'] for row in sharers])
+            .select_related('recipe')
+            .only('sender_id', 'shared_at', 'is_read', 'message',
+                  'recipe__id', 'recipe__title', 'recipe__image', 'recipe__description')
+            .annotate(rank=Window(RowNumber(), partition_by=F('sender_id'), order_by=[F('shared_at').desc(), F('id').desc()]))
+            .filter(rank__lte=recent)
+            .order_by('sender_id', 'rank')
+        )
+        by_sharer = {row['sender_id']: [] for row in sharers}
+        for share in shares:
+            by_sharer[share.sender_id].append({
+                'share_id': share.id,
+                'recipe_id': share.recipe.id,
+                'recipe_title': share.recipe.title,
+                'recipe_image': share.recipe.image.url if share.recipe.image else None,
+                'recipe_description': share.recipe.description,
+                'shared_at': share.shared_at,
+                'is_read': share.is_read,
+                'message': share.message
             })
-        
-        return Response(sharer_data)
+
+        response = Response([
+            {
+                'sharer_id': row['sender_id'],
+                'sharer_username': row['sender__username'],
+                'sharer_email': row['sender__email'],
+                'total_shared': row['total_shared'],
+                'unread_count': row['unread_count'],
+                'last_shared': row['last_shared'],
+                'shared_recipes': by_sharer[row['sender_id']],
+            }
+            for row in sharers
+        ])
+        if has_next:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?page={page + 1}&page_size={page_size}&recent={recent}"
+            )
+            response['Link'] = f'<{next_url}>; rel="next"'
+        return response
 
 class MarkSharedAsReadView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def patch(self, request, share_id):
-        share = get_object_or_404(DirectShare, id=share_id, receiver=request.user)
-        share.is_read = True
-        share.save()
+        if not mark_shares_read(request.user, ids=[share_id]):
+            get_object_or_404(DirectShare, id=share_id, receiver=request.user)
         return Response({"detail": "Marked as read"})
     
     
     
 # ========== AI COOKING COACH & TRENDING RECIPES ==========
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticatedOrReadOnly])
-def ai_trending_recipes(request):
+@ai_view(require_auth=True)
+async def ai_trending_recipes(request, data, user_key):
     """
     Find trending recipes and provide context + guidance
     """
     try:
         # Get optional filters from user
-        category = request.data.get('category', '')
-        time_filter = request.data.get('time_filter', 'current')  # current, week, month
-        dietary_pref = request.data.get('dietary', '')
+        category = data.get('category', '')
+        time_filter = data.get('time_filter', 'current')  # current, week, month
+        dietary_pref = data.get('dietary', '')
         
         prompt = f"""
         Suggest 3-5 trending recipes that are popular right now.
@@ -636,15 +966,15 @@ def ai_trending_recipes(request):
         Make them practical, seasonal, and include why they're trending.
         """
 
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        text, cache_status = await ai.generate_cached(
+            'trending', {'category': category, 'time_filter': time_filter, 'dietary': dietary_pref}, prompt, user_key,
+        )
+        text = text.strip()
         
         # Parse JSON response
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            trending_data = json.loads(json_match.group())
-        else:
+        try:
+            trending_data = llm_json.parse(text, 'trending')
+        except llm_json.ExtractionError:
             trending_data = {
                 "trending_recipes": [
                     {
@@ -661,35 +991,37 @@ def ai_trending_recipes(request):
                 ]
             }
 
-        return Response({
+        return JsonResponse({
             "success": True,
             "trending_data": trending_data,
             "filters_used": {
                 "category": category,
                 "time_filter": time_filter,
                 "dietary": dietary_pref
-            }
+            },
+            "cache_status": cache_status
         })
         
+    except ai.AIError:
+        raise
     except Exception as e:
-        return Response({
+        return JsonResponse({
             "error": f"Failed to fetch trending recipes: {str(e)}"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticatedOrReadOnly])
-def ai_cooking_coach(request):
+@ai_view(require_auth=True)
+async def ai_cooking_coach(request, data, user_key):
     """
     Real-time cooking guidance and troubleshooting
     """
     try:
-        question = request.data.get('question', '').strip()
-        recipe_context = request.data.get('recipe_context', '')  # Optional: current recipe info
-        cooking_step = request.data.get('cooking_step', '')  # Optional: current step
+        question = data.get('question', '').strip()
+        recipe_context = data.get('recipe_context', '')  # Optional: current recipe info
+        cooking_step = data.get('cooking_step', '')  # Optional: current step
         
         if not question:
-            return Response({"error": "Please ask a cooking question."}, 
+            return JsonResponse({"error": "Please ask a cooking question."}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
         prompt = f"""
@@ -710,35 +1042,41 @@ def ai_cooking_coach(request):
         Format the response in a structured way that's easy to follow while cooking.
         """
 
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        params = {'question': question, 'recipe_context': recipe_context, 'cooking_step': cooking_step}
+        if ai.wants_stream(request, data):
+            answer = ai.AnswerStream('cooking_coach', params, prompt, user_key)
+            return await ai.sse_response(request, _coach_events(answer, question, recipe_context))
+
+        answer, cache_status = await ai.generate_cached('cooking_coach', params, prompt, user_key)
         
-        return Response({
+        return JsonResponse({
             "success": True,
             "question": question,
-            "answer": response.text,
+            "answer": answer,
             "recipe_context": recipe_context,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "cache_status": cache_status
         })
         
+    except ai.AIError:
+        raise
     except Exception as e:
-        return Response({
+        return JsonResponse({
             "error": f"Cooking coach unavailable: {str(e)}"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticatedOrReadOnly])
-def ai_recipe_guide(request):
+@ai_view(require_auth=True)
+async def ai_recipe_guide(request, data, user_key):
     """
     Get step-by-step guided cooking for specific recipes
     """
     try:
-        recipe_title = request.data.get('recipe_title', '').strip()
-        recipe_instructions = request.data.get('recipe_instructions', '').strip()
+        recipe_title = data.get('recipe_title', '').strip()
+        recipe_instructions = data.get('recipe_instructions', '').strip()
         
         if not recipe_title or not recipe_instructions:
-            return Response({"error": "Recipe title and instructions required."}, 
+            return JsonResponse({"error": "Recipe title and instructions required."}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
         prompt = f"""
@@ -767,27 +1105,68 @@ def ai_recipe_guide(request):
         Return as structured JSON that's easy to parse.
         """
 
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        
-        # Try to parse JSON, else return as text
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            guide_data = json.loads(json_match.group())
-        else:
-            guide_data = {
-                "enhanced_guide": text,
-                "recipe_title": recipe_title
-            }
+        params = {'recipe_title': recipe_title, 'recipe_instructions': recipe_instructions}
+        if ai.wants_stream(request, data):
+            answer = ai.AnswerStream('recipe_guide', params, prompt, user_key)
+            return await ai.sse_response(request, _guide_events(answer, recipe_title))
 
-        return Response({
+        text, cache_status = await ai.generate_cached('recipe_guide', params, prompt, user_key)
+
+        return JsonResponse({
             "success": True,
             "recipe_title": recipe_title,
-            "guided_instructions": guide_data
+            "guided_instructions": _guide_data(text.strip(), recipe_title),
+            "cache_status": cache_status
         })
         
+    except ai.AIError:
+        raise
     except Exception as e:
-        return Response({
+        return JsonResponse({
             "error": f"Failed to create recipe guide: {str(e)}"
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def _coach_events(answer, question, recipe_context):
+    """SSE for ?stream=1: a `chunk` event per piece of the answer, then `done`."""
+    async for chunk in answer:
+        yield ai.sse('chunk', {'text': chunk})
+    yield ai.sse('done', {
+        "success": True,
+        "question": question,
+        "recipe_context": recipe_context,
+        "timestamp": datetime.now().isoformat(),
+        "cache_status": answer.cache_status,
+        "timing": answer.timing()
+    })
+
+
+def _guide_data(text, recipe_title):
+    # Try to parse JSON, else return as text
+    try:
+        return llm_json.parse(text, 'recipe_guide')
+    except llm_json.ExtractionError:
+        pass
+    return {
+        "enhanced_guide": text,
+        "recipe_title": recipe_title
+    }
+
+
+async def _guide_events(answer, recipe_title):
+    """
+    SSE for ?stream=1: `chunk` events as text arrives, a `section` event for
+    each top-level key of the guide JSON once it has fully arrived, then `done`.
+    """
+    scanner = llm_json.SectionScanner()
+    async for chunk in answer:
+        yield ai.sse('chunk', {'text': chunk})
+        for key, value in scanner.feed(chunk):
+            yield ai.sse('section', {'key': key, 'value': value})
+    yield ai.sse('done', {
+        "success": True,
+        "recipe_title": recipe_title,
+        "guided_instructions": scanner.sections if scanner.done and scanner.sections else _guide_data(answer.text.strip(), recipe_title),
+        "cache_status": answer.cache_status,
+        "timing": answer.timing()
+    })
@@ -237,7 +237,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # for static files
+    'recipe_app.middleware.AsyncWhiteNoiseMiddleware',  # for static files (WhiteNoise, async-capable)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -310,6 +310,8 @@ CORS_ALLOWED_ORIGINS = [
     os.environ.get("FRONTEND_URL", "http://localhost:5173"),
 ]
 CORS_ALLOW_CREDENTIALS = True
+# paged lists (feed, followers) put the next page URL in the Link header
+CORS_EXPOSE_HEADERS = ['Link']
 
 
 # -------------------------------
@@ -332,3 +334,104 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# -------------------------------
+# Cache
+# -------------------------------
+# Shared Redis cache in production (needs the `redis` package), a file
+# cache when CACHE_DIR is set, local memory otherwise.
+if os.environ.get("REDIS_URL"):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ["REDIS_URL"],
+    }}
+elif os.environ.get("CACHE_DIR"):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ["CACHE_DIR"],
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-app',
+    }}
+
+# Upper bound on how long an anonymous response stays cached
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+# -------------------------------
+# Search
+# -------------------------------
+# Ranked matches considered for ?search= on recipe lists
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", 500))
+
+# -------------------------------
+# Feed
+# -------------------------------
+# Authors above this follower count are merged into feeds at read time
+# instead of being fanned out on write
+FEED_FANOUT_LIMIT = int(os.environ.get("FEED_FANOUT_LIMIT", 1000))
+# Latest items copied into a feed when following someone
+FEED_BACKFILL_SIZE = int(os.environ.get("FEED_BACKFILL_SIZE", 50))
+FEED_PAGE_SIZE = int(os.environ.get("FEED_PAGE_SIZE", 20))
+
+# -------------------------------
+# Follow graph
+# -------------------------------
+# Friend-of-friend suggestions kept per user, and for how long (seconds)
+FOLLOW_SUGGESTIONS_SIZE = int(os.environ.get("FOLLOW_SUGGESTIONS_SIZE", 20))
+FOLLOW_SUGGESTIONS_TTL = int(os.environ.get("FOLLOW_SUGGESTIONS_TTL", 3600))
+
+# -------------------------------
+# Push events (server-sent events, served under ASGI)
+# -------------------------------
+# Redis pub/sub when several workers serve streams, in-process otherwise
+EVENTS_BROKER = os.environ.get(
+    "EVENTS_BROKER",
+    "recipe_app.events.RedisBroker" if os.environ.get("REDIS_URL") else "recipe_app.events.InProcessBroker",
+)
+REDIS_URL = os.environ.get("REDIS_URL")
+# Seconds between keep-alive comments on an idle stream
+EVENTS_KEEPALIVE = int(os.environ.get("EVENTS_KEEPALIVE", 15))
+# Undelivered events kept per connection before the oldest are dropped
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", 100))
+
+# -------------------------------
+# Email outbox (delivered by `manage.py send_outbox --loop`)
+# -------------------------------
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 5))
+# Retry backoff: OUTBOX_RETRY_BASE * 2^(attempt-1) seconds, capped at OUTBOX_RETRY_MAX
+OUTBOX_RETRY_BASE = int(os.environ.get("OUTBOX_RETRY_BASE", 60))
+OUTBOX_RETRY_MAX = int(os.environ.get("OUTBOX_RETRY_MAX", 3600))
+# How long a worker's claim on a batch lasts before another worker may retry it
+OUTBOX_CLAIM_SECONDS = int(os.environ.get("OUTBOX_CLAIM_SECONDS", 300))
+# Recipes listed in one digest before "...and N more"
+DIGEST_MAX_RECIPES = int(os.environ.get("DIGEST_MAX_RECIPES", 20))
+
+# -------------------------------
+# AI service (recipe_app.ai)
+# -------------------------------
+AI_MODEL = os.environ.get("AI_MODEL", "models/gemini-2.5-flash")
+# Model calls in flight per worker process, and per user (or per IP when anonymous)
+AI_MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", 8))
+AI_MAX_CONCURRENCY_PER_USER = int(os.environ.get("AI_MAX_CONCURRENCY_PER_USER", 2))
+# Seconds a request may wait for a free slot before getting 429/503
+AI_QUEUE_TIMEOUT = int(os.environ.get("AI_QUEUE_TIMEOUT", 10))
+# Seconds a single model call may take before the request gets 504
+AI_TIMEOUT = int(os.environ.get("AI_TIMEOUT", 60))
+# AI answer cache: seconds per endpoint (0 disables it there), then the LRU bounds
+AI_CACHE_TTLS = {
+    "trending": int(os.environ.get("AI_CACHE_TTL_TRENDING", 15 * 60)),
+    "cooking_coach": int(os.environ.get("AI_CACHE_TTL_COACH", 60 * 60)),
+    "structured_recipe": int(os.environ.get("AI_CACHE_TTL_RECIPE", 24 * 60 * 60)),
+    "recipe_guide": int(os.environ.get("AI_CACHE_TTL_GUIDE", 24 * 60 * 60)),
+}
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", 1000))
+AI_CACHE_MAX_BYTES = int(os.environ.get("AI_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# Identical AI requests in flight share one model call; across worker
+# processes too (through the AIRequestLock table) unless turned off
+AI_COALESCE_ACROSS_PROCESSES = os.environ.get("AI_COALESCE_ACROSS_PROCESSES", "1") == "1"
+# Seconds between lock-table checks while another process is answering
+AI_COALESCE_POLL = float(os.environ.get("AI_COALESCE_POLL", 0.2))
+# Seconds a published answer stays in the lock table for late followers
+AI_COALESCE_LINGER = int(os.environ.get("AI_COALESCE_LINGER", 5))